@@ -0,0 +1,49 @@
+"""Criar tabela apuracoes_mensais
+
+Revision ID: 3f7a1c9d5e62
+Revises: 8d2f6c3a9e41
+Create Date: 2026-10-18 18:20:47.902316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f7a1c9d5e62'
+down_revision = '8d2f6c3a9e41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As apurações são calculadas depois da migração com: flask recalcular-apuracoes
+    op.create_table('apuracoes_mensais',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('mes', sa.Date(), nullable=False),
+    sa.Column('vendas_swing_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('resultado_swing_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('isento_swing_trade', sa.Boolean(), nullable=False),
+    sa.Column('base_swing_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('imposto_swing_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('prejuizo_swing_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('vendas_day_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('resultado_day_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('base_day_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('imposto_day_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('prejuizo_day_trade', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('user_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['user_hash'], ['users.hash_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_hash', 'mes', name='uix_apuracao_mensal_usuario_mes')
+    )
+    with op.batch_alter_table('apuracoes_mensais', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_apuracoes_mensais_user_hash'), ['user_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('apuracoes_mensais', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_apuracoes_mensais_user_hash'))
+
+    op.drop_table('apuracoes_mensais')
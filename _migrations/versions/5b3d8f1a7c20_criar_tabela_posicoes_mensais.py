@@ -0,0 +1,43 @@
+"""Criar tabela posicoes_mensais
+
+Revision ID: 5b3d8f1a7c20
+Revises: e27d5a9c4f18
+Create Date: 2026-10-18 14:05:21.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b3d8f1a7c20'
+down_revision = 'e27d5a9c4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # As posições são calculadas depois da migração com: flask recalcular-posicoes-mensais
+    op.create_table('posicoes_mensais',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('mes', sa.Date(), nullable=False),
+    sa.Column('quantidade', sa.Integer(), nullable=False),
+    sa.Column('valor_investido', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('preco_medio', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('acao_id', sa.Integer(), nullable=False),
+    sa.Column('user_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['acao_id'], ['acoes.id'], ),
+    sa.ForeignKeyConstraint(['user_hash'], ['users.hash_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('acao_id', 'mes', name='uix_posicao_mensal_acao_mes')
+    )
+    with op.batch_alter_table('posicoes_mensais', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_posicoes_mensais_user_hash'), ['user_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('posicoes_mensais', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_posicoes_mensais_user_hash'))
+
+    op.drop_table('posicoes_mensais')
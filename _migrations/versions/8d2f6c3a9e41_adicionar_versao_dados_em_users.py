@@ -0,0 +1,26 @@
+"""Adicionar versao_dados em users
+
+Revision ID: 8d2f6c3a9e41
+Revises: 5b3d8f1a7c20
+Create Date: 2026-10-18 16:42:08.117203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f6c3a9e41'
+down_revision = '5b3d8f1a7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versao_dados', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('versao_dados')
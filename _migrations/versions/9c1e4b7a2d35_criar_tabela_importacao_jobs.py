@@ -0,0 +1,49 @@
+"""Criar tabela importacao_jobs
+
+Revision ID: 9c1e4b7a2d35
+Revises: 41e0dc9232f0
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1e4b7a2d35'
+down_revision = '41e0dc9232f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('importacao_jobs',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('linhas_lidas', sa.Integer(), nullable=False),
+    sa.Column('negociacoes_processadas', sa.Integer(), nullable=False),
+    sa.Column('negociacoes_ignoradas', sa.Integer(), nullable=False),
+    sa.Column('mensagem', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('user_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['user_hash'], ['users.hash_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('importacao_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_importacao_jobs_user_hash'), ['user_hash'], unique=False)
+
+    with op.batch_alter_table('relatorios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('importacao_job_id', sa.String(length=32), nullable=True))
+        batch_op.create_foreign_key('fk_relatorios_importacao_job_id', 'importacao_jobs', ['importacao_job_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('relatorios', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_relatorios_importacao_job_id', type_='foreignkey')
+        batch_op.drop_column('importacao_job_id')
+
+    with op.batch_alter_table('importacao_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_importacao_jobs_user_hash'))
+
+    op.drop_table('importacao_jobs')
@@ -0,0 +1,32 @@
+"""Preço médio das posições mensais como Numeric
+
+Revision ID: a5d2c8e1f347
+Revises: b7e3c5a91d04
+Create Date: 2026-10-19 14:37:02.518264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5d2c8e1f347'
+down_revision = 'b7e3c5a91d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posicoes_mensais', schema=None) as batch_op:
+        batch_op.alter_column('preco_medio',
+               existing_type=sa.FLOAT(),
+               type_=sa.Numeric(precision=14, scale=4),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('posicoes_mensais', schema=None) as batch_op:
+        batch_op.alter_column('preco_medio',
+               existing_type=sa.Numeric(precision=14, scale=4),
+               type_=sa.FLOAT(),
+               existing_nullable=False)
@@ -0,0 +1,27 @@
+"""Adicionar quantidade_day_trade em negociacoes
+
+Revision ID: a6c2e8f41b97
+Revises: 3f7a1c9d5e62
+Create Date: 2026-10-18 19:36:12.408551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c2e8f41b97'
+down_revision = '3f7a1c9d5e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A classificação é calculada depois da migração com: flask recalcular-posicoes-mensais
+    with op.batch_alter_table('negociacoes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quantidade_day_trade', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('negociacoes', schema=None) as batch_op:
+        batch_op.drop_column('quantidade_day_trade')
@@ -0,0 +1,151 @@
+"""Adicionar restrição única (user_hash, codigo) em acoes
+
+Importações simultâneas do mesmo usuário podiam criar a mesma ação duas
+vezes. Antes de criar a restrição, as ações duplicadas são unificadas na de
+menor id: negociações, saldos cadastrados e eventos corporativos passam para
+ela (a chave natural das negociações é recalculada, e as que já existiam na
+ação mantida são removidas), e as posições mensais das ações afetadas são
+removidas, para serem recalculadas a partir do histórico.
+
+Revision ID: b7e3c5a91d04
+Revises: f3b9d4e6a218
+Create Date: 2026-10-19 09:12:44.305718
+
+"""
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3c5a91d04'
+down_revision = 'f3b9d4e6a218'
+branch_labels = None
+depends_on = None
+
+acoes = sa.table(
+    'acoes',
+    sa.column('id', sa.Integer),
+    sa.column('codigo', sa.String),
+    sa.column('user_hash', sa.String),
+)
+
+negociacoes = sa.table(
+    'negociacoes',
+    sa.column('id', sa.Integer),
+    sa.column('user_hash', sa.String),
+    sa.column('data_negocio', sa.Date),
+    sa.column('tipo_movimentacao', sa.String),
+    sa.column('mercado', sa.String),
+    sa.column('instituicao', sa.String),
+    sa.column('acao_id', sa.Integer),
+    sa.column('quantidade', sa.Integer),
+    sa.column('preco', sa.Numeric(10, 2)),
+    sa.column('valor', sa.Numeric(12, 2)),
+    sa.column('chave_natural', sa.String),
+)
+
+# Tabelas com uma linha por ação e data: (tabela, coluna da data)
+TABELAS_POR_DATA = [
+    (sa.table('saldos_precos_medios', sa.column('id', sa.Integer), sa.column('acao_id', sa.Integer),
+              sa.column('data_base', sa.Date)), 'data_base'),
+    (sa.table('eventos_corporativos', sa.column('id', sa.Integer), sa.column('acao_id', sa.Integer),
+              sa.column('data_ex', sa.Date)), 'data_ex'),
+]
+
+posicoes_mensais = sa.table('posicoes_mensais', sa.column('acao_id', sa.Integer))
+
+
+def upgrade():
+    unificar_acoes_duplicadas(op.get_bind())
+
+    with op.batch_alter_table('acoes', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uix_acao_usuario_codigo', ['user_hash', 'codigo'])
+
+
+def downgrade():
+    with op.batch_alter_table('acoes', schema=None) as batch_op:
+        batch_op.drop_constraint('uix_acao_usuario_codigo', type_='unique')
+
+
+def unificar_acoes_duplicadas(conexao):
+    """Move os dados das ações duplicadas de cada usuário para a de menor id e remove as duplicadas"""
+    duplicadas = conexao.execute(
+        sa.select(acoes.c.user_hash, acoes.c.codigo, sa.func.min(acoes.c.id))
+        .group_by(acoes.c.user_hash, acoes.c.codigo)
+        .having(sa.func.count() > 1)
+    ).fetchall()
+
+    for user_hash, codigo, mantida in duplicadas:
+        removidas = conexao.execute(
+            sa.select(acoes.c.id).where(
+                acoes.c.user_hash == user_hash, acoes.c.codigo == codigo, acoes.c.id != mantida
+            )
+        ).scalars().all()
+
+        _mover_negociacoes(conexao, mantida, removidas)
+        for tabela, coluna in TABELAS_POR_DATA:
+            datas = set(conexao.execute(sa.select(tabela.c[coluna]).where(tabela.c.acao_id == mantida)).scalars())
+            for id_linha, data in conexao.execute(
+                sa.select(tabela.c.id, tabela.c[coluna]).where(tabela.c.acao_id.in_(removidas))
+            ).fetchall():
+                if data in datas:
+                    conexao.execute(tabela.delete().where(tabela.c.id == id_linha))
+                else:
+                    conexao.execute(tabela.update().where(tabela.c.id == id_linha).values(acao_id=mantida))
+                    datas.add(data)
+
+        conexao.execute(posicoes_mensais.delete().where(posicoes_mensais.c.acao_id.in_([mantida, *removidas])))
+        conexao.execute(acoes.delete().where(acoes.c.id.in_(removidas)))
+
+
+def _mover_negociacoes(conexao, mantida, removidas):
+    """Passa as negociações para a ação mantida, recalculando a chave natural"""
+    chaves = set(conexao.execute(
+        sa.select(negociacoes.c.chave_natural).where(negociacoes.c.acao_id == mantida)
+    ).scalars())
+    colunas = [negociacoes.c[campo] for campo in CAMPOS_CHAVE_NATURAL]
+    for linha in conexao.execute(
+        sa.select(negociacoes.c.id, *colunas).where(negociacoes.c.acao_id.in_(removidas))
+    ).fetchall():
+        campos = dict(zip(CAMPOS_CHAVE_NATURAL, linha[1:]), acao_id=mantida)
+        chave = gerar_chave_natural(**campos)
+        if chave in chaves:
+            conexao.execute(negociacoes.delete().where(negociacoes.c.id == linha[0]))
+        else:
+            conexao.execute(negociacoes.update().where(negociacoes.c.id == linha[0]).values(
+                acao_id=mantida, chave_natural=chave
+            ))
+            chaves.add(chave)
+
+
+# Cópia congelada da impressão digital de src/utils/chave_natural.py nesta revisão:
+# a migração não depende do código da aplicação, que pode mudar depois dela
+CAMPOS_CHAVE_NATURAL = [
+    'user_hash', 'data_negocio', 'tipo_movimentacao', 'mercado', 'instituicao',
+    'acao_id', 'quantidade', 'preco', 'valor'
+]
+
+CENTAVO = Decimal('0.01')
+
+
+def gerar_chave_natural(user_hash, data_negocio, tipo_movimentacao, mercado, instituicao,
+                        acao_id, quantidade, preco, valor):
+    """Retorna a impressão digital (32 caracteres hexadecimais) da negociação"""
+    partes = [
+        user_hash,
+        data_negocio.isoformat(),
+        tipo_movimentacao,
+        mercado,
+        instituicao,
+        str(int(acao_id)),
+        str(int(quantidade)),
+        _formatar_valor(preco),
+        _formatar_valor(valor),
+    ]
+    return hashlib.blake2b('\x1f'.join(partes).encode(), digest_size=16).hexdigest()
+
+
+def _formatar_valor(valor):
+    return str(Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP))
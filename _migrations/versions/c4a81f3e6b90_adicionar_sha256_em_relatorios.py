@@ -0,0 +1,28 @@
+"""Adicionar sha256 em relatorios
+
+Revision ID: c4a81f3e6b90
+Revises: 9c1e4b7a2d35
+Create Date: 2026-10-18 10:03:11.452871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a81f3e6b90'
+down_revision = '9c1e4b7a2d35'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('relatorios', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uix_relatorio_user_sha256', ['user_hash', 'sha256'])
+
+
+def downgrade():
+    with op.batch_alter_table('relatorios', schema=None) as batch_op:
+        batch_op.drop_constraint('uix_relatorio_user_sha256', type_='unique')
+        batch_op.drop_column('sha256')
@@ -0,0 +1,26 @@
+"""Adicionar nome_empresa em acoes
+
+Revision ID: c9e4f7a2b153
+Revises: a5d2c8e1f347
+Create Date: 2026-10-19 15:12:44.806391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e4f7a2b153'
+down_revision = 'a5d2c8e1f347'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('acoes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('nome_empresa', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('acoes', schema=None) as batch_op:
+        batch_op.drop_column('nome_empresa')
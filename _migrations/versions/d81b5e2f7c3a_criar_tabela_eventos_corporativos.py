@@ -0,0 +1,42 @@
+"""Criar tabela eventos_corporativos
+
+Revision ID: d81b5e2f7c3a
+Revises: a6c2e8f41b97
+Create Date: 2026-10-18 20:41:09.517224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81b5e2f7c3a'
+down_revision = 'a6c2e8f41b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('eventos_corporativos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('data_ex', sa.Date(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('quantidade_antes', sa.Integer(), nullable=False),
+    sa.Column('quantidade_depois', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('acao_id', sa.Integer(), nullable=False),
+    sa.Column('user_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['acao_id'], ['acoes.id'], ),
+    sa.ForeignKeyConstraint(['user_hash'], ['users.hash_id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('acao_id', 'data_ex', name='uix_evento_corporativo_acao_data_ex')
+    )
+    with op.batch_alter_table('eventos_corporativos', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_eventos_corporativos_user_hash'), ['user_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('eventos_corporativos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_eventos_corporativos_user_hash'))
+
+    op.drop_table('eventos_corporativos')
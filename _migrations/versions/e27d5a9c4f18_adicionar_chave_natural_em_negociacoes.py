@@ -0,0 +1,118 @@
+"""Adicionar chave_natural em negociacoes
+
+Substitui a restrição única de nove colunas uix_negociacao_completa por um
+índice único sobre a impressão digital da chave natural. As linhas existentes
+são preenchidas em lotes antes da criação do índice.
+
+Revision ID: e27d5a9c4f18
+Revises: c4a81f3e6b90
+Create Date: 2026-10-18 11:26:52.730915
+
+"""
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27d5a9c4f18'
+down_revision = 'c4a81f3e6b90'
+branch_labels = None
+depends_on = None
+
+
+# Quantidade de negociações preenchidas por lote
+TAMANHO_LOTE = 5000
+
+negociacoes = sa.table(
+    'negociacoes',
+    sa.column('id', sa.Integer),
+    sa.column('user_hash', sa.String),
+    sa.column('data_negocio', sa.Date),
+    sa.column('tipo_movimentacao', sa.String),
+    sa.column('mercado', sa.String),
+    sa.column('instituicao', sa.String),
+    sa.column('acao_id', sa.Integer),
+    sa.column('quantidade', sa.Integer),
+    sa.column('preco', sa.Numeric(10, 2)),
+    sa.column('valor', sa.Numeric(12, 2)),
+    sa.column('chave_natural', sa.String),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('negociacoes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('chave_natural', sa.String(length=32), nullable=True))
+
+    preencher_chaves_naturais(op.get_bind())
+
+    with op.batch_alter_table('negociacoes', schema=None) as batch_op:
+        batch_op.alter_column('chave_natural',
+               existing_type=sa.String(length=32),
+               nullable=False)
+        batch_op.create_index('uix_negociacao_chave_natural', ['chave_natural'], unique=True)
+        batch_op.drop_constraint('uix_negociacao_completa', type_='unique')
+
+
+def downgrade():
+    with op.batch_alter_table('negociacoes', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uix_negociacao_completa', ['data_negocio', 'tipo_movimentacao', 'mercado', 'instituicao', 'acao_id', 'quantidade', 'preco', 'valor', 'user_hash'])
+        batch_op.drop_index('uix_negociacao_chave_natural')
+        batch_op.drop_column('chave_natural')
+
+
+def preencher_chaves_naturais(conexao):
+    """Calcula a chave natural das negociações existentes, percorrendo a tabela por id"""
+    colunas = [negociacoes.c[campo] for campo in CAMPOS_CHAVE_NATURAL]
+    atualizacao = negociacoes.update().where(
+        negociacoes.c.id == sa.bindparam('b_id')
+    ).values(chave_natural=sa.bindparam('b_chave_natural'))
+
+    ultimo_id = 0
+    while True:
+        linhas = conexao.execute(
+            sa.select(negociacoes.c.id, *colunas)
+            .where(negociacoes.c.id > ultimo_id)
+            .order_by(negociacoes.c.id)
+            .limit(TAMANHO_LOTE)
+        ).fetchall()
+        if not linhas:
+            break
+
+        conexao.execute(atualizacao, [
+            {'b_id': linha[0], 'b_chave_natural': gerar_chave_natural(*linha[1:])}
+            for linha in linhas
+        ])
+        ultimo_id = linhas[-1][0]
+
+
+# Cópia congelada da impressão digital de src/utils/chave_natural.py nesta revisão:
+# a migração não depende do código da aplicação, que pode mudar depois dela
+CAMPOS_CHAVE_NATURAL = [
+    'user_hash', 'data_negocio', 'tipo_movimentacao', 'mercado', 'instituicao',
+    'acao_id', 'quantidade', 'preco', 'valor'
+]
+
+CENTAVO = Decimal('0.01')
+
+
+def gerar_chave_natural(user_hash, data_negocio, tipo_movimentacao, mercado, instituicao,
+                        acao_id, quantidade, preco, valor):
+    """Retorna a impressão digital (32 caracteres hexadecimais) da negociação"""
+    partes = [
+        user_hash,
+        data_negocio.isoformat(),
+        tipo_movimentacao,
+        mercado,
+        instituicao,
+        str(int(acao_id)),
+        str(int(quantidade)),
+        _formatar_valor(preco),
+        _formatar_valor(valor),
+    ]
+    return hashlib.blake2b('\x1f'.join(partes).encode(), digest_size=16).hexdigest()
+
+
+def _formatar_valor(valor):
+    return str(Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP))
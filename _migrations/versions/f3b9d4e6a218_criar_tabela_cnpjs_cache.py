@@ -0,0 +1,30 @@
+"""Criar tabela cnpjs_cache
+
+Revision ID: f3b9d4e6a218
+Revises: d81b5e2f7c3a
+Create Date: 2026-10-18 22:05:37.184903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b9d4e6a218'
+down_revision = 'd81b5e2f7c3a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cnpjs_cache',
+    sa.Column('codigo', sa.String(length=20), nullable=False),
+    sa.Column('cnpj', sa.String(length=18), nullable=True),
+    sa.Column('expira_em', sa.DateTime(), nullable=False),
+    sa.Column('atualizado_em', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('codigo')
+    )
+
+
+def downgrade():
+    op.drop_table('cnpjs_cache')
@@ -0,0 +1,2 @@
+# Benchmarks de desempenho do B3 Portfolio Manager
+# Execute com: python -m benchmarks.importacao --help
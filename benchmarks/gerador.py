@@ -0,0 +1,108 @@
+"""
+Gerador de relatórios sintéticos de negociação da B3.
+
+Produz planilhas com os mesmos cabeçalhos da exportação "Negociação" da área do
+investidor da B3, com datas em dias úteis, preços em passeio aleatório por ação,
+negociações no mercado fracionário (código com sufixo F) e uma proporção
+configurável de linhas duplicadas.
+"""
+import csv
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+CABECALHOS_B3 = [
+    'Data do Negócio', 'Tipo de Movimentação', 'Mercado', 'Prazo/Vencimento',
+    'Instituição', 'Código de Negociação', 'Quantidade', 'Preço', 'Valor'
+]
+
+# Ações e preço inicial aproximado
+ACOES = {
+    'PETR4': 28.0, 'VALE3': 68.0, 'ITUB4': 27.0, 'BBDC4': 15.0, 'ABEV3': 14.0,
+    'WEGE3': 36.0, 'BBAS3': 45.0, 'ITSA4': 9.5, 'B3SA3': 12.0, 'MGLU3': 4.0,
+    'RENT3': 60.0, 'SUZB3': 50.0, 'EGIE3': 42.0, 'TAEE11': 35.0, 'HGLG11': 160.0,
+}
+
+INSTITUICOES = [
+    'XP INVESTIMENTOS CCTVM S/A', 'BTG PACTUAL CTVM S/A', 'NU INVEST CORRETORA DE VALORES S.A.',
+    'INTER DTVM LTDA', 'CLEAR CORRETORA - GRUPO XP',
+]
+
+
+def gerar_negociacoes(linhas, proporcao_duplicadas=0.0, semente=42, data_inicial=date(2015, 1, 2)):
+    """
+    Gera um DataFrame com as colunas do relatório da B3.
+
+    Args:
+        linhas: quantidade total de linhas (incluindo as duplicadas)
+        proporcao_duplicadas: fração das linhas que repete exatamente uma linha anterior
+        semente: semente do gerador aleatório, para resultados reproduzíveis
+    """
+    aleatorio = np.random.default_rng(semente)
+    unicas = max(1, int(round(linhas * (1 - proporcao_duplicadas))))
+
+    codigos = np.array(list(ACOES))
+    indice_acao = aleatorio.integers(0, len(codigos), unicas)
+
+    # Datas em dias úteis, em ordem cronológica, com várias negociações por dia
+    dias = pd.bdate_range(data_inicial, periods=max(1, unicas // 4 + 1))
+    datas = np.sort(aleatorio.choice(dias, unicas))
+
+    # Preço em passeio aleatório por ação, limitado a um valor mínimo de 1 centavo
+    variacao = aleatorio.normal(0, 0.01, unicas)
+    precos = np.array([ACOES[codigo] for codigo in codigos])[indice_acao] * np.exp(
+        pd.Series(variacao).groupby(indice_acao).cumsum().to_numpy()
+    )
+    precos = np.maximum(np.round(precos, 2), 0.01)
+
+    # Lotes padrão de 100 ações ou negociações no fracionário (1 a 99 ações)
+    fracionario = aleatorio.random(unicas) < 0.3
+    quantidades = np.where(
+        fracionario,
+        aleatorio.integers(1, 100, unicas),
+        aleatorio.integers(1, 11, unicas) * 100
+    )
+
+    df = pd.DataFrame({
+        'Data do Negócio': pd.DatetimeIndex(datas).strftime('%d/%m/%Y'),
+        'Tipo de Movimentação': np.where(aleatorio.random(unicas) < 0.7, 'Compra', 'Venda'),
+        'Mercado': np.where(fracionario, 'Mercado Fracionário', 'Mercado à Vista'),
+        'Prazo/Vencimento': '-',
+        'Instituição': aleatorio.choice(INSTITUICOES, unicas),
+        'Código de Negociação': np.where(fracionario, np.char.add(codigos[indice_acao], 'F'), codigos[indice_acao]),
+        'Quantidade': quantidades,
+        'Preço': precos,
+        'Valor': np.round(quantidades * precos, 2),
+    })
+
+    duplicadas = linhas - unicas
+    if duplicadas > 0:
+        repetidas = df.iloc[aleatorio.integers(0, unicas, duplicadas)]
+        df = pd.concat([df, repetidas], ignore_index=True)
+        df = df.iloc[aleatorio.permutation(len(df))].reset_index(drop=True)
+
+    return df[CABECALHOS_B3]
+
+
+def gerar_relatorio(caminho, linhas, proporcao_duplicadas=0.0, semente=42):
+    """
+    Grava um relatório sintético em XLSX ou CSV, conforme a extensão do caminho.
+
+    O XLSX é escrito com o openpyxl em modo write-only, permitindo gerar
+    arquivos com milhões de linhas sem montar a planilha em memória.
+    """
+    df = gerar_negociacoes(linhas, proporcao_duplicadas, semente)
+
+    if caminho.endswith('.csv'):
+        df.to_csv(caminho, sep=';', decimal=',', index=False, quoting=csv.QUOTE_MINIMAL)
+        return caminho
+
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet('Negociação')
+    planilha.append(CABECALHOS_B3)
+    for linha in df.itertuples(index=False, name=None):
+        planilha.append([valor.item() if hasattr(valor, 'item') else valor for valor in linha])
+    workbook.save(caminho)
+    return caminho
@@ -0,0 +1,114 @@
+"""
+Benchmark de importação de relatórios da B3.
+
+Gera relatórios sintéticos de vários tamanhos e mede, para cada banco de dados,
+a vazão (linhas por segundo), o pico de memória residente e a quantidade de
+comandos SQL executados por processar_relatorio.
+
+Cada caso roda em um processo separado, para que o pico de memória de um caso
+não contamine o seguinte.
+
+Uso:
+    python -m benchmarks.importacao --linhas 1000 10000 100000 --duplicadas 0.1
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.gerador import gerar_relatorio
+
+BANCOS = ('memoria', 'arquivo')
+
+
+def executar_caso(filepath, banco, pasta):
+    """Importa o arquivo em um banco vazio e retorna as métricas do caso"""
+    from flask import Flask
+    from sqlalchemy import event
+    from src.models import db
+    from src.models.all_models import Relatorio, User
+    from src.routes.relatorios import processar_relatorio
+
+    if banco == 'memoria':
+        uri = 'sqlite:///:memory:'
+    else:
+        uri = f"sqlite:///{os.path.join(pasta, f'benchmark_{os.getpid()}.db')}"
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        user = User(email='benchmark@example.com', name='Benchmark', google_id='benchmark')
+        db.session.add(user)
+        db.session.flush()
+        relatorio = Relatorio(nome_arquivo=os.path.basename(filepath), user_hash=user.hash_id)
+        db.session.add(relatorio)
+        db.session.commit()
+
+        comandos = [0]
+
+        def contar(conn, cursor, statement, parameters, context, executemany):
+            comandos[0] += 1
+
+        rss_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        event.listen(db.engine, 'before_cursor_execute', contar)
+        inicio = time.perf_counter()
+        processadas, ignoradas = processar_relatorio(filepath, relatorio.id)
+        duracao = time.perf_counter() - inicio
+        event.remove(db.engine, 'before_cursor_execute', contar)
+        rss_pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        db.session.remove()
+        db.engine.dispose()
+
+    return {
+        'processadas': processadas,
+        'ignoradas': ignoradas,
+        'segundos': duracao,
+        'linhas_por_segundo': (processadas + ignoradas) / duracao if duracao else 0,
+        # ru_maxrss é informado em KiB no Linux
+        'rss_pico_mb': rss_pico / 1024,
+        'rss_acrescimo_mb': (rss_pico - rss_inicial) / 1024,
+        'comandos_sql': comandos[0],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de importação de relatórios da B3')
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='tamanhos dos relatórios gerados (de 1.000 a 1.000.000 linhas)')
+    parser.add_argument('--duplicadas', type=float, default=0.1,
+                        help='proporção de linhas duplicadas em cada relatório (0 a 1)')
+    parser.add_argument('--formato', choices=('xlsx', 'csv'), default='xlsx')
+    parser.add_argument('--bancos', choices=BANCOS, nargs='+', default=list(BANCOS))
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    contexto = multiprocessing.get_context('spawn')
+
+    print(f"{'linhas':>10} {'banco':>8} {'linhas/s':>12} {'segundos':>10} "
+          f"{'RSS pico (MB)':>14} {'acréscimo (MB)':>15} {'comandos SQL':>13}")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            filepath = os.path.join(pasta, f'negociacao_{linhas}.{args.formato}')
+            gerar_relatorio(filepath, linhas, args.duplicadas, args.semente)
+
+            for banco in args.bancos:
+                with contexto.Pool(1) as pool:
+                    resultado = pool.apply(executar_caso, (filepath, banco, pasta))
+
+                print(f"{linhas:>10} {banco:>8} {resultado['linhas_por_segundo']:>12.0f} "
+                      f"{resultado['segundos']:>10.2f} {resultado['rss_pico_mb']:>14.1f} "
+                      f"{resultado['rss_acrescimo_mb']:>15.1f} {resultado['comandos_sql']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import click
 import urllib3
 from flask import Flask, redirect, url_for
 from flask_login import LoginManager, current_user
@@ -12,7 +13,13 @@ from src.routes.acoes import acoes_bp
 from src.routes.negociacoes import negociacoes_bp
 from src.routes.relatorios import relatorios_bp
 from src.routes.saldos import saldos_bp
+from src.routes.eventos import eventos_bp
 from src.routes.admin import admin_bp
+from src.utils.posicao import recalcular_posicoes_mensais
+from src.utils.apuracao import recalcular_apuracoes
+from src.utils.day_trade import classificar_day_trades
+from src.utils.dinheiro import formatar_reais
+from src.utils.indice_emissores import construir_indice
 
 def create_app():
     app = Flask(__name__)
@@ -71,8 +78,12 @@ def create_app():
     app.register_blueprint(negociacoes_bp)
     app.register_blueprint(relatorios_bp)
     app.register_blueprint(saldos_bp)
+    app.register_blueprint(eventos_bp)
     app.register_blueprint(admin_bp)
     
+    # Formatação monetária única para os templates: {{ valor|reais }} ou {{ preco|reais(4) }}
+    app.add_template_filter(formatar_reais, 'reais')
+    
     # Adicionar link para o painel de administração no menu principal
     @app.context_processor
     def inject_admin_status():
@@ -80,6 +91,34 @@ def create_app():
             return {'is_admin': current_user.is_admin()}
         return {'is_admin': False}
     
+    # Comando para (re)construir a classificação de day trade e as posições mensais,
+    # por exemplo após as migrações que criam as colunas e a tabela
+    @app.cli.command('recalcular-posicoes-mensais')
+    def recalcular_posicoes_mensais_command():
+        """Reclassifica os day trades e recalcula as posições mensais de todos os usuários"""
+        for user in User.query.all():
+            classificar_day_trades(user.hash_id)
+            recalcular_posicoes_mensais(user.hash_id)
+            db.session.commit()
+        print("Posições mensais recalculadas")
+    
+    # Comando para (re)construir as apurações mensais de IR, depois das posições mensais
+    @app.cli.command('recalcular-apuracoes')
+    def recalcular_apuracoes_command():
+        """Recalcula as apurações mensais de todos os usuários"""
+        for user in User.query.all():
+            recalcular_apuracoes(user.hash_id)
+            db.session.commit()
+        print("Apurações mensais recalculadas")
+    
+    # Comando para reconstruir o índice local de emissores (ver src/utils/indice_emissores.py)
+    @app.cli.command('atualizar-indice-emissores')
+    @click.argument('arquivo', required=False, type=click.Path(exists=True, dir_okay=False))
+    def atualizar_indice_emissores_command(arquivo):
+        """Reconstrói o índice de emissores a partir da lista distribuída ou do ARQUIVO CSV informado"""
+        total = construir_indice(arquivo)
+        print(f"Índice de emissores atualizado com {total} emissores")
+    
     # Rota raiz
     @app.route('/')
     def index():
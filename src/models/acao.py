@@ -8,6 +8,7 @@ class Acao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(20), nullable=False)  # Tipo de dado otimizado
     cnpj = db.Column(db.String(18), nullable=True)  # Tipo de dado otimizado
+    nome_empresa = db.Column(db.String(200), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Chave estrangeira para o usuário (anonimizada)
@@ -16,6 +17,13 @@ class Acao(db.Model):
     # Relacionamentos
     negociacoes = db.relationship('Negociacao', backref='acao', lazy=True, cascade="all, delete-orphan")
     saldos = db.relationship('SaldoPrecoMedio', backref='acao', lazy=True, cascade="all, delete-orphan")
+    posicoes_mensais = db.relationship('PosicaoMensal', backref='acao', lazy=True, cascade="all, delete-orphan")
+    eventos_corporativos = db.relationship('EventoCorporativo', backref='acao', lazy=True, cascade="all, delete-orphan")
+    
+    # Um código por usuário, mesmo com importações simultâneas
+    __table_args__ = (
+        db.UniqueConstraint('user_hash', 'codigo', name='uix_acao_usuario_codigo'),
+    )
     
     def __repr__(self):
         return f'<Acao {self.id}>'
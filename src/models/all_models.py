@@ -3,3 +3,8 @@ from src.models.negociacao import Negociacao
 from src.models.relatorio import Relatorio
 from src.models.saldo_preco_medio import SaldoPrecoMedio
 from src.models.user import User
+from src.models.importacao_job import ImportacaoJob
+from src.models.posicao_mensal import PosicaoMensal
+from src.models.apuracao_mensal import ApuracaoMensal
+from src.models.evento_corporativo import EventoCorporativo
+from src.models.cnpj_cache import CnpjCache
@@ -0,0 +1,46 @@
+from datetime import datetime
+from src.models import db
+
+class ApuracaoMensal(db.Model):
+    """
+    Apuração mensal do imposto de renda sobre ganhos em ações, mantida pelo sistema.
+    
+    Gravada apenas para os meses com vendas, separando operações comuns (swing
+    trade) e day trade. Os prejuízos acumulados ao fim do mês permitem recalcular
+    a partir de qualquer mês sem percorrer os anteriores (ver src/utils/apuracao.py).
+    """
+    __tablename__ = 'apuracoes_mensais'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Date, nullable=False)  # Último dia do mês
+    
+    # Operações comuns (swing trade)
+    vendas_swing_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    resultado_swing_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    isento_swing_trade = db.Column(db.Boolean, nullable=False, default=False)
+    base_swing_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    imposto_swing_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    prejuizo_swing_trade = db.Column(db.Numeric(14, 2), nullable=False)  # A compensar, ao fim do mês
+    
+    # Day trade
+    vendas_day_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    resultado_day_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    base_day_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    imposto_day_trade = db.Column(db.Numeric(14, 2), nullable=False)
+    prejuizo_day_trade = db.Column(db.Numeric(14, 2), nullable=False)  # A compensar, ao fim do mês
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Chave estrangeira para o usuário (anonimizada)
+    user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_hash', 'mes', name='uix_apuracao_mensal_usuario_mes'),
+    )
+    
+    @property
+    def imposto(self):
+        return self.imposto_swing_trade + self.imposto_day_trade
+    
+    def __repr__(self):
+        return f'<ApuracaoMensal {self.mes}>'
@@ -0,0 +1,21 @@
+from datetime import datetime
+from src.models import db
+
+class CnpjCache(db.Model):
+    """
+    Resultado da busca online do CNPJ de um código de ação, compartilhado por
+    todos os usuários (não tem user_hash: o CNPJ de um código é público).
+    
+    Guarda também as buscas sem resultado (cnpj nulo), com validade menor, para
+    que um código sem CNPJ não seja buscado de novo a cada relatório (ver
+    src/utils/cache_cnpj.py).
+    """
+    __tablename__ = 'cnpjs_cache'
+    
+    codigo = db.Column(db.String(20), primary_key=True)
+    cnpj = db.Column(db.String(18), nullable=True)  # Nulo quando a busca não encontrou o CNPJ
+    expira_em = db.Column(db.DateTime, nullable=False)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CnpjCache {self.codigo}>'
@@ -0,0 +1,34 @@
+from datetime import datetime
+from fractions import Fraction
+from src.models import db
+
+class EventoCorporativo(db.Model):
+    """
+    Desdobramento, grupamento ou bonificação de uma ação.
+    
+    A partir da data ex, cada quantidade_antes ações passam a quantidade_depois
+    ações, sem alterar o valor investido (ver src/utils/eventos_corporativos.py).
+    """
+    __tablename__ = 'eventos_corporativos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    data_ex = db.Column(db.Date, nullable=False)
+    tipo = db.Column(db.String(50), nullable=False)
+    quantidade_antes = db.Column(db.Integer, nullable=False)
+    quantidade_depois = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Chaves estrangeiras
+    acao_id = db.Column(db.Integer, db.ForeignKey('acoes.id'), nullable=False)
+    user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)  # Referência anonimizada
+    
+    __table_args__ = (
+        db.UniqueConstraint('acao_id', 'data_ex', name='uix_evento_corporativo_acao_data_ex'),
+    )
+    
+    @property
+    def proporcao(self):
+        return Fraction(self.quantidade_depois, self.quantidade_antes)
+    
+    def __repr__(self):
+        return f'<EventoCorporativo {self.acao_id} {self.data_ex}>'
@@ -0,0 +1,39 @@
+from datetime import datetime
+from src.models import db
+
+class ImportacaoJob(db.Model):
+    __tablename__ = 'importacao_jobs'
+    
+    # Situações possíveis de um job de importação
+    STATUS_PENDENTE = 'pendente'
+    STATUS_PROCESSANDO = 'processando'
+    STATUS_CONCLUIDO = 'concluido'
+    STATUS_ERRO = 'erro'
+    
+    id = db.Column(db.String(32), primary_key=True)  # UUID em hexadecimal
+    status = db.Column(db.String(20), nullable=False, default=STATUS_PENDENTE)
+    linhas_lidas = db.Column(db.Integer, nullable=False, default=0)
+    negociacoes_processadas = db.Column(db.Integer, nullable=False, default=0)
+    negociacoes_ignoradas = db.Column(db.Integer, nullable=False, default=0)
+    mensagem = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Chave estrangeira para o usuário (anonimizada)
+    user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)  # Referência anonimizada
+    
+    # Relacionamentos (os relatórios do job são removidos se a importação falhar)
+    relatorios = db.relationship('Relatorio', backref='importacao_job', lazy=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'linhas_lidas': self.linhas_lidas,
+            'negociacoes_processadas': self.negociacoes_processadas,
+            'negociacoes_ignoradas': self.negociacoes_ignoradas,
+            'mensagem': self.mensagem,
+        }
+    
+    def __repr__(self):
+        return f'<ImportacaoJob {self.id} {self.status}>'
@@ -1,6 +1,12 @@
 from datetime import datetime
 from src.models import db
 from flask_login import current_user
+from src.utils.chave_natural import CAMPOS_CHAVE_NATURAL, gerar_chave_natural
+
+def chave_natural_padrao(context):
+    """Calcula a chave natural para inserções que não a informam explicitamente"""
+    parametros = context.get_current_parameters()
+    return gerar_chave_natural(*(parametros[campo] for campo in CAMPOS_CHAVE_NATURAL))
 
 class Negociacao(db.Model):
     __tablename__ = 'negociacoes'
@@ -15,19 +21,20 @@ class Negociacao(db.Model):
     preco = db.Column(db.Numeric(10, 2), nullable=False)  # Numeric para precisão monetária
     valor = db.Column(db.Numeric(12, 2), nullable=False)  # Numeric para precisão monetária
     corretagem = db.Column(db.Numeric(10, 2), nullable=True)  # Numeric para precisão monetária
+    # Parte da quantidade em day trade (ver src/utils/day_trade.py); o restante é operação comum
+    quantidade_day_trade = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Impressão digital da chave natural (ver src/utils/chave_natural.py)
+    chave_natural = db.Column(db.String(32), nullable=False, default=chave_natural_padrao)
     
     # Chaves estrangeiras
     acao_id = db.Column(db.Integer, db.ForeignKey('acoes.id'), nullable=False)
     relatorio_id = db.Column(db.Integer, db.ForeignKey('relatorios.id'), nullable=False)
     user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)  # Referência anonimizada
     
-    # Chave única composta para evitar duplicidades na importação de relatórios
+    # Índice único compacto para evitar duplicidades na importação de relatórios
     __table_args__ = (
-        db.UniqueConstraint(
-            'data_negocio', 'tipo_movimentacao', 'mercado', 'instituicao', 
-            'acao_id', 'quantidade', 'preco', 'valor', 'user_hash',
-            name='uix_negociacao_completa'
-        ),
+        db.Index('uix_negociacao_chave_natural', 'chave_natural', unique=True),
     )
     
     def __repr__(self):
@@ -0,0 +1,30 @@
+from datetime import datetime
+from src.models import db
+
+class PosicaoMensal(db.Model):
+    """
+    Posição de uma ação no último dia de um mês, mantida pelo sistema.
+    
+    Gravada apenas para os meses com negociações ou saldos cadastrados da ação;
+    a posição em qualquer data é a posição mensal mais recente acrescida das
+    poucas negociações posteriores (ver src/utils/posicao.py).
+    """
+    __tablename__ = 'posicoes_mensais'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    mes = db.Column(db.Date, nullable=False)  # Último dia do mês
+    quantidade = db.Column(db.Integer, nullable=False)
+    valor_investido = db.Column(db.Numeric(14, 2), nullable=False)  # Numeric para precisão monetária
+    preco_medio = db.Column(db.Numeric(14, 4), nullable=False)  # Com as casas de CASAS_PRECO_MEDIO (src/utils/dinheiro.py)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Chaves estrangeiras
+    acao_id = db.Column(db.Integer, db.ForeignKey('acoes.id'), nullable=False)
+    user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)  # Referência anonimizada
+    
+    __table_args__ = (
+        db.UniqueConstraint('acao_id', 'mes', name='uix_posicao_mensal_acao_mes'),
+    )
+    
+    def __repr__(self):
+        return f'<PosicaoMensal {self.acao_id} {self.mes}>'
@@ -8,12 +8,21 @@ class Relatorio(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome_arquivo = db.Column(db.String(255), nullable=False)  # Tipo de dado otimizado
     data_upload = db.Column(db.DateTime, default=datetime.utcnow)
+    sha256 = db.Column(db.String(64), nullable=True)  # Digest do conteúdo do arquivo enviado
     
     # Chave estrangeira para o usuário (anonimizada)
     user_hash = db.Column(db.String(64), db.ForeignKey('users.hash_id'), nullable=False, index=True)
     
+    # Job de importação em segundo plano que processou o arquivo
+    importacao_job_id = db.Column(db.String(32), db.ForeignKey('importacao_jobs.id'), nullable=True)
+    
     # Relacionamentos
     negociacoes = db.relationship('Negociacao', backref='relatorio', lazy=True, cascade="all, delete-orphan")
     
+    # Um mesmo arquivo só é importado uma vez por usuário
+    __table_args__ = (
+        db.UniqueConstraint('user_hash', 'sha256', name='uix_relatorio_user_sha256'),
+    )
+    
     def __repr__(self):
         return f'<Relatorio {self.id}>'
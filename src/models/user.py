@@ -14,6 +14,8 @@ class User(db.Model, UserMixin):
     google_id = db.Column(db.String(100), unique=True, nullable=False)
     hash_id = db.Column(db.String(64), unique=True, nullable=False, index=True)  # Identificador anonimizado
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Incrementada a cada alteração de negociações, saldos ou ações do usuário (ver src/utils/cache_posicoes.py)
+    versao_dados = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relacionamentos
     relatorios = db.relationship('Relatorio', backref='user', lazy=True, cascade="all, delete-orphan", 
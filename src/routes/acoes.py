@@ -5,8 +5,8 @@ from wtforms import StringField, SubmitField
 from wtforms.validators import DataRequired
 from src.models import db
 from src.models.all_models import Acao
-import requests
-from bs4 import BeautifulSoup
+from src.utils import busca_cnpj
+from src.utils.indice_emissores import consultar_emissor
 
 acoes_bp = Blueprint('acoes', __name__, url_prefix='/acoes')
 
@@ -16,6 +16,15 @@ class AcaoForm(FlaskForm):
     nome_empresa = StringField('Nome da Empresa')
     submit = SubmitField('Salvar')
 
+def preencher_pelo_indice(form):
+    """Completa o CNPJ e o nome da empresa deixados em branco com o índice local de emissores"""
+    if form.cnpj.data and form.nome_empresa.data:
+        return
+    emissor = consultar_emissor(form.codigo.data)
+    if emissor:
+        form.nome_empresa.data = form.nome_empresa.data or emissor[0]
+        form.cnpj.data = form.cnpj.data or emissor[1]
+
 @acoes_bp.route('/', methods=['GET'])
 @login_required
 def listar():
@@ -27,6 +36,7 @@ def listar():
 def cadastrar():
     form = AcaoForm()
     if form.validate_on_submit():
+        preencher_pelo_indice(form)
         acao = Acao(
             codigo=form.codigo.data.upper(),
             cnpj=form.cnpj.data,
@@ -54,7 +64,15 @@ def editar(id):
     form = AcaoForm(obj=acao)
     
     if form.validate_on_submit():
-        acao.codigo = form.codigo.data.upper()
+        preencher_pelo_indice(form)
+        codigo = form.codigo.data.upper()
+
+        # Verificar se o novo código já pertence a outra ação deste usuário
+        if Acao.query.filter(Acao.user_hash == current_user.hash_id, Acao.codigo == codigo, Acao.id != id).first():
+            flash(f'A ação {codigo} já está cadastrada!', 'warning')
+            return redirect(url_for('acoes.listar'))
+
+        acao.codigo = codigo
         acao.cnpj = form.cnpj.data
         acao.nome_empresa = form.nome_empresa.data
         
@@ -67,27 +85,9 @@ def editar(id):
 @acoes_bp.route('/buscar_cnpj/<codigo>')
 @login_required
 def buscar_cnpj(codigo):
-    """Função para buscar CNPJ de uma ação na internet"""
+    """Busca o CNPJ de uma ação no cache compartilhado e, se preciso, na internet"""
     try:
-        # Implementação básica - em produção seria necessário um serviço mais robusto
-        url = f"https://www.google.com/search?q=cnpj+{codigo}+b3+bovespa"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        # Desabilitar verificação de SSL para contornar o problema de certificado
-        response = requests.get(url, headers=headers, verify=False)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Busca por padrões de CNPJ (XX.XXX.XXX/XXXX-XX)
-        text = soup.get_text()
-        import re
-        cnpj_pattern = r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}'
-        cnpj_matches = re.findall(cnpj_pattern, text)
-        
-        if cnpj_matches:
-            return cnpj_matches[0]
-        else:
-            return "CNPJ não encontrado"
+        return busca_cnpj.buscar_cnpj(codigo.upper())
     except Exception as e:
         # Fallback para não interromper o fluxo do sistema
         print(f"Erro ao buscar CNPJ: {str(e)}")
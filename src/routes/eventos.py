@@ -0,0 +1,135 @@
+from flask import Blueprint, render_template, redirect, url_for, flash
+from flask_wtf import FlaskForm
+from flask_login import login_required, current_user
+from wtforms import DateField, IntegerField, SelectField, SubmitField
+from wtforms.validators import DataRequired, NumberRange
+from src.models import db
+from src.models.all_models import EventoCorporativo, Acao
+from src.utils.apuracao import atualizar_calculos
+from src.utils.eventos_corporativos import TIPO_GRUPAMENTO, TIPOS_EVENTO
+from src.utils.posicao import registrar_alteracoes
+
+eventos_bp = Blueprint('eventos', __name__, url_prefix='/eventos')
+
+class EventoCorporativoForm(FlaskForm):
+    acao_id = SelectField('Ação', coerce=int, validators=[DataRequired()])
+    tipo = SelectField('Tipo', choices=[(tipo, tipo) for tipo in TIPOS_EVENTO], validators=[DataRequired()])
+    data_ex = DateField('Data Ex', validators=[DataRequired()], format='%Y-%m-%d')
+    quantidade_antes = IntegerField('Quantidade Antes', validators=[DataRequired(), NumberRange(min=1)])
+    quantidade_depois = IntegerField('Quantidade Depois', validators=[DataRequired(), NumberRange(min=1)])
+    submit = SubmitField('Salvar')
+
+    def validate(self, extra_validators=None):
+        if not super().validate(extra_validators):
+            return False
+        # Grupamento reduz a quantidade; desdobramento e bonificação aumentam
+        if (self.tipo.data == TIPO_GRUPAMENTO) != (self.quantidade_depois.data < self.quantidade_antes.data):
+            self.quantidade_depois.errors.append(
+                'No grupamento a quantidade depois deve ser menor que a anterior; nos demais eventos, maior.'
+            )
+            return False
+        return True
+
+def _acoes_do_usuario():
+    return [(a.id, a.codigo) for a in Acao.query.filter_by(user_hash=current_user.hash_id).order_by(Acao.codigo).all()]
+
+def _evento_existente(acao_id, data_ex, id=None):
+    query = EventoCorporativo.query.filter(
+        EventoCorporativo.acao_id == acao_id,
+        EventoCorporativo.data_ex == data_ex,
+        EventoCorporativo.user_hash == current_user.hash_id
+    )
+    if id is not None:
+        query = query.filter(EventoCorporativo.id != id)
+    return query.first()
+
+@eventos_bp.route('/', methods=['GET'])
+@login_required
+def listar():
+    eventos = EventoCorporativo.query.filter_by(user_hash=current_user.hash_id).order_by(EventoCorporativo.data_ex.desc()).all()
+    return render_template('eventos/listar.html', eventos=eventos)
+
+@eventos_bp.route('/cadastrar', methods=['GET', 'POST'])
+@login_required
+def cadastrar():
+    form = EventoCorporativoForm()
+    # Preencher as opções do dropdown de ações - apenas ações do usuário atual
+    form.acao_id.choices = _acoes_do_usuario()
+    
+    if form.validate_on_submit():
+        # Verificar se a ação pertence ao usuário atual
+        acao = Acao.query.filter_by(id=form.acao_id.data, user_hash=current_user.hash_id).first()
+        if not acao:
+            flash('Ação não encontrada ou não pertence ao seu cadastro!', 'danger')
+            return redirect(url_for('eventos.listar'))
+        
+        if _evento_existente(form.acao_id.data, form.data_ex.data):
+            flash('Já existe um evento cadastrado para esta ação nesta data!', 'warning')
+            return redirect(url_for('eventos.listar'))
+        
+        evento = EventoCorporativo(
+            acao_id=form.acao_id.data,
+            tipo=form.tipo.data,
+            data_ex=form.data_ex.data,
+            quantidade_antes=form.quantidade_antes.data,
+            quantidade_depois=form.quantidade_depois.data,
+            user_hash=current_user.hash_id
+        )
+        
+        db.session.add(evento)
+        db.session.flush()
+        atualizar_calculos(current_user.hash_id, {evento.acao_id: evento.data_ex})
+        db.session.commit()
+        flash('Evento corporativo cadastrado com sucesso!', 'success')
+        return redirect(url_for('eventos.listar'))
+    
+    return render_template('eventos/cadastrar.html', form=form)
+
+@eventos_bp.route('/editar/<int:id>', methods=['GET', 'POST'])
+@login_required
+def editar(id):
+    # Garantir que o evento pertence ao usuário atual
+    evento = EventoCorporativo.query.filter_by(id=id, user_hash=current_user.hash_id).first_or_404()
+    form = EventoCorporativoForm(obj=evento)
+    form.acao_id.choices = _acoes_do_usuario()
+    
+    if form.validate_on_submit():
+        acao = Acao.query.filter_by(id=form.acao_id.data, user_hash=current_user.hash_id).first()
+        if not acao:
+            flash('Ação não encontrada ou não pertence ao seu cadastro!', 'danger')
+            return redirect(url_for('eventos.listar'))
+        
+        if _evento_existente(form.acao_id.data, form.data_ex.data, id):
+            flash('Já existe outro evento cadastrado para esta ação nesta data!', 'warning')
+            return redirect(url_for('eventos.listar'))
+        
+        # As posições mudam a partir da menor entre a data ex anterior e a nova
+        alteracoes = {evento.acao_id: evento.data_ex}
+        
+        evento.acao_id = form.acao_id.data
+        evento.tipo = form.tipo.data
+        evento.data_ex = form.data_ex.data
+        evento.quantidade_antes = form.quantidade_antes.data
+        evento.quantidade_depois = form.quantidade_depois.data
+        
+        db.session.flush()
+        registrar_alteracoes(alteracoes, {evento.acao_id: evento.data_ex})
+        atualizar_calculos(current_user.hash_id, alteracoes)
+        db.session.commit()
+        flash('Evento corporativo atualizado com sucesso!', 'success')
+        return redirect(url_for('eventos.listar'))
+    
+    return render_template('eventos/editar.html', form=form, evento=evento)
+
+@eventos_bp.route('/excluir/<int:id>', methods=['POST'])
+@login_required
+def excluir(id):
+    # Garantir que o evento pertence ao usuário atual
+    evento = EventoCorporativo.query.filter_by(id=id, user_hash=current_user.hash_id).first_or_404()
+    alteracoes = {evento.acao_id: evento.data_ex}
+    db.session.delete(evento)
+    db.session.flush()
+    atualizar_calculos(current_user.hash_id, alteracoes)
+    db.session.commit()
+    flash('Evento corporativo excluído com sucesso!', 'success')
+    return redirect(url_for('eventos.listar'))
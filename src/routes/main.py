@@ -1,14 +1,21 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, current_app
 from flask_wtf import FlaskForm
 from flask_login import login_required, current_user
-from wtforms import DateField, SubmitField
+from wtforms import DateField, StringField, SubmitField
 from wtforms.validators import DataRequired
-import requests
-from bs4 import BeautifulSoup
-import re
+import json
 from datetime import datetime
-from src.models import db
-from src.models.all_models import Acao, Negociacao, SaldoPrecoMedio
+from src.utils.busca_cnpj import resolver_cnpjs
+from src.utils.bens_direitos import calcular_bens_e_direitos, interpretar_anos
+from src.utils.posicao import calcular_posicoes, calcular_serie, datas_da_serie, FREQUENCIAS
+from src.utils.cache_posicoes import posicoes_em_cache
+from src.utils.enriquecimento_cnpj import enfileirar_cnpjs
+from src.utils.exportacao import exportar, gerar_csv, FORMATO_PRECO_MEDIO, FORMATO_REAIS, FORMATOS_EXPORTACAO
+from src.models.all_models import ApuracaoMensal
+
+# Quantidade de datas por página da série de posições
+LIMITE_SERIE_PADRAO = 100
+LIMITE_SERIE_MAXIMO = 1000
 
 main_bp = Blueprint('main', __name__)
 
@@ -34,144 +41,176 @@ def gerar_relatorio():
     if form.validate_on_submit():
         data_base = form.data_base.data
         resultado = calcular_posicao_na_data(data_base)
+        if any(item['cnpj_pendente'] for item in resultado):
+            flash('Os CNPJs não cadastrados estão sendo buscados e aparecerão na próxima geração do relatório.', 'info')
         return render_template('relatorio_resultado.html', 
                               resultado=resultado, 
                               data_base=data_base)
     
     return render_template('gerar_relatorio.html')
 
+@main_bp.route('/gerar_relatorio/exportar', methods=['GET'])
+@login_required
+def exportar_relatorio():
+    """Relatório de posição na data base em CSV ou XLSX (parâmetros data_base e formato)"""
+    try:
+        data_base = datetime.strptime(request.args['data_base'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        flash('Informe a data base no formato AAAA-MM-DD.', 'danger')
+        return redirect(url_for('main.gerar_relatorio'))
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        flash('Formato de exportação inválido.', 'danger')
+        return redirect(url_for('main.gerar_relatorio'))
+    
+    resultado = calcular_posicao_na_data(data_base)
+    colunas = [('Código', None), ('Quantidade', None), ('Preço Médio', FORMATO_PRECO_MEDIO),
+               ('Valor Total', FORMATO_REAIS), ('CNPJ', None)]
+    linhas = ((item['codigo'], item['quantidade'], item['preco_medio'], item['valor_total'], item['cnpj'])
+              for item in resultado)
+    return exportar(formato, f'posicao_{data_base.isoformat()}', 'Posição', colunas, linhas)
+
 def calcular_posicao_na_data(data_base):
     """
     Calcula a posição (saldo e preço médio) de cada ação na data base informada.
     Considera todas as negociações até a data e os saldos cadastrados.
     Inclui o valor de corretagem no cálculo do preço médio para operações de compra.
+    
+    O resultado fica em cache até que as negociações, saldos ou ações do usuário
+    sejam alterados (ver src/utils/cache_posicoes.py). Os CNPJs não cadastrados
+    são buscados em segundo plano (ver src/utils/enriquecimento_cnpj.py) e
+    aparecem na próxima geração do relatório.
     """
-    resultado = []
+    resultado = posicoes_em_cache(current_user.hash_id, data_base, lambda: _calcular_posicao_na_data(data_base))
     
-    # Buscar todas as ações que possuem negociações ou saldos cadastrados
-    acoes = db.session.query(Acao).join(
-        Negociacao, Acao.id == Negociacao.acao_id, isouter=True
-    ).join(
-        SaldoPrecoMedio, Acao.id == SaldoPrecoMedio.acao_id, isouter=True
-    ).filter(
-        db.or_(
-            Negociacao.id != None,
-            SaldoPrecoMedio.id != None
-        ),
-        Acao.user_hash == current_user.hash_id  # Filtrar apenas ações do usuário atual
-    ).distinct().all()
+    faltantes = [item['codigo'] for item in resultado if item['cnpj_pendente']]
+    if faltantes:
+        enfileirar_cnpjs(current_app._get_current_object(), current_user.hash_id, faltantes, resolver_cnpjs)
     
-    for acao in acoes:
-        # Buscar o saldo mais recente cadastrado antes da data base
-        saldo_cadastrado = SaldoPrecoMedio.query.filter(
-            SaldoPrecoMedio.acao_id == acao.id,
-            SaldoPrecoMedio.data_base <= data_base,
-            SaldoPrecoMedio.user_hash == current_user.hash_id  # Filtrar apenas saldos do usuário atual
-        ).order_by(SaldoPrecoMedio.data_base.desc()).first()
-        
-        data_inicial = None
-        saldo_inicial = 0
-        preco_medio_inicial = 0
-        
-        if saldo_cadastrado:
-            data_inicial = saldo_cadastrado.data_base
-            saldo_inicial = saldo_cadastrado.quantidade
-            preco_medio_inicial = saldo_cadastrado.preco_medio
-        
-        # Buscar todas as negociações entre a data inicial e a data base
-        negociacoes = Negociacao.query.filter(
-            Negociacao.acao_id == acao.id,
-            Negociacao.data_negocio <= data_base,
-            Negociacao.user_hash == current_user.hash_id  # Filtrar apenas negociações do usuário atual
-        )
-        
-        if data_inicial:
-            negociacoes = negociacoes.filter(Negociacao.data_negocio > data_inicial)
-            
-        negociacoes = negociacoes.order_by(Negociacao.data_negocio).all()
-        
-        # Calcular saldo e preço médio
-        saldo = saldo_inicial
-        preco_medio = preco_medio_inicial
-        valor_investido = saldo_inicial * preco_medio_inicial
-        
-        for neg in negociacoes:
-            if neg.tipo_movimentacao == 'Compra':
-                # Calcular o valor total da compra incluindo corretagem
-                valor_compra = neg.quantidade * neg.preco
-                
-                # Adicionar corretagem ao valor investido se informada
-                if neg.corretagem is not None and neg.corretagem > 0:
-                    valor_compra += neg.corretagem
-                
-                # Atualizar valor investido e saldo
-                valor_investido += valor_compra
-                saldo += neg.quantidade
-                
-                # Recalcular preço médio
-                if saldo > 0:
-                    preco_medio = valor_investido / saldo
-            elif neg.tipo_movimentacao == 'Venda':
-                # Atualizar saldo
-                saldo -= neg.quantidade
-                
-                # Se o saldo zerar ou ficar negativo, reiniciar o preço médio
-                if saldo <= 0:
-                    valor_investido = 0
-                    preco_medio = 0
-                    # Se ficar negativo (erro nos dados), corrigir para zero
-                    if saldo < 0:
-                        saldo = 0
-        
-        # Só adicionar ao resultado se tiver saldo
-        if saldo > 0:
-            # Buscar CNPJ se não estiver cadastrado
-            cnpj = acao.cnpj
-            if not cnpj:
-                cnpj = buscar_cnpj_online(acao.codigo)
-                # Atualizar o CNPJ no banco se encontrado
-                if cnpj and cnpj != "CNPJ não encontrado":
-                    acao.cnpj = cnpj
-                    db.session.commit()
-            
-            resultado.append({
-                'codigo': acao.codigo,
-                'quantidade': saldo,
-                'preco_medio': preco_medio,
-                'valor_total': saldo * preco_medio,
-                'cnpj': cnpj or "CNPJ não cadastrado"
-            })
+    return resultado
+
+def _calcular_posicao_na_data(data_base):
+    resultado = []
     
-    # Ordenar por código da ação
-    resultado.sort(key=lambda x: x['codigo'])
+    # Todas as posições calculadas em uma única passada (ver src/utils/posicao.py)
+    for posicao in calcular_posicoes(current_user.hash_id, data_base):
+        acao = posicao['acao']
+        saldo = posicao['quantidade']
+        preco_medio = posicao['preco_medio']
+        
+        resultado.append({
+            'codigo': acao.codigo,
+            'quantidade': saldo,
+            'preco_medio': preco_medio,
+            'valor_total': saldo * preco_medio,
+            'cnpj': acao.cnpj or "CNPJ não cadastrado",
+            'cnpj_pendente': not acao.cnpj
+        })
     
     return resultado
 
-def buscar_cnpj_online(codigo_acao):
-    """Busca o CNPJ da ação na internet"""
-    try:
-        # Desabilitar verificação de SSL para evitar erros
-        import urllib3
-        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+class BensDireitosForm(FlaskForm):
+    anos = StringField('Anos', validators=[DataRequired()])
+    submit = SubmitField('Gerar Relatório')
+
+@main_bp.route('/bens_direitos', methods=['GET', 'POST'])
+@login_required
+def bens_direitos():
+    """
+    Situação das ações em 31/12 de cada ano informado, para a ficha de Bens e
+    Direitos do IRPF (ver src/utils/bens_direitos.py).
+    """
+    form = BensDireitosForm()
+    if form.validate_on_submit():
+        try:
+            anos = interpretar_anos(form.anos.data)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('bens_direitos.html', form=form, bens=None, anos=[])
         
-        # Fazer a busca no Google
-        url = f"https://www.google.com/search?q=cnpj+{codigo_acao}+b3+bovespa"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        bens = calcular_bens_e_direitos(current_user.hash_id, anos)
+        faltantes = [bem['codigo'] for bem in bens if bem['cnpj_pendente']]
+        if faltantes:
+            enfileirar_cnpjs(current_app._get_current_object(), current_user.hash_id, faltantes, resolver_cnpjs)
+            flash('Os CNPJs não cadastrados estão sendo buscados e aparecerão na próxima geração do relatório.', 'info')
+        return render_template('bens_direitos.html', form=form, bens=bens, anos=anos)
+    
+    if not form.anos.data:
+        ano_base = datetime.now().year - 1
+        form.anos.data = f'{ano_base - 1}, {ano_base}'
+    return render_template('bens_direitos.html', form=form, bens=None, anos=[])
+
+@main_bp.route('/apuracao', methods=['GET'])
+@login_required
+def apuracao():
+    """Apuração mensal do imposto de renda sobre as vendas de ações (ver src/utils/apuracao.py)"""
+    apuracoes = ApuracaoMensal.query.filter_by(user_hash=current_user.hash_id).order_by(ApuracaoMensal.mes.desc()).all()
+    return render_template('apuracao.html', apuracoes=apuracoes)
+
+@main_bp.route('/posicoes/serie', methods=['GET'])
+@login_required
+def serie_posicoes():
+    """
+    Série de posições (quantidade, valor investido e preço médio) de todas as
+    ações em cada data do intervalo, em JSON ou CSV.
+    
+    Parâmetros: inicio e fim (AAAA-MM-DD), frequencia (diaria, mensal ou
+    negociacao), formato (json ou csv) e limite (datas por página). A página
+    seguinte começa em proximo_inicio (no JSON) ou no cabeçalho Link (no CSV).
+    O valor investido e o preço médio são exatos, em texto com 2 e
+    CASAS_PRECO_MEDIO casas decimais.
+    """
+    try:
+        inicio = datetime.strptime(request.args['inicio'], '%Y-%m-%d').date()
+        fim = datetime.strptime(request.args.get('fim', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        limite = min(int(request.args.get('limite', LIMITE_SERIE_PADRAO)), LIMITE_SERIE_MAXIMO)
+    except (KeyError, ValueError):
+        return jsonify({'erro': 'Informe inicio e fim no formato AAAA-MM-DD e um limite numérico'}), 400
+    
+    frequencia = request.args.get('frequencia', FREQUENCIAS[0])
+    formato = request.args.get('formato', 'json')
+    if frequencia not in FREQUENCIAS or formato not in ('json', 'csv') or limite < 1 or fim < inicio:
+        return jsonify({'erro': 'Parâmetros inválidos'}), 400
+    
+    # Uma data a mais indica se existe próxima página
+    datas = datas_da_serie(current_user.hash_id, inicio, fim, frequencia, limite + 1)
+    proximo_inicio = datas[limite] if len(datas) > limite else None
+    serie = calcular_serie(current_user.hash_id, datas[:limite])
+    
+    colunas = ['data', 'codigo', 'quantidade', 'valor_investido', 'preco_medio']
+    linhas = serie[colunas].itertuples(index=False, name=None)
+    
+    if formato == 'csv':
+        linhas_csv = (
+            [data.isoformat(), codigo, quantidade, str(valor_investido), str(preco_medio)]
+            for data, codigo, quantidade, valor_investido, preco_medio in linhas
+        )
+        response = Response(stream_with_context(gerar_csv([(coluna, None) for coluna in colunas], linhas_csv)),
+                            mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename=posicoes_{inicio.isoformat()}_{fim.isoformat()}.csv'
+        if proximo_inicio:
+            proxima = url_for('main.serie_posicoes', **{**request.args.to_dict(), 'inicio': proximo_inicio.isoformat()})
+            response.headers['Link'] = f'<{proxima}>; rel="next"'
+        return response
+    
+    def gerar_json():
+        cabecalho = {
+            'inicio': inicio.isoformat(),
+            'fim': fim.isoformat(),
+            'frequencia': frequencia,
+            'proximo_inicio': proximo_inicio.isoformat() if proximo_inicio else None,
         }
-        response = requests.get(url, headers=headers, verify=False)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Procurar por padrões de CNPJ (XX.XXX.XXX/XXXX-XX)
-            text = soup.get_text()
-            cnpj_pattern = r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}'
-            cnpj_matches = re.findall(cnpj_pattern, text)
-            
-            if cnpj_matches:
-                return cnpj_matches[0]
-        
-        return "CNPJ não encontrado"
-    except Exception as e:
-        return f"Erro ao buscar CNPJ: {str(e)}"
+        yield json.dumps(cabecalho)[:-1] + ', "posicoes": ['
+        separador = ''
+        for data, codigo, quantidade, valor_investido, preco_medio in linhas:
+            yield separador + json.dumps({
+                'data': data.isoformat(),
+                'codigo': codigo,
+                'quantidade': int(quantidade),
+                'valor_investido': str(valor_investido),
+                'preco_medio': str(preco_medio),
+            })
+            separador = ', '
+        yield ']}'
+    
+    return Response(stream_with_context(gerar_json()), mimetype='application/json')
@@ -5,6 +5,8 @@ from wtforms import FloatField, HiddenField, BooleanField, SubmitField
 from wtforms.validators import Optional
 from src.models import db
 from src.models.all_models import Negociacao, Acao
+from src.utils.apuracao import atualizar_calculos
+from src.utils.exportacao import consultar_negociacoes, exportar, COLUNAS_NEGOCIACOES, FORMATOS_EXPORTACAO
 
 negociacoes_bp = Blueprint('negociacoes', __name__, url_prefix='/negociacoes')
 
@@ -33,6 +35,19 @@ def listar():
                           negociacoes=negociacoes, 
                           filtro_sem_corretagem=filtro_sem_corretagem)
 
+@negociacoes_bp.route('/exportar', methods=['GET'])
+@login_required
+def exportar_negociacoes():
+    """Todas as negociações do usuário em CSV ou XLSX, lidas do banco em lotes durante o envio"""
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACAO:
+        flash('Formato de exportação inválido.', 'danger')
+        return redirect(url_for('negociacoes.listar'))
+    
+    filtro_sem_corretagem = request.args.get('sem_corretagem', 'false') == 'true'
+    linhas = consultar_negociacoes(current_user.hash_id, sem_corretagem=filtro_sem_corretagem)
+    return exportar(formato, 'negociacoes', 'Negociações', COLUNAS_NEGOCIACOES, linhas)
+
 @negociacoes_bp.route('/editar/<int:id>', methods=['GET', 'POST'])
 @login_required
 def editar(id):
@@ -42,6 +57,9 @@ def editar(id):
     
     if form.validate_on_submit():
         negociacao.corretagem = form.corretagem.data
+        db.session.flush()
+        # A corretagem compõe o preço médio a partir da data da negociação
+        atualizar_calculos(current_user.hash_id, {negociacao.acao_id: negociacao.data_negocio})
         db.session.commit()
         flash('Valor de corretagem atualizado com sucesso!', 'success')
         return redirect(url_for('negociacoes.listar'))
@@ -1,20 +1,33 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
 from flask_wtf import FlaskForm
 from flask_login import login_required, current_user
-from wtforms import FileField, SubmitField
+from wtforms import MultipleFileField, SubmitField
 from werkzeug.utils import secure_filename
+from sqlalchemy.exc import IntegrityError
 import os
+import zipfile
+from contextlib import closing
 import pandas as pd
-from datetime import datetime
-from sqlalchemy.exc import IntegrityError
 from src.models import db
-from src.models.all_models import Relatorio, Negociacao, Acao
+from src.models.all_models import Relatorio, Negociacao, Acao, ImportacaoJob
+from src.utils.importacao import linhas_invalidas, inserir_negociacoes, carregar_mapa_acoes, TAMANHO_LOTE
+from src.utils.chave_natural import gerar_chaves_naturais
+from src.utils.apuracao import atualizar_calculos
+from src.utils.posicao import datas_alteradas, registrar_alteracoes
+from src.utils.leitores import ler_arquivos_em_paralelo, ler_em_lotes
+from src.utils.importacao_jobs import criar_job, enfileirar_importacao, recuperar_jobs_abandonados
+from src.utils.armazenamento import salvar_upload, abrir_arquivo, copiar_para_temporario
 
 relatorios_bp = Blueprint('relatorios', __name__, url_prefix='/relatorios')
 
+# Limites dos arquivos ZIP: quantidade de arquivos e tamanho descompactado de cada um
+MAXIMO_ARQUIVOS_ZIP = 100
+TAMANHO_MAXIMO_ARQUIVO_ZIP = 50 * 1024 * 1024
+
 class RelatorioForm(FlaskForm):
-    arquivo = FileField('Arquivo de Relatório B3', validators=[])
+    arquivos = MultipleFileField('Arquivos de Relatório B3', validators=[])
     submit = SubmitField('Enviar')
+    simular = SubmitField('Simular Importação')
 
 @relatorios_bp.route('/', methods=['GET'])
 @login_required
@@ -27,105 +40,323 @@ def listar():
 def upload():
     form = RelatorioForm()
     if form.validate_on_submit():
-        arquivo = form.arquivo.data
-        if arquivo:
-            filename = secure_filename(arquivo.filename)
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            arquivo.save(filepath)
+        recebidos = [arquivo for arquivo in form.arquivos.data or [] if arquivo and arquivo.filename]
+        if recebidos and form.simular.data:
+            # Apenas mostrar o que seria importado, sem gravar nada no banco de dados
+            simulacoes = []
+            try:
+                for filename, stream in _extrair_arquivos(recebidos):
+                    # O arquivo é lido de uma cópia temporária, sem ser gravado na pasta de uploads
+                    with copiar_para_temporario(stream) as (digest, arquivo):
+                        existente = Relatorio.query.filter_by(user_hash=current_user.hash_id, sha256=digest).first()
+                        try:
+                            resultado = simular_relatorio(arquivo, current_user.hash_id)
+                        except ValueError as e:
+                            flash(f'Erro ao simular a importação de {filename}: {str(e)}', 'danger')
+                            continue
+                    simulacoes.append({'nome_arquivo': filename, 'existente': existente, 'resultado': resultado})
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('relatorios.upload'))
             
-            # Criar registro do relatório
-            relatorio = Relatorio(
-                nome_arquivo=filename,
-                user_hash=current_user.hash_id
-            )
-            db.session.add(relatorio)
-            db.session.commit()
+            return render_template('relatorios/simulacao.html', simulacoes=simulacoes)
+        
+        if recebidos:
+            # Liberar os arquivos de importações interrompidas antes de procurar os já importados
+            recuperar_jobs_abandonados(current_user.hash_id)
             
-            # Processar o arquivo
+            # Gravar os arquivos (extraindo os arquivos ZIP), ignorando os já importados
+            novos = {}
+            try:
+                for filename, stream in _extrair_arquivos(recebidos):
+                    digest, filepath = salvar_upload(stream, current_app.config['UPLOAD_FOLDER'])
+                    
+                    existente = Relatorio.query.filter_by(user_hash=current_user.hash_id, sha256=digest).first()
+                    if existente:
+                        flash(f'O arquivo {filename} já foi importado em {existente.data_upload.strftime("%d/%m/%Y %H:%M")} ({existente.nome_arquivo}).', 'warning')
+                    elif digest not in novos:
+                        novos[digest] = (filename, filepath)
+            except ValueError as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('relatorios.upload'))
+            
+            if not novos:
+                return redirect(url_for('relatorios.listar'))
+            
+            # Criar o job e um registro de relatório por arquivo
+            job = criar_job(current_user.hash_id)
+            relatorios = []
+            for digest, (filename, filepath) in novos.items():
+                relatorio = Relatorio(
+                    nome_arquivo=filename,
+                    sha256=digest,
+                    user_hash=current_user.hash_id,
+                    importacao_job_id=job.id
+                )
+                db.session.add(relatorio)
+                relatorios.append((filepath, relatorio))
             try:
-                negociacoes_processadas, negociacoes_ignoradas = processar_relatorio(filepath, relatorio.id)
-                
-                if negociacoes_ignoradas > 0:
-                    flash(f'Relatório processado com sucesso! {negociacoes_processadas} negociações importadas, {negociacoes_ignoradas} negociações ignoradas por duplicidade.', 'success')
-                else:
-                    flash(f'Relatório processado com sucesso! {negociacoes_processadas} negociações importadas.', 'success')
-            except Exception as e:
-                db.session.delete(relatorio)
                 db.session.commit()
-                flash(f'Erro ao processar o relatório: {str(e)}', 'danger')
-                
-            return redirect(url_for('relatorios.listar'))
+            except IntegrityError:
+                # Envio simultâneo do mesmo arquivo
+                db.session.rollback()
+                flash('Este arquivo já foi importado.', 'warning')
+                return redirect(url_for('relatorios.listar'))
+            
+            # Processar os arquivos em segundo plano
+            app = current_app._get_current_object()
+            if len(relatorios) == 1:
+                filepath, relatorio = relatorios[0]
+                enfileirar_importacao(app, job.id, processar_relatorio, filepath, relatorio.id)
+            else:
+                enfileirar_importacao(app, job.id, processar_lote, [(filepath, relatorio.id) for filepath, relatorio in relatorios])
+            
+            flash(f'{len(relatorios)} relatório(s) recebido(s)! A importação está sendo processada em segundo plano.', 'info')
+            return redirect(url_for('relatorios.importacao', job_id=job.id))
     
     return render_template('relatorios/upload.html', form=form)
 
-def processar_relatorio(filepath, relatorio_id):
+def _extrair_arquivos(recebidos):
     """
-    Processa o arquivo de relatório da B3 e salva as negociações no banco de dados
+    Gera (nome, stream) para cada arquivo enviado, expandindo o conteúdo dos arquivos ZIP.
+    
+    Raises:
+        ValueError: se um ZIP tiver mais de MAXIMO_ARQUIVOS_ZIP arquivos ou algum
+            arquivo maior que TAMANHO_MAXIMO_ARQUIVO_ZIP descompactado (verificado
+            antes de extrair qualquer arquivo do ZIP)
+    """
+    for arquivo in recebidos:
+        if not arquivo.filename.lower().endswith('.zip'):
+            yield secure_filename(arquivo.filename), arquivo.stream
+            continue
+        
+        with zipfile.ZipFile(arquivo.stream) as pacote:
+            membros = [
+                membro for membro in pacote.infolist()
+                if not membro.is_dir() and os.path.basename(membro.filename) and not membro.filename.startswith('__MACOSX/')
+            ]
+            if len(membros) > MAXIMO_ARQUIVOS_ZIP:
+                raise ValueError(f'O arquivo {arquivo.filename} tem mais de {MAXIMO_ARQUIVOS_ZIP} arquivos.')
+            for membro in membros:
+                if membro.file_size > TAMANHO_MAXIMO_ARQUIVO_ZIP:
+                    raise ValueError(
+                        f'O arquivo {os.path.basename(membro.filename)} em {arquivo.filename} excede '
+                        f'{TAMANHO_MAXIMO_ARQUIVO_ZIP // (1024 * 1024)} MB descompactado.'
+                    )
+            
+            # O tamanho lido de cada arquivo é limitado ao declarado (file_size) pelo zipfile
+            for membro in membros:
+                with pacote.open(membro) as stream:
+                    yield secure_filename(os.path.basename(membro.filename)), stream
+
+@relatorios_bp.route('/importacoes/<job_id>', methods=['GET'])
+@login_required
+def importacao(job_id):
+    """Página de acompanhamento de uma importação em segundo plano"""
+    recuperar_jobs_abandonados(current_user.hash_id)
+    job = ImportacaoJob.query.filter_by(id=job_id, user_hash=current_user.hash_id).first_or_404()
+    return render_template('relatorios/importacao.html', job=job)
+
+@relatorios_bp.route('/importacoes/<job_id>/status', methods=['GET'])
+@login_required
+def status_importacao(job_id):
+    """Retorna em JSON o progresso de uma importação em segundo plano"""
+    recuperar_jobs_abandonados(current_user.hash_id)
+    job = ImportacaoJob.query.filter_by(id=job_id, user_hash=current_user.hash_id).first_or_404()
+    return jsonify(job.to_dict())
+
+def processar_relatorio(filepath, relatorio_id, progresso=None):
+    """
+    Processa o arquivo de relatório da B3 e salva as negociações no banco de dados.
+    
+    O arquivo (XLSX, CSV ou Parquet) é lido em lotes de tamanho fixo, mantendo
+    o consumo de memória constante. As duplicadas são descartadas pelo próprio banco através do
+    índice único da chave natural (uix_negociacao_chave_natural).
+    
+    Todas as negociações são gravadas em uma única transação, que não é
+    confirmada aqui: quem chama faz o commit (executar_importacao o faz junto com
+    a conclusão do job). Em caso de erro, a transação é desfeita.
+    
+    Args:
+        progresso: função opcional chamada após cada lote com
+            (linhas_lidas, negociacoes_processadas, negociacoes_ignoradas);
+            não deve confirmar a transação.
     
     Returns:
         tuple: (negociacoes_processadas, negociacoes_ignoradas)
     """
-    # Ler o arquivo Excel
-    df = pd.read_excel(filepath)
+    return processar_lote([(filepath, relatorio_id)], progresso)
+
+def simular_relatorio(arquivo, user_hash):
+    """
+    Simula a importação do arquivo de relatório da B3 sem gravar nada no banco de dados.
     
-    # Obter o relatório para acessar o user_hash
-    relatorio = Relatorio.query.get(relatorio_id)
+    O arquivo é lido e normalizado em lotes, como em processar_relatorio, e as
+    duplicadas são identificadas pela chave natural: uma única consulta traz as
+    chaves das negociações do usuário no intervalo de datas do arquivo. Linhas
+    repetidas dentro do próprio arquivo também contam como duplicadas.
     
-    negociacoes_processadas = 0
-    negociacoes_ignoradas = 0
+    Args:
+        arquivo: arquivo binário aberto, com suporte a posicionamento (ver
+            abrir_arquivo e copiar_para_temporario)
     
-    # Processar cada linha do relatório
-    for _, row in df.iterrows():
-        # Converter a data para o formato correto
-        data_str = row['Data do Negócio']
-        if isinstance(data_str, str):
-            data = datetime.strptime(data_str, '%d/%m/%Y').date()
-        else:
-            data = data_str.date()
+    Returns:
+        dict: totais de negociações novas, duplicadas e inválidas, os mesmos
+        totais por ação e tipo de movimentação ('por_acao'), as ações que
+        seriam criadas e as primeiras linhas inválidas da planilha
+    """
+    mapa_acoes = carregar_mapa_acoes(user_hash)
+    # Ações ainda não cadastradas recebem ids provisórios negativos, que nunca coincidem com o banco
+    provisorios = {}
+    
+    lotes = []
+    for lote in ler_em_lotes(arquivo):
+        invalidas = linhas_invalidas(lote)
+        validas = lote[~invalidas]
         
-        # Verificar se a ação já existe, se não, criar
-        codigo_acao = row['Código de Negociação']
+        for codigo in sorted(set(validas['codigo'].unique()) - set(mapa_acoes) - set(provisorios)):
+            provisorios[codigo] = -(len(provisorios) + 1)
         
-        # Remover a letra F do final do código da ação, se existir
-        if codigo_acao.endswith('F'):
-            codigo_acao = codigo_acao[:-1]
-            
-        acao = Acao.query.filter_by(codigo=codigo_acao, user_hash=relatorio.user_hash).first()
-        if not acao:
-            acao = Acao(
-                codigo=codigo_acao,
-                user_hash=relatorio.user_hash
+        resumo = pd.DataFrame({
+            'codigo': lote['codigo'].fillna('-'),
+            'tipo_movimentacao': lote['tipo_movimentacao'].fillna('-'),
+            'data_negocio': lote['data_negocio'],
+            'chave_natural': None,
+        }, index=lote.index)
+        if not validas.empty:
+            acao_id = validas['codigo'].map(mapa_acoes).fillna(validas['codigo'].map(provisorios))
+            resumo.loc[~invalidas, 'chave_natural'] = gerar_chaves_naturais(
+                validas.assign(acao_id=acao_id, user_hash=user_hash)
             )
-            db.session.add(acao)
-            db.session.commit()
-        
-        # Criar a negociação
-        negociacao = Negociacao(
-            data_negocio=data,
-            tipo_movimentacao=row['Tipo de Movimentação'],
-            mercado=row['Mercado'],
-            prazo_vencimento=row['Prazo/Vencimento'],
-            instituicao=row['Instituição'],
-            quantidade=row['Quantidade'],
-            preco=row['Preço'],
-            valor=row['Valor'],
-            acao_id=acao.id,
-            relatorio_id=relatorio_id,
-            user_hash=relatorio.user_hash
-        )
+        lotes.append(resumo)
+    
+    resumo = pd.concat(lotes) if lotes else pd.DataFrame(columns=['codigo', 'tipo_movimentacao', 'data_negocio', 'chave_natural'])
+    validas = resumo['chave_natural'].notna()
+    
+    existentes = set()
+    if validas.any():
+        datas = resumo.loc[validas, 'data_negocio']
+        existentes = {
+            chave for (chave,) in db.session.query(Negociacao.chave_natural).filter(
+                Negociacao.user_hash == user_hash,
+                Negociacao.data_negocio.between(datas.min(), datas.max())
+            )
+        }
+    
+    duplicadas = validas & (resumo['chave_natural'].isin(existentes) | resumo['chave_natural'].duplicated())
+    resumo['situacao'] = 'novas'
+    resumo.loc[duplicadas, 'situacao'] = 'duplicadas'
+    resumo.loc[~validas, 'situacao'] = 'invalidas'
+    
+    situacoes = ['novas', 'duplicadas', 'invalidas']
+    por_acao = pd.crosstab(
+        [resumo['codigo'], resumo['tipo_movimentacao']], resumo['situacao']
+    ).reindex(columns=situacoes, fill_value=0)
+    
+    resultado = {situacao: int((resumo['situacao'] == situacao).sum()) for situacao in situacoes}
+    resultado.update({
+        'linhas_lidas': len(resumo),
+        'acoes_novas': list(provisorios),
+        # Número da linha na planilha (cabeçalho na linha 1)
+        'linhas_invalidas': [indice + 2 for indice in resumo.index[~validas][:10]],
+        'por_acao': [
+            {'codigo': codigo, 'tipo_movimentacao': tipo, **{situacao: int(linha[situacao]) for situacao in situacoes}}
+            for (codigo, tipo), linha in por_acao.iterrows()
+        ],
+    })
+    return resultado
+
+def processar_lote(arquivos, progresso=None):
+    """
+    Processa vários relatórios da B3 de uma só vez.
+    
+    Os arquivos são lidos em paralelo, um por processo (ver
+    ler_arquivos_em_paralelo), em lotes de tamanho fixo, e cada lote é gravado
+    pelo processo principal assim que chega, de modo que a memória usada não
+    depende do tamanho nem da quantidade de arquivos. Tudo é gravado em uma
+    única transação, confirmada por quem chama (como em processar_relatorio);
+    as negociações repetidas entre os arquivos são descartadas pelo índice
+    único da chave natural, e cada uma fica associada ao relatório do primeiro
+    arquivo (na ordem recebida) em que aparece.
+    
+    Args:
+        arquivos: lista de tuplas (filepath, relatorio_id) de um mesmo usuário
+        progresso: função opcional, como em processar_relatorio
+    
+    Returns:
+        tuple: (negociacoes_processadas, negociacoes_ignoradas)
+    """
+    relatorios = [db.session.get(Relatorio, relatorio_id) for _, relatorio_id in arquivos]
+    user_hash = relatorios[0].user_hash
+    
+    linhas_lidas = 0
+    negociacoes_processadas = 0
+    negociacoes_ignoradas = 0
+    
+    # Mapa código -> ação carregado uma única vez; cada lote só cria as ações novas
+    mapa_acoes = carregar_mapa_acoes(user_hash)
+    # Menor data importada de cada ação, para atualizar as posições mensais ao final
+    alteracoes = {}
+    
+    try:
+        with closing(_ler_lotes([filepath for filepath, _ in arquivos])) as lotes:
+            for indice, lote in lotes:
+                relatorio = relatorios[indice]
+                invalidas = linhas_invalidas(lote)
+                if invalidas.any():
+                    # Número da linha na planilha (cabeçalho na linha 1)
+                    linhas = ', '.join(str(indice_linha + 2) for indice_linha in lote.index[invalidas][:10])
+                    raise ValueError(f"Linhas com dados inválidos no relatório {relatorio.nome_arquivo}: {linhas}")
+                
+                processadas, ignoradas = inserir_negociacoes(lote, relatorio, mapa_acoes)
+                if ignoradas and indice < len(relatorios) - 1:
+                    # O lote de um arquivo posterior pode ter chegado antes
+                    _manter_no_primeiro_relatorio(lote, relatorio, relatorios[indice + 1:], mapa_acoes)
+                negociacoes_processadas += processadas
+                negociacoes_ignoradas += ignoradas
+                linhas_lidas += len(lote)
+                registrar_alteracoes(alteracoes, _datas_por_acao(lote, mapa_acoes))
+                
+                if progresso:
+                    progresso(linhas_lidas, negociacoes_processadas, negociacoes_ignoradas)
         
-        # Tentar adicionar a negociação, ignorando se já existir uma idêntica
-        try:
-            db.session.add(negociacao)
-            db.session.commit()
-            negociacoes_processadas += 1
-        except IntegrityError:
-            # Se ocorrer erro de integridade (duplicidade), fazer rollback e continuar
-            db.session.rollback()
-            negociacoes_ignoradas += 1
+        atualizar_calculos(user_hash, alteracoes)
+        db.session.flush()
+    except Exception:
+        db.session.rollback()
+        raise
     
     return negociacoes_processadas, negociacoes_ignoradas
 
+def _ler_lotes(caminhos):
+    """Gera (índice do arquivo, lote) dos arquivos; vários arquivos são lidos em paralelo"""
+    if len(caminhos) > 1:
+        yield from ler_arquivos_em_paralelo(caminhos)
+        return
+    with abrir_arquivo(caminhos[0]) as arquivo:
+        for lote in ler_em_lotes(arquivo):
+            yield 0, lote
+
+def _manter_no_primeiro_relatorio(lote, relatorio, posteriores, mapa_acoes):
+    """Passa para o relatório as negociações do lote já gravadas por um arquivo posterior do mesmo envio"""
+    chaves = gerar_chaves_naturais(lote.drop(columns=['codigo']).assign(
+        acao_id=lote['codigo'].map(mapa_acoes), user_hash=relatorio.user_hash
+    ))
+    posteriores = [posterior.id for posterior in posteriores]
+    for inicio in range(0, len(chaves), TAMANHO_LOTE):
+        Negociacao.query.filter(
+            Negociacao.chave_natural.in_(chaves[inicio:inicio + TAMANHO_LOTE]),
+            Negociacao.relatorio_id.in_(posteriores)
+        ).execution_options(user_hashes=[relatorio.user_hash]).update(
+            {Negociacao.relatorio_id: relatorio.id}, synchronize_session=False
+        )
+
+def _datas_por_acao(negociacoes, mapa_acoes):
+    """Retorna a menor data de negociação de cada ação do DataFrame normalizado"""
+    if negociacoes.empty:
+        return {}
+    return negociacoes.groupby(negociacoes['codigo'].map(mapa_acoes))['data_negocio'].min().to_dict()
+
 @relatorios_bp.route('/detalhes/<int:id>', methods=['GET'])
 @login_required
 def detalhes(id):
@@ -143,9 +374,12 @@ def excluir(id):
     
     # Contar quantas negociações serão excluídas
     negociacoes_count = Negociacao.query.filter_by(relatorio_id=id, user_hash=current_user.hash_id).count()
+    alteracoes = datas_alteradas(current_user.hash_id, Negociacao.relatorio_id == id)
     
     # Excluir o relatório (as negociações serão excluídas automaticamente pelo cascade)
     db.session.delete(relatorio)
+    db.session.flush()
+    atualizar_calculos(current_user.hash_id, alteracoes)
     db.session.commit()
     
     flash(f'Relatório excluído com sucesso! {negociacoes_count} negociações foram removidas.', 'success')
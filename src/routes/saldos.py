@@ -5,6 +5,8 @@ from wtforms import DateField, FloatField, IntegerField, SelectField, SubmitFiel
 from wtforms.validators import DataRequired, NumberRange
 from src.models import db
 from src.models.all_models import SaldoPrecoMedio, Acao
+from src.utils.apuracao import atualizar_calculos
+from src.utils.posicao import registrar_alteracoes
 from datetime import datetime
 
 saldos_bp = Blueprint('saldos', __name__, url_prefix='/saldos')
@@ -56,6 +58,8 @@ def cadastrar():
         )
         
         db.session.add(saldo)
+        db.session.flush()
+        atualizar_calculos(current_user.hash_id, {saldo.acao_id: saldo.data_base})
         db.session.commit()
         flash('Saldo e preço médio cadastrados com sucesso!', 'success')
         return redirect(url_for('saldos.listar'))
@@ -90,11 +94,17 @@ def editar(id):
             flash(f'Já existe outro saldo cadastrado para esta ação nesta data!', 'warning')
             return redirect(url_for('saldos.listar'))
         
+        # As posições mensais mudam a partir da menor entre a data anterior e a nova
+        alteracoes = {saldo.acao_id: saldo.data_base}
+        
         saldo.acao_id = form.acao_id.data
         saldo.data_base = form.data_base.data
         saldo.quantidade = form.quantidade.data
         saldo.preco_medio = form.preco_medio.data
         
+        db.session.flush()
+        registrar_alteracoes(alteracoes, {saldo.acao_id: saldo.data_base})
+        atualizar_calculos(current_user.hash_id, alteracoes)
         db.session.commit()
         flash('Saldo e preço médio atualizados com sucesso!', 'success')
         return redirect(url_for('saldos.listar'))
@@ -106,7 +116,10 @@ def editar(id):
 def excluir(id):
     # Garantir que o saldo pertence ao usuário atual
     saldo = SaldoPrecoMedio.query.filter_by(id=id, user_hash=current_user.hash_id).first_or_404()
+    alteracoes = {saldo.acao_id: saldo.data_base}
     db.session.delete(saldo)
+    db.session.flush()
+    atualizar_calculos(current_user.hash_id, alteracoes)
     db.session.commit()
     flash('Saldo excluído com sucesso!', 'success')
     return redirect(url_for('saldos.listar'))
@@ -0,0 +1,208 @@
+"""
+Apuração mensal do imposto de renda sobre a venda de ações.
+
+O resultado de cada venda é calculado sobre as mesmas colunas e o mesmo
+custo médio do cálculo de posição (src/utils/posicao.py), em uma única
+passada cronológica a partir das posições mensais, com valores em centavos.
+
+Regras aplicadas, por mês:
+
+- day trade: compra e venda da mesma ação no mesmo dia e na mesma instituição;
+  a quantidade em day trade de cada negociação é classificada e gravada por
+  src/utils/day_trade.py, e o resultado é a diferença entre o valor vendido e
+  o comprado nessa quantidade, descontada a corretagem proporcional;
+- operações comuns (swing trade): a quantidade restante das vendas, com
+  resultado igual ao valor vendido menos a corretagem proporcional e o custo
+  pelo preço médio da posição antes da venda;
+- isenção: o lucro das operações comuns é isento no mês em que o total dessas
+  vendas não passa de R$ 20.000,00;
+- prejuízos: acumulados separadamente para operações comuns e day trade e
+  compensados com os lucros tributáveis dos meses seguintes da mesma modalidade;
+- alíquotas de 15% (operações comuns) e 20% (day trade) sobre a base após a
+  compensação.
+
+Os meses com vendas são gravados em apuracoes_mensais com os prejuízos a
+compensar ao fim do mês; uma alteração recalcula apenas os meses a partir do
+mês alterado, partindo dos prejuízos do último mês anterior gravado.
+"""
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from src.models import db
+from src.models.all_models import ApuracaoMensal, Negociacao, SaldoPrecoMedio
+from src.utils.day_trade import classificar_day_trades
+from src.utils.dinheiro import centavos_para_reais, dividir_arredondando, UNIDADES_POR_CENTAVO
+from src.utils.posicao import atualizar_posicoes_mensais, calcular_colunas, carregar_colunas
+
+# Total de vendas de operações comuns no mês até o qual o lucro é isento, em centavos
+LIMITE_ISENCAO_SWING_TRADE = 20_000_00
+
+# Alíquotas em porcentagem
+ALIQUOTA_SWING_TRADE = 15
+ALIQUOTA_DAY_TRADE = 20
+
+
+def atualizar_calculos(user_hash, alteracoes):
+    """
+    Atualiza a classificação de day trade, as posições mensais e as apurações
+    após incluir, alterar ou excluir negociações ou saldos.
+
+    Args:
+        alteracoes: dict acao_id -> menor data alterada (ver registrar_alteracoes)
+    """
+    if not alteracoes:
+        return
+    classificar_day_trades(user_hash, alteracoes)
+    atualizar_posicoes_mensais(user_hash, alteracoes)
+    atualizar_apuracoes(user_hash, min(alteracoes.values()))
+
+
+def atualizar_apuracoes(user_hash, data_alterada):
+    """
+    Recalcula as apurações do usuário a partir do mês da data alterada.
+
+    As posições mensais devem estar atualizadas (ver atualizar_calculos).
+    """
+    inicio = data_alterada.replace(day=1)
+
+    db.session.query(ApuracaoMensal).filter(
+        ApuracaoMensal.user_hash == user_hash,
+        ApuracaoMensal.mes >= inicio
+    ).delete(synchronize_session=False)
+
+    anterior = ApuracaoMensal.query.filter(
+        ApuracaoMensal.user_hash == user_hash,
+        ApuracaoMensal.mes < inicio
+    ).order_by(ApuracaoMensal.mes.desc()).first()
+    prejuizos = (0, 0)
+    if anterior:
+        prejuizos = (int(anterior.prejuizo_swing_trade * 100), int(anterior.prejuizo_day_trade * 100))
+
+    _, colunas = carregar_colunas(user_hash, inicio - timedelta(days=1), None)
+    resultados = calcular_resultados(colunas, calcular_colunas(colunas))
+    resultados = resultados[resultados['data'] >= inicio]
+
+    registros = [
+        dict(apuracao, user_hash=user_hash)
+        for apuracao in apurar_meses(resultados_mensais(resultados), *prejuizos)
+    ]
+    if registros:
+        db.session.execute(insert(ApuracaoMensal), registros)
+
+
+def recalcular_apuracoes(user_hash):
+    """Recalcula todas as apurações do usuário desde a primeira negociação ou saldo cadastrado"""
+    inicios = [
+        db.session.query(db.func.min(Negociacao.data_negocio)).filter(Negociacao.user_hash == user_hash).scalar(),
+        db.session.query(db.func.min(SaldoPrecoMedio.data_base)).filter(SaldoPrecoMedio.user_hash == user_hash).scalar(),
+    ]
+    inicios = [data for data in inicios if data is not None]
+    if inicios:
+        atualizar_apuracoes(user_hash, min(inicios))
+    else:
+        ApuracaoMensal.query.filter(ApuracaoMensal.user_hash == user_hash).delete(synchronize_session=False)
+
+
+def calcular_resultados(colunas, historico):
+    """
+    Valor vendido e resultado, em centavos, de cada linha, separados em
+    operações comuns e day trade.
+
+    Args:
+        colunas: colunas de carregar_colunas
+        historico: resultado de calcular_colunas para as colunas
+
+    Returns:
+        DataFrame com as colunas data, vendas_swing_trade, resultado_swing_trade,
+        vendas_day_trade e resultado_day_trade
+    """
+    quantidades = colunas['quantidade_negociada']
+    venda = quantidades < 0
+    negociada = np.abs(quantidades)
+    day_trade = colunas['day_trade']
+    swing_trade = negociada - day_trade
+    precos = colunas['preco']
+    corretagens = colunas['corretagem']
+
+    # Posição da ação antes de cada linha
+    inicio_grupo = np.ones(len(quantidades), dtype=bool)
+    inicio_grupo[1:] = colunas['acao_id'][1:] != colunas['acao_id'][:-1]
+    saldo_anterior = np.where(inicio_grupo, 0, np.roll(historico['quantidade'], 1))
+    preco_anterior = np.where(inicio_grupo, 0, np.roll(historico['preco_medio'], 1))
+
+    def corretagem_proporcional(quantidade):
+        return dividir_arredondando(corretagens * quantidade, np.maximum(negociada, 1))
+
+    # Vendas além da posição conhecida não têm custo e ficam fora do resultado
+    vendido = np.where(venda, np.minimum(swing_trade, saldo_anterior), 0)
+    custo = dividir_arredondando(vendido * preco_anterior, UNIDADES_POR_CENTAVO)
+
+    return pd.DataFrame({
+        'data': colunas['data'],
+        'vendas_swing_trade': np.where(venda, swing_trade * precos, 0),
+        'resultado_swing_trade': np.where(venda, vendido * precos - corretagem_proporcional(vendido) - custo, 0),
+        'vendas_day_trade': np.where(venda, day_trade * precos, 0),
+        'resultado_day_trade': np.where(venda, day_trade * precos, -day_trade * precos)
+                               - corretagem_proporcional(day_trade),
+    })
+
+
+def resultados_mensais(resultados):
+    """Soma os resultados por mês (último dia), apenas dos meses com vendas"""
+    colunas = ['vendas_swing_trade', 'resultado_swing_trade', 'vendas_day_trade', 'resultado_day_trade']
+    if resultados.empty:
+        return pd.DataFrame(columns=['mes'] + colunas)
+
+    meses = (pd.to_datetime(resultados['data']) + pd.offsets.MonthEnd(0)).dt.date
+    mensais = resultados[colunas].groupby(meses.rename('mes')).sum().reset_index()
+    return mensais[(mensais['vendas_swing_trade'] > 0) | (mensais['vendas_day_trade'] > 0)]
+
+
+def apurar_meses(mensais, prejuizo_swing_trade=0, prejuizo_day_trade=0):
+    """
+    Aplica a isenção, a compensação de prejuízos e as alíquotas a cada mês, em
+    ordem cronológica.
+
+    Args:
+        mensais: DataFrame de resultados_mensais (valores em centavos)
+        prejuizo_swing_trade, prejuizo_day_trade: prejuízos a compensar, em
+            centavos, antes do primeiro mês
+
+    Returns:
+        list: dicts com as colunas de ApuracaoMensal (valores em Decimal)
+    """
+    apuracoes = []
+    for mes, vendas_swing, resultado_swing, vendas_day, resultado_day in mensais[[
+        'mes', 'vendas_swing_trade', 'resultado_swing_trade', 'vendas_day_trade', 'resultado_day_trade'
+    ]].itertuples(index=False, name=None):
+        isento = vendas_swing <= LIMITE_ISENCAO_SWING_TRADE and resultado_swing > 0
+        if isento:
+            base_swing = 0
+        else:
+            base_swing, prejuizo_swing_trade = _compensar(int(resultado_swing), prejuizo_swing_trade)
+        base_day, prejuizo_day_trade = _compensar(int(resultado_day), prejuizo_day_trade)
+
+        apuracoes.append({
+            'mes': mes,
+            'vendas_swing_trade': centavos_para_reais(vendas_swing),
+            'resultado_swing_trade': centavos_para_reais(resultado_swing),
+            'isento_swing_trade': bool(isento),
+            'base_swing_trade': centavos_para_reais(base_swing),
+            'imposto_swing_trade': centavos_para_reais(dividir_arredondando(base_swing * ALIQUOTA_SWING_TRADE, 100)),
+            'prejuizo_swing_trade': centavos_para_reais(prejuizo_swing_trade),
+            'vendas_day_trade': centavos_para_reais(vendas_day),
+            'resultado_day_trade': centavos_para_reais(resultado_day),
+            'base_day_trade': centavos_para_reais(base_day),
+            'imposto_day_trade': centavos_para_reais(dividir_arredondando(base_day * ALIQUOTA_DAY_TRADE, 100)),
+            'prejuizo_day_trade': centavos_para_reais(prejuizo_day_trade),
+        })
+    return apuracoes
+
+
+def _compensar(resultado, prejuizo):
+    """Retorna (base tributável, prejuízo a compensar) após compensar o resultado do mês"""
+    if resultado <= 0:
+        return 0, prejuizo - resultado
+    compensado = min(prejuizo, resultado)
+    return resultado - compensado, prejuizo - compensado
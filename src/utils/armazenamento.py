@@ -0,0 +1,104 @@
+"""
+Armazenamento de uploads endereçado por conteúdo.
+
+Cada arquivo enviado é gravado comprimido (gzip) na pasta de uploads com o nome
+derivado do seu SHA-256, de modo que envios idênticos compartilham o mesmo
+arquivo em disco e nenhum envio sobrescreve outro com o mesmo nome. Um envio
+que só precisa ser lido (a simulação da importação) vai para um arquivo
+temporário, sem passar pela pasta de uploads.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Tamanho dos blocos lidos do upload ao calcular o hash e comprimir
+TAMANHO_BLOCO = 1024 * 1024
+
+# Acima deste tamanho os arquivos temporários (descomprimidos ou copiados do envio)
+# são mantidos em disco em vez de memória
+LIMITE_DESCOMPRESSAO_MEMORIA = 16 * 1024 * 1024
+
+ASSINATURA_GZIP = b'\x1f\x8b'
+
+
+def caminho_por_digest(pasta, digest):
+    """Retorna o caminho do arquivo comprimido correspondente ao digest"""
+    return os.path.join(pasta, digest[:2], f'{digest}.gz')
+
+
+def salvar_upload(stream, pasta):
+    """
+    Grava o conteúdo do stream comprimido, calculando o SHA-256 em uma única passada.
+
+    Se já existir um arquivo com o mesmo conteúdo, o existente é mantido.
+
+    Returns:
+        tuple: (digest, caminho)
+    """
+    os.makedirs(pasta, exist_ok=True)
+    sha256 = hashlib.sha256()
+
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as destino, gzip.GzipFile(fileobj=destino, mode='wb', mtime=0) as comprimido:
+            for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+                sha256.update(bloco)
+                comprimido.write(bloco)
+
+        digest = sha256.hexdigest()
+        caminho = caminho_por_digest(pasta, digest)
+        if os.path.exists(caminho):
+            os.remove(temporario)
+        else:
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            os.replace(temporario, caminho)
+    except Exception:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    return digest, caminho
+
+
+@contextmanager
+def copiar_para_temporario(stream):
+    """
+    Copia o conteúdo do stream para um arquivo temporário (em memória enquanto
+    pequeno), calculando o SHA-256 na mesma passada. O arquivo é descartado ao
+    sair do bloco.
+
+    Yields:
+        tuple: (digest, arquivo posicionado no início)
+    """
+    sha256 = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=LIMITE_DESCOMPRESSAO_MEMORIA) as temporario:
+        for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b''):
+            sha256.update(bloco)
+            temporario.write(bloco)
+        temporario.seek(0)
+        yield sha256.hexdigest(), temporario
+
+
+@contextmanager
+def abrir_arquivo(caminho):
+    """
+    Abre um arquivo de upload para leitura binária com suporte a posicionamento.
+
+    Arquivos comprimidos são descomprimidos para um arquivo temporário (em memória
+    enquanto pequenos); arquivos sem compressão são abertos diretamente.
+    """
+    with open(caminho, 'rb') as arquivo:
+        if arquivo.read(len(ASSINATURA_GZIP)) != ASSINATURA_GZIP:
+            arquivo.seek(0)
+            yield arquivo
+            return
+
+        arquivo.seek(0)
+        with gzip.GzipFile(fileobj=arquivo, mode='rb') as comprimido, \
+                tempfile.SpooledTemporaryFile(max_size=LIMITE_DESCOMPRESSAO_MEMORIA) as descomprimido:
+            shutil.copyfileobj(comprimido, descomprimido, TAMANHO_BLOCO)
+            descomprimido.seek(0)
+            yield descomprimido
@@ -0,0 +1,90 @@
+"""
+Relatório anual de Bens e Direitos para a declaração do IRPF.
+
+A declaração pede a situação de cada ação em 31/12 do ano-base e do ano
+anterior, e corrigir declarações passadas exige outros fins de ano. Em vez de
+um relatório de posição por data, todas as datas são calculadas em uma única
+passada cronológica pelas negociações (calcular_serie em src/utils/posicao.py)
+e reunidas em uma tabela com uma linha por ação e uma situação por ano.
+"""
+import re
+from datetime import date
+from decimal import Decimal
+from src.models.all_models import Acao
+from src.utils.posicao import calcular_serie
+
+# Quantidade máxima de anos em um relatório
+LIMITE_ANOS = 10
+
+
+def interpretar_anos(texto):
+    """
+    Converte uma lista de anos como '2023, 2024' ou '2019-2024' em uma lista
+    ordenada de anos distintos.
+
+    Raises:
+        ValueError: se o texto tiver um ano inválido ou mais de LIMITE_ANOS anos
+    """
+    anos = set()
+    for parte in re.split(r'[,;\s]+', texto.strip()):
+        if not parte:
+            continue
+        intervalo = re.fullmatch(r'(\d{4})-(\d{4})', parte)
+        if intervalo:
+            inicio, fim = sorted(int(ano) for ano in intervalo.groups())
+            anos.update(range(inicio, fim + 1))
+        elif re.fullmatch(r'\d{4}', parte):
+            anos.add(int(parte))
+        else:
+            raise ValueError(f'Ano inválido: {parte}')
+        if len(anos) > LIMITE_ANOS:
+            raise ValueError(f'Informe no máximo {LIMITE_ANOS} anos')
+    if not anos:
+        raise ValueError('Informe ao menos um ano')
+    return sorted(anos)
+
+
+def calcular_bens_e_direitos(user_hash, anos):
+    """
+    Calcula a situação de cada ação em 31/12 de cada ano.
+
+    Args:
+        anos: lista ordenada de anos
+
+    Returns:
+        list: dicts {'codigo', 'cnpj', 'cnpj_pendente', 'situacoes'} ordenados pelo código, das
+        ações com saldo positivo em algum dos anos; situacoes é um dict
+        ano -> {'quantidade', 'preco_medio', 'valor'} (valores em Decimal, zero
+        nos anos sem saldo, como pede a declaração)
+    """
+    serie = calcular_serie(user_hash, [date(ano, 12, 31) for ano in anos])
+    if serie.empty:
+        return []
+
+    acoes = {
+        acao.id: acao for acao in Acao.query.filter(
+            Acao.user_hash == user_hash,
+            Acao.id.in_(serie['acao_id'].unique().tolist())
+        )
+    }
+    zerada = {'quantidade': 0, 'preco_medio': Decimal('0'), 'valor': Decimal('0.00')}
+    bens = {}
+    linhas = serie[['data', 'acao_id', 'quantidade', 'valor_investido', 'preco_medio']].itertuples(
+        index=False, name=None
+    )
+    for data, acao_id, quantidade, valor_investido, preco_medio in linhas:
+        if acao_id not in bens:
+            acao = acoes[acao_id]
+            bens[acao_id] = {
+                'codigo': acao.codigo,
+                'cnpj': acao.cnpj or 'CNPJ não cadastrado',
+                'cnpj_pendente': not acao.cnpj,
+                'situacoes': {ano: zerada for ano in anos},
+            }
+        # A situação declarada é o custo de aquisição da quantidade em carteira
+        bens[acao_id]['situacoes'][data.year] = {
+            'quantidade': int(quantidade),
+            'preco_medio': preco_medio,
+            'valor': valor_investido,
+        }
+    return sorted(bens.values(), key=lambda bem: bem['codigo'])
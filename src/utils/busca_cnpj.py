@@ -0,0 +1,77 @@
+"""
+Busca do CNPJ de códigos de ação.
+
+O CNPJ é procurado primeiro no índice local de emissores
+(src/utils/indice_emissores.py), depois no cache compartilhado
+(src/utils/cache_cnpj.py) e, só se não estiver em nenhum dos dois, na
+internet, pelo resolvedor do processo (src/utils/resolvedor_cnpj.py).
+resolver_cnpjs faz isso para um lote de códigos, usado pela busca em segundo
+plano do relatório de posição; buscar_cnpj, para um código, usado pelo botão
+Buscar CNPJ do cadastro de ações.
+"""
+from threading import Lock
+from src.utils.cache_cnpj import buscar_com_cache, consultar_cache, gravar_cache
+from src.utils.indice_emissores import consultar_emissor
+from src.utils.resolvedor_cnpj import ResolvedorCnpj
+
+MENSAGEM_NAO_ENCONTRADO = 'CNPJ não encontrado'
+
+_resolvedor = None
+_resolvedor_lock = Lock()
+
+
+def buscar_cnpj(codigo):
+    """
+    Retorna o CNPJ do código, ou MENSAGEM_NAO_ENCONTRADO.
+
+    Raises:
+        requests.RequestException, CircuitoAberto: em erros de rede (o resultado
+            não vai para o cache)
+    """
+    emissor = consultar_emissor(codigo)
+    if emissor:
+        return emissor[1]
+    return buscar_com_cache(codigo, buscar_cnpj_no_google) or MENSAGEM_NAO_ENCONTRADO
+
+
+def resolver_cnpjs(codigos, resolvedor=None):
+    """
+    Retorna o CNPJ de cada código, consultando o cache em uma única consulta e
+    buscando os restantes na internet simultaneamente. Os resultados da
+    internet são gravados no cache.
+
+    Returns:
+        dict: código -> CNPJ, ou MENSAGEM_NAO_ENCONTRADO; os códigos cuja busca
+        falhou (erro de rede ou disjuntor aberto) ficam de fora
+    """
+    resultados, restantes = {}, []
+    for codigo in dict.fromkeys(codigo.upper() for codigo in codigos):
+        emissor = consultar_emissor(codigo)
+        if emissor:
+            resultados[codigo] = emissor[1]
+        else:
+            restantes.append(codigo)
+
+    if restantes:
+        em_cache = consultar_cache(restantes)
+        online, _ = (resolvedor or obter_resolvedor()).buscar_em_lote(
+            [codigo for codigo in restantes if codigo not in em_cache]
+        )
+        gravar_cache(online)
+        resultados.update(em_cache)
+        resultados.update(online)
+    return {codigo: cnpj or MENSAGEM_NAO_ENCONTRADO for codigo, cnpj in resultados.items()}
+
+
+def buscar_cnpj_no_google(codigo):
+    """Procura o CNPJ do código na internet; None se não houver"""
+    return obter_resolvedor().buscar(codigo)
+
+
+def obter_resolvedor():
+    """Resolvedor compartilhado pelo processo: uma sessão, um limitador de taxa e um disjuntor"""
+    global _resolvedor
+    with _resolvedor_lock:
+        if _resolvedor is None:
+            _resolvedor = ResolvedorCnpj()
+        return _resolvedor
@@ -0,0 +1,100 @@
+"""
+Cache dos CNPJs encontrados na busca online, compartilhado por todos os
+usuários.
+
+O CNPJ de um código de ação não depende do usuário, então o resultado da busca
+fica na tabela cnpjs_cache e vale para todos: cada código é buscado na internet
+no máximo uma vez a cada TTL_ENCONTRADO, por mais usuários que tenham a ação.
+As buscas sem resultado também ficam no cache, com a validade menor
+TTL_NAO_ENCONTRADO, para não serem repetidas a cada relatório; erros de rede
+não são guardados.
+
+No mesmo processo, buscas simultâneas do mesmo código esperam a primeira
+terminar e usam o seu resultado.
+"""
+import os
+from datetime import datetime, timedelta
+from threading import Lock
+from sqlalchemy.exc import IntegrityError
+from src.models import db
+from src.models.all_models import CnpjCache
+
+# Validade dos CNPJs encontrados e das buscas sem resultado
+TTL_ENCONTRADO = timedelta(days=int(os.environ.get('CNPJ_CACHE_DIAS', '90')))
+TTL_NAO_ENCONTRADO = timedelta(hours=int(os.environ.get('CNPJ_CACHE_NEGATIVO_HORAS', '24')))
+
+# Trava por código com busca em andamento neste processo
+_travas = {}
+_travas_lock = Lock()
+
+
+def consultar_cache(codigos, agora=None):
+    """
+    Retorna as entradas válidas do cache para os códigos.
+
+    Returns:
+        dict: código -> CNPJ, ou None para as buscas sem resultado; os códigos
+        fora do cache ou com entrada vencida não aparecem
+    """
+    agora = agora or datetime.utcnow()
+    entradas = db.session.query(CnpjCache.codigo, CnpjCache.cnpj).filter(
+        CnpjCache.codigo.in_([codigo.upper() for codigo in codigos]),
+        CnpjCache.expira_em > agora
+    )
+    return dict(entradas.all())
+
+
+def gravar_cache(resultados, agora=None):
+    """
+    Grava o resultado das buscas no cache e faz commit.
+
+    Args:
+        resultados: dict código -> CNPJ encontrado, ou None quando a busca não
+            encontrou o CNPJ
+    """
+    if not resultados:
+        return
+    agora = agora or datetime.utcnow()
+    resultados = {codigo.upper(): cnpj for codigo, cnpj in resultados.items()}
+    existentes = {
+        entrada.codigo: entrada
+        for entrada in CnpjCache.query.filter(CnpjCache.codigo.in_(list(resultados)))
+    }
+    for codigo, cnpj in resultados.items():
+        entrada = existentes.get(codigo) or CnpjCache(codigo=codigo)
+        entrada.cnpj = cnpj
+        entrada.expira_em = agora + (TTL_ENCONTRADO if cnpj else TTL_NAO_ENCONTRADO)
+        db.session.add(entrada)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Outro processo gravou o mesmo código ao mesmo tempo, com resultado equivalente
+        db.session.rollback()
+
+
+def buscar_com_cache(codigo, buscar):
+    """
+    Retorna o CNPJ do código pelo cache e, se não estiver nele, pela busca.
+
+    Args:
+        buscar: função que recebe o código e retorna o CNPJ ou None quando não
+            o encontra; exceções (erros de rede) são propagadas sem gravar no cache
+
+    Returns:
+        str ou None: o CNPJ, ou None quando não encontrado
+    """
+    codigo = codigo.upper()
+    with _travas_lock:
+        trava = _travas.setdefault(codigo, Lock())
+    with trava:
+        try:
+            em_cache = consultar_cache([codigo])
+            if codigo in em_cache:
+                return em_cache[codigo]
+            cnpj = buscar(codigo)
+            gravar_cache({codigo: cnpj})
+            return cnpj
+        finally:
+            with _travas_lock:
+                if _travas.get(codigo) is trava:
+                    del _travas[codigo]
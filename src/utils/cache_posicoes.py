@@ -0,0 +1,144 @@
+"""
+Cache do relatório de posições por usuário.
+
+O resultado de calcular_posicao_na_data fica em memória, com chave
+(user_hash, data_base, versão dos dados do usuário), e as entradas menos
+usadas são descartadas quando o cache atinge TAMANHO_CACHE_POSICOES.
+
+A versão dos dados é a coluna users.versao_dados, incrementada na mesma
+transação sempre que negociações, saldos, eventos corporativos ou ações do
+usuário são incluídos, alterados ou excluídos, seja pela unidade de trabalho
+do ORM (before_flush) ou por INSERT/UPDATE/DELETE em lote (do_orm_execute).
+Um INSERT com VALUES de várias linhas pode informar os usuários na opção de
+execução user_hashes; sem ela, o comando é compilado para descobri-los. Como a versão fica no banco,
+uma alteração feita por qualquer worker invalida o cache de todos.
+"""
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models import db
+from src.models.all_models import Acao, EventoCorporativo, Negociacao, SaldoPrecoMedio, User
+
+TAMANHO_CACHE_POSICOES = 256
+
+# Modelos cujas alterações mudam o relatório de posições
+MODELOS_VERSIONADOS = (Acao, Negociacao, SaldoPrecoMedio, EventoCorporativo)
+_TABELAS_VERSIONADAS = {modelo.__tablename__: modelo for modelo in MODELOS_VERSIONADOS}
+
+
+class CachePosicoes:
+    """Cache LRU, seguro entre threads, dos relatórios de posições"""
+
+    def __init__(self, tamanho_maximo=TAMANHO_CACHE_POSICOES):
+        self.tamanho_maximo = tamanho_maximo
+        self._entradas = OrderedDict()
+        self._lock = Lock()
+
+    def obter(self, user_hash, data_base, versao):
+        """Retorna o resultado guardado ou None"""
+        chave = (user_hash, data_base, versao)
+        with self._lock:
+            resultado = self._entradas.get(chave)
+            if resultado is not None:
+                self._entradas.move_to_end(chave)
+            return resultado
+
+    def guardar(self, user_hash, data_base, versao, resultado):
+        """Guarda o resultado e descarta as versões antigas do usuário e as entradas menos usadas"""
+        with self._lock:
+            for chave in [chave for chave in self._entradas if chave[0] == user_hash and chave[2] != versao]:
+                del self._entradas[chave]
+            self._entradas[(user_hash, data_base, versao)] = resultado
+            self._entradas.move_to_end((user_hash, data_base, versao))
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+cache_posicoes = CachePosicoes()
+
+
+def obter_versao_dados(user_hash):
+    """Retorna a versão atual dos dados do usuário"""
+    return db.session.query(User.versao_dados).filter(User.hash_id == user_hash).scalar()
+
+
+def posicoes_em_cache(user_hash, data_base, calcular):
+    """
+    Retorna o relatório de posições do cache ou o calcula com calcular().
+
+    A versão é lida antes do cálculo: se os dados mudarem durante o cálculo, o
+    resultado fica guardado com a versão anterior e não é reaproveitado.
+    """
+    versao = obter_versao_dados(user_hash)
+    resultado = cache_posicoes.obter(user_hash, data_base, versao)
+    if resultado is None:
+        resultado = calcular()
+        cache_posicoes.guardar(user_hash, data_base, versao, resultado)
+    return resultado
+
+
+def _incrementar_versoes(session, user_hashes):
+    user_hashes = {user_hash for user_hash in user_hashes if user_hash}
+    if user_hashes:
+        # UPDATE do Core: não sincroniza objetos User da sessão nem dispara um novo flush
+        session.execute(
+            User.__table__.update()
+            .where(User.__table__.c.hash_id.in_(sorted(user_hashes)))
+            .values(versao_dados=User.__table__.c.versao_dados + 1)
+        )
+
+
+@event.listens_for(Session, 'before_flush')
+def _versionar_alteracoes(session, flush_context, instances):
+    user_hashes = set()
+    for objeto in list(session.new) + list(session.deleted):
+        if isinstance(objeto, MODELOS_VERSIONADOS):
+            user_hashes.add(objeto.user_hash)
+    for objeto in session.dirty:
+        if isinstance(objeto, MODELOS_VERSIONADOS) and session.is_modified(objeto, include_collections=False):
+            user_hashes.add(objeto.user_hash)
+    _incrementar_versoes(session, user_hashes)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _versionar_comandos_em_lote(estado):
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabela = getattr(estado.statement, 'table', None)
+    modelo = _TABELAS_VERSIONADAS.get(getattr(tabela, 'name', None))
+    if modelo is None:
+        return
+
+    if estado.is_insert:
+        parametros = estado.parameters
+        if 'user_hashes' in estado.execution_options:
+            # Informado pelo chamador, evitando compilar o comando (ver _insert_ignorando_duplicadas)
+            parametros = [{'user_hash': user_hash} for user_hash in estado.execution_options['user_hashes']]
+        elif not parametros:
+            # INSERT com VALUES de várias linhas: os valores ficam no próprio comando
+            compilado = estado.statement.compile(dialect=estado.session.get_bind().dialect)
+            parametros = [{'user_hash': valor} for nome, valor in compilado.params.items()
+                          if nome == 'user_hash' or nome.startswith('user_hash_m')]
+        if isinstance(parametros, dict):
+            parametros = [parametros]
+        user_hashes = {linha.get('user_hash') for linha in parametros}
+    else:
+        consulta = select(modelo.user_hash).distinct()
+        if estado.statement.whereclause is not None:
+            consulta = consulta.where(estado.statement.whereclause)
+        elif estado.parameters:
+            # UPDATE em lote pela chave primária: uma lista de dicts com o id de cada linha
+            parametros = estado.parameters
+            if isinstance(parametros, dict):
+                parametros = [parametros]
+            consulta = consulta.where(modelo.id.in_([linha['id'] for linha in parametros]))
+        user_hashes = set(estado.session.execute(consulta).scalars())
+    _incrementar_versoes(estado.session, user_hashes)
@@ -0,0 +1,45 @@
+"""
+Impressão digital de tamanho fixo da chave natural de uma negociação.
+
+A chave natural (usuário, data, tipo, mercado, instituição, ação, quantidade,
+preço e valor) é serializada em uma forma canônica e resumida com BLAKE2b de
+16 bytes, permitindo deduplicar negociações com um índice único de 32
+caracteres em vez de um índice composto por nove colunas.
+"""
+import hashlib
+from decimal import Decimal, ROUND_HALF_UP
+
+# Campos que compõem a chave natural, na ordem usada na serialização
+CAMPOS_CHAVE_NATURAL = [
+    'user_hash', 'data_negocio', 'tipo_movimentacao', 'mercado', 'instituicao',
+    'acao_id', 'quantidade', 'preco', 'valor'
+]
+
+CENTAVO = Decimal('0.01')
+
+
+def gerar_chave_natural(user_hash, data_negocio, tipo_movimentacao, mercado, instituicao,
+                        acao_id, quantidade, preco, valor):
+    """Retorna a impressão digital (32 caracteres hexadecimais) da negociação"""
+    partes = [
+        user_hash,
+        data_negocio.isoformat(),
+        tipo_movimentacao,
+        mercado,
+        instituicao,
+        str(int(acao_id)),
+        str(int(quantidade)),
+        _formatar_valor(preco),
+        _formatar_valor(valor),
+    ]
+    return hashlib.blake2b('\x1f'.join(partes).encode(), digest_size=16).hexdigest()
+
+
+def gerar_chaves_naturais(df):
+    """Calcula a impressão digital de todas as linhas de um DataFrame com os CAMPOS_CHAVE_NATURAL"""
+    return [gerar_chave_natural(*linha) for linha in zip(*(df[campo] for campo in CAMPOS_CHAVE_NATURAL))]
+
+
+def _formatar_valor(valor):
+    # Valores monetários são comparados com duas casas decimais, como nas colunas Numeric
+    return str(Decimal(str(valor)).quantize(CENTAVO, rounding=ROUND_HALF_UP))
@@ -0,0 +1,234 @@
+"""
+Kernel vetorizado de custo médio.
+
+Calcula com NumPy, para todas as ações de uma só vez, o saldo, o valor
+investido e o preço médio após cada negociação, sem laços em Python por
+negociação. As negociações são recebidas como arrays colunares agrupados por
+ação:
+
+- quantidades: positivas nas compras, negativas nas vendas e zero nos demais
+  tipos de movimentação;
+- custos: quantidade x preço mais a corretagem nas compras, zero nos demais.
+
+As regras são as mesmas do cálculo de posição: a compra soma o custo ao valor
+investido e recalcula o preço médio; a venda baixa do valor investido a
+quantidade vendida ao preço médio, que não muda, e, quando o saldo chega a zero
+(ou ficaria negativo), saldo, valor investido e preço médio são reiniciados.
+
+Posições conhecidas (um saldo cadastrado ou uma posição mensal) entram como
+linhas de posição inicial: a linha substitui a posição da ação pela sua
+quantidade, custo (valor investido) e preço médio, e as negociações seguintes
+partem dela.
+
+Com custos inteiros e escala_preco, o preço médio também é inteiro e segue a
+regra de arredondamento de src/utils/dinheiro.py.
+
+Desdobramentos, grupamentos e bonificações entram como linhas de ajuste, uma
+por evento, com a proporção do próprio evento: na linha, o saldo anterior é
+multiplicado pela proporção, as frações de ação são descartadas (e baixadas do
+valor investido pelo preço médio) e o preço médio é dividido pela proporção.
+Cada evento altera apenas o saldo da sua linha, de modo que a quantidade de
+eventos de uma ação não tem limite.
+"""
+import numpy as np
+from src.utils.dinheiro import dividir_arredondando
+
+
+def calcular_custo_medio(grupos, quantidades, custos, precos_iniciais=None, escala_preco=None,
+                         ajustes=None, proporcoes=None):
+    """
+    Calcula o histórico de custo médio de cada negociação.
+
+    Args:
+        grupos: array com o identificador da ação de cada negociação; as
+            negociações de uma mesma ação devem estar contíguas e em ordem
+            cronológica
+        quantidades: array de inteiros com as quantidades com sinal
+        custos: array com o custo de cada compra (inteiros em centavos
+            mantêm o valor investido exato)
+        precos_iniciais: array opcional com o preço médio das linhas de
+            posição inicial e NaN nas demais
+        escala_preco: unidades de preço médio por unidade de custo; quando
+            informada, o preço médio é inteiro (valor investido x escala_preco
+            / saldo, com arredondamento ROUND_HALF_UP)
+        ajustes: máscara opcional das linhas de ajuste (com quantidade e custo
+            zero), em que o saldo anterior é multiplicado pela proporção da
+            linha e arredondado para baixo, e o preço médio é dividido pela
+            proporção (com arredondamento ROUND_HALF_UP quando há escala_preco)
+        proporcoes: tupla (numeradores, denominadores) de arrays de inteiros
+            com a proporção de cada linha (usada apenas nas linhas de ajuste)
+
+    Returns:
+        dict: arrays 'quantidade', 'valor_investido' e 'preco_medio' com a
+        posição da ação após cada negociação
+    """
+    grupos = np.asarray(grupos)
+    quantidades = np.asarray(quantidades, dtype=np.int64)
+    custos = np.asarray(custos)
+    n = len(grupos)
+
+    if n == 0:
+        return {
+            'quantidade': np.zeros(0, dtype=np.int64),
+            'valor_investido': np.zeros(0, dtype=custos.dtype),
+            'preco_medio': np.zeros(0, dtype=np.float64 if escala_preco is None else np.int64),
+        }
+
+    indices = np.arange(n)
+    inicio_grupo = np.ones(n, dtype=bool)
+    inicio_grupo[1:] = grupos[1:] != grupos[:-1]
+    # Uma posição inicial recomeça o cálculo como se fosse o início de um novo grupo
+    inicial = np.zeros(n, dtype=bool)
+    if precos_iniciais is not None:
+        precos_iniciais = np.asarray(precos_iniciais, dtype=np.float64)
+        inicial = ~np.isnan(precos_iniciais)
+        inicio_grupo |= inicial
+    # Posição da primeira negociação do grupo de cada linha
+    primeira = np.maximum.accumulate(np.where(inicio_grupo, indices, 0))
+
+    saldo = _calcular_saldo(quantidades, inicio_grupo, primeira)
+    linhas_ajuste = numeradores = denominadores = np.zeros(0, dtype=np.int64)
+    if ajustes is not None:
+        linhas_ajuste = np.flatnonzero(ajustes)
+        numeradores = np.asarray(proporcoes[0], dtype=np.int64)[linhas_ajuste]
+        denominadores = np.asarray(proporcoes[1], dtype=np.int64)[linhas_ajuste]
+        # Cada ajuste vira a variação do saldo que ele provoca, que depende do saldo
+        # deixado pelos ajustes anteriores do grupo: repete-se até estabilizar, no
+        # máximo uma vez por ajuste do grupo
+        quantidades = quantidades.copy()
+        while len(linhas_ajuste):
+            anterior = np.where(inicio_grupo[linhas_ajuste], 0, saldo[linhas_ajuste - 1])
+            variacoes = anterior * numeradores // denominadores - anterior
+            if np.array_equal(variacoes, quantidades[linhas_ajuste]):
+                break
+            quantidades[linhas_ajuste] = variacoes
+            saldo = _calcular_saldo(quantidades, inicio_grupo, primeira)
+
+    # Vendas que zeram a posição reiniciam o valor investido e o preço médio
+    reinicio = (quantidades < 0) & (saldo == 0)
+    anterior = np.concatenate([np.zeros(1, dtype=np.int64), saldo[:-1]])
+    anterior[inicio_grupo] = 0
+
+    ajuste = np.zeros(n, dtype=bool)
+    ajuste[linhas_ajuste] = True
+    ajuste &= saldo > 0
+    numerador = np.ones(n, dtype=np.int64)
+    denominador = np.ones(n, dtype=np.int64)
+    numerador[linhas_ajuste], denominador[linhas_ajuste] = numeradores, denominadores
+    compra = ((quantidades > 0) | (custos > 0)) & (saldo > 0) & ~ajuste & ~inicial
+    venda = (quantidades < 0) & (saldo > 0) & ~ajuste
+
+    # Soma dos custos desde o início do grupo ou desde o último reinício
+    custos_acumulados = np.concatenate([np.zeros(1, dtype=custos.dtype), np.cumsum(custos)])
+    ancora = np.full(n, -1)
+    ancora[inicio_grupo] = indices[inicio_grupo]
+    ancora[reinicio] = indices[reinicio] + 1
+    ancora = np.maximum.accumulate(ancora)
+    custo_acumulado = custos_acumulados[indices + 1] - custos_acumulados[ancora]
+
+    if escala_preco is None:
+        escala, dividir = 1, np.divide
+        precos = np.zeros(n, dtype=np.float64)
+    else:
+        escala, dividir = escala_preco, dividir_arredondando
+        precos = np.zeros(n, dtype=np.int64)
+    if precos_iniciais is not None:
+        precos[inicial] = precos_iniciais[inicial]
+    baixas = np.zeros(n, dtype=np.result_type(custo_acumulado, precos))
+
+    # O preço médio de cada linha é o da última linha que o define no grupo: início,
+    # reinício, compra ou ajuste
+    inicio_trecho = inicio_grupo | reinicio
+    definidora = np.maximum.accumulate(np.where(inicio_trecho | compra | ajuste, indices, -1))
+    trecho = np.maximum.accumulate(np.where(inicio_trecho, indices, 0))
+
+    # Vendas e ajustes baixam do valor investido a quantidade vendida ou descartada
+    # ao preço médio anterior, que depende das baixas anteriores do trecho. As baixas
+    # são resolvidas em rodadas: na rodada k, a k-ésima linha definidora de cada
+    # trecho seguida de vendas ou ajustes tem o preço calculado, e as vendas e
+    # ajustes que partem dela têm a baixa calculada, em todos os grupos de uma vez
+    dependentes = np.flatnonzero(venda | ajuste)
+    fontes = definidora[dependentes - 1]
+    relevantes, fonte_de = np.unique(fontes, return_inverse=True)
+    rodada = np.zeros(len(relevantes), dtype=np.int64)
+    if len(relevantes):
+        novo_trecho = np.ones(len(relevantes), dtype=bool)
+        novo_trecho[1:] = trecho[relevantes[1:]] != trecho[relevantes[:-1]]
+        posicoes = np.arange(len(relevantes))
+        rodada = posicoes - np.maximum.accumulate(np.where(novo_trecho, posicoes, 0))
+    rodada_dependente = rodada[fonte_de]
+
+    # Quantidade baixada e divisor da baixa: nas vendas, as ações vendidas; nos ajustes,
+    # a fração descartada, em ações anteriores ao evento multiplicadas pelo numerador
+    quantidade_baixada = np.where(ajuste, anterior * numerador - saldo * denominador, anterior - saldo)[dependentes]
+    divisor_baixa = (numerador * escala)[dependentes]
+    baixado_antes = np.zeros(len(relevantes), dtype=baixas.dtype)
+    baixado_por_fonte = np.zeros(len(relevantes), dtype=baixas.dtype)
+
+    ordem_relevantes = np.argsort(rodada, kind='stable')
+    limites_relevantes = np.searchsorted(rodada[ordem_relevantes], np.arange(rodada.max(initial=-1) + 2))
+    ordem_dependentes = np.argsort(rodada_dependente, kind='stable')
+    limites_dependentes = np.searchsorted(rodada_dependente[ordem_dependentes], np.arange(rodada.max(initial=-1) + 2))
+    for k in range(len(limites_relevantes) - 1):
+        atuais = ordem_relevantes[limites_relevantes[k]:limites_relevantes[k + 1]]
+        if k:
+            baixado_antes[atuais] = baixado_antes[atuais - 1] + baixado_por_fonte[atuais - 1]
+        compras = compra[relevantes[atuais]]
+        linhas = relevantes[atuais[compras]]
+        precos[linhas] = dividir((custo_acumulado[linhas] - baixado_antes[atuais[compras]]) * escala, saldo[linhas])
+
+        atuais = ordem_dependentes[limites_dependentes[k]:limites_dependentes[k + 1]]
+        linhas = dependentes[atuais]
+        preco_fonte = precos[fontes[atuais]]
+        baixas[linhas] = dividir(quantidade_baixada[atuais] * preco_fonte, divisor_baixa[atuais])
+        np.add.at(baixado_por_fonte, fonte_de[atuais], baixas[linhas])
+        ajustes_atuais = ajuste[linhas]
+        linhas = linhas[ajustes_atuais]
+        precos[linhas] = dividir(preco_fonte[ajustes_atuais] * denominador[linhas], numerador[linhas])
+
+    baixas_acumuladas = np.cumsum(baixas)
+    valor_investido = custo_acumulado - (baixas_acumuladas - baixas_acumuladas[trecho])
+    precos[compra] = dividir(valor_investido[compra] * escala, saldo[compra])
+    preco_medio = precos[definidora]
+
+    return {
+        'quantidade': saldo,
+        'valor_investido': valor_investido,
+        'preco_medio': preco_medio,
+    }
+
+
+def _calcular_saldo(quantidades, inicio_grupo, primeira):
+    """
+    Saldo após cada linha: recorrência S = max(0, S + q), resolvida com a soma
+    acumulada menos o seu mínimo acumulado dentro do grupo (incluindo o zero
+    antes da primeira linha).
+    """
+    acumulado = np.cumsum(quantidades)
+    acumulado = acumulado - (acumulado[primeira] - quantidades[primeira])
+    # Deslocar cada grupo para baixo de todos os anteriores, de modo que o mínimo
+    # acumulado do array inteiro recomece a cada grupo
+    deslocamento = (2 * np.abs(quantidades).sum() + 1) * np.cumsum(inicio_grupo)
+    minimo = np.minimum.accumulate(acumulado - deslocamento) + deslocamento
+    return acumulado - np.minimum(minimo, 0)
+
+
+def posicoes_finais(grupos, historico):
+    """
+    Retorna a posição de cada grupo após a sua última negociação.
+
+    Returns:
+        tuple: (grupos, quantidade, valor_investido, preco_medio), um elemento por grupo
+    """
+    grupos = np.asarray(grupos)
+    if len(grupos) == 0:
+        return grupos, historico['quantidade'], historico['valor_investido'], historico['preco_medio']
+
+    ultima = np.ones(len(grupos), dtype=bool)
+    ultima[:-1] = grupos[1:] != grupos[:-1]
+    return (
+        grupos[ultima],
+        historico['quantidade'][ultima],
+        historico['valor_investido'][ultima],
+        historico['preco_medio'][ultima],
+    )
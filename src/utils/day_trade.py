@@ -0,0 +1,108 @@
+"""
+Classificação das negociações em day trade e operações comuns.
+
+Day trade é a compra e a venda da mesma ação no mesmo dia e na mesma
+instituição. Em cada grupo (usuário, ação, data, instituição), a quantidade em
+day trade é o menor entre o total comprado e o total vendido, atribuída às
+compras e às vendas na ordem das negociações; o restante de cada negociação é
+operação comum (swing trade).
+
+A quantidade em day trade fica gravada em Negociacao.quantidade_day_trade,
+de modo que o cálculo de posição e a apuração de IR apenas a leem. A
+classificação é refeita, em uma única passada agrupada, para as ações e datas
+alteradas sempre que negociações são incluídas, alteradas ou excluídas (ver
+atualizar_calculos em src/utils/apuracao.py).
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import update
+from src.models import db
+from src.models.all_models import Negociacao
+
+
+def calcular_day_trade(acao_ids, datas, instituicoes, quantidades):
+    """
+    Quantidade em day trade de cada negociação.
+
+    Args:
+        acao_ids, datas, instituicoes: arrays com a ação, a data e a instituição
+            de cada negociação, em ordem cronológica dentro de cada ação
+        quantidades: array de inteiros positivos nas compras, negativos nas
+            vendas e zero nos demais tipos de movimentação
+
+    Returns:
+        array de inteiros, zero nas negociações que não são day trade
+    """
+    quantidades = np.asarray(quantidades, dtype=np.int64)
+    day_trade = np.zeros(len(quantidades), dtype=np.int64)
+    negociacoes = pd.DataFrame({
+        'acao_id': acao_ids,
+        'data': datas,
+        'instituicao': instituicoes,
+        'compra': quantidades > 0,
+        'quantidade': np.abs(quantidades),
+    })
+    negociacoes = negociacoes[(quantidades != 0) & negociacoes['instituicao'].notna()]
+    if negociacoes.empty:
+        return day_trade
+
+    chaves = ['acao_id', 'data', 'instituicao']
+    por_grupo = negociacoes.assign(
+        compras=negociacoes['quantidade'].where(negociacoes['compra'], 0),
+        vendas=negociacoes['quantidade'].where(~negociacoes['compra'], 0),
+    ).groupby(chaves)[['compras', 'vendas']].transform('sum')
+    limite = np.minimum(por_grupo['compras'], por_grupo['vendas'])
+
+    acumulado = negociacoes.groupby(chaves + ['compra'])['quantidade'].cumsum()
+    quantidade = (np.minimum(acumulado, limite) - (acumulado - negociacoes['quantidade'])).clip(lower=0)
+    day_trade[negociacoes.index.to_numpy()] = quantidade.to_numpy()
+    return day_trade
+
+
+def classificar_day_trades(user_hash, alteracoes=None):
+    """
+    Recalcula e grava a quantidade em day trade das negociações do usuário.
+
+    Apenas as negociações cuja quantidade mudou são atualizadas, com um único
+    UPDATE em lote.
+
+    Args:
+        alteracoes: dict acao_id -> menor data alterada; sem ele, todas as
+            negociações do usuário são classificadas
+
+    Returns:
+        int: quantidade de negociações atualizadas
+    """
+    query = db.session.query(
+        Negociacao.id,
+        Negociacao.acao_id,
+        Negociacao.data_negocio,
+        Negociacao.instituicao,
+        Negociacao.tipo_movimentacao,
+        Negociacao.quantidade,
+        Negociacao.quantidade_day_trade
+    ).filter(Negociacao.user_hash == user_hash)
+    if alteracoes is not None:
+        if not alteracoes:
+            return 0
+        query = query.filter(db.or_(*(
+            db.and_(Negociacao.acao_id == acao_id, Negociacao.data_negocio >= data)
+            for acao_id, data in alteracoes.items()
+        )))
+    linhas = query.order_by(Negociacao.acao_id, Negociacao.data_negocio, Negociacao.id).all()
+    if not linhas:
+        return 0
+
+    ids, acao_ids, datas, instituicoes, tipos, quantidades, atuais = zip(*linhas)
+    tipos = np.array(tipos, dtype=object)
+    quantidades = np.array(quantidades, dtype=np.int64)
+    sinais = np.where(tipos == 'Compra', 1, np.where(tipos == 'Venda', -1, 0))
+    day_trade = calcular_day_trade(np.array(acao_ids), np.array(datas, dtype=object),
+                                   np.array(instituicoes, dtype=object), sinais * quantidades)
+
+    alteradas = np.flatnonzero(day_trade != np.array(atuais, dtype=np.int64))
+    if len(alteradas):
+        db.session.execute(update(Negociacao), [
+            {'id': ids[indice], 'quantidade_day_trade': int(day_trade[indice])} for indice in alteradas
+        ])
+    return len(alteradas)
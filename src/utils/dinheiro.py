@@ -0,0 +1,73 @@
+"""
+Aritmética monetária em ponto fixo.
+
+Os valores monetários são mantidos como inteiros durante todo o cálculo:
+
+- valores (preço, valor, corretagem, valor investido) em centavos;
+- preço médio em unidades de 1/ESCALA_PRECO_MEDIO real (CASAS_PRECO_MEDIO casas).
+
+O preço médio tem uma única regra de arredondamento: valor investido dividido
+pelo saldo, arredondado para a casa mais próxima e, no empate, para cima
+(ROUND_HALF_UP). A conversão para Decimal ou texto acontece apenas na saída,
+nos relatórios e nos templates (filtro reais).
+"""
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+
+CASAS_PRECO_MEDIO = 4
+ESCALA_PRECO_MEDIO = 10 ** CASAS_PRECO_MEDIO
+# Unidades de preço médio por centavo
+UNIDADES_POR_CENTAVO = ESCALA_PRECO_MEDIO // 100
+
+
+def para_centavos(valores):
+    """
+    Converte valores monetários de duas casas decimais (Decimal, texto, int ou
+    float) em um array de centavos inteiros; None conta como zero.
+    """
+    return _para_inteiros(valores, 2)
+
+
+def preco_para_unidades(valores):
+    """Converte preços médios em reais para um array de unidades de preço médio"""
+    return _para_inteiros(valores, CASAS_PRECO_MEDIO)
+
+
+def _para_inteiros(valores, casas):
+    # Decimal e texto são convertidos exatamente; float passa pela sua representação
+    # decimal mais curta (0.1 + 0.2 -> '0.30000000000000004'), sem erro binário
+    return np.array([
+        0 if valor is None else int(
+            Decimal(repr(valor) if isinstance(valor, float) else valor).scaleb(casas).to_integral_value(ROUND_HALF_UP)
+        )
+        for valor in valores
+    ], dtype=np.int64)
+
+
+def dividir_arredondando(numerador, divisor):
+    """Divisão inteira com arredondamento ROUND_HALF_UP (divisor positivo)"""
+    numerador = np.asarray(numerador, dtype=np.int64)
+    sinal = np.where(numerador < 0, -1, 1)
+    return sinal * ((2 * np.abs(numerador) + divisor) // (2 * divisor))
+
+
+def centavos_para_reais(centavos):
+    """Converte centavos inteiros em Decimal com duas casas"""
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def unidades_para_reais(unidades):
+    """Converte unidades de preço médio em Decimal com CASAS_PRECO_MEDIO casas"""
+    return Decimal(int(unidades)).scaleb(-CASAS_PRECO_MEDIO)
+
+
+def formatar_reais(valor, casas=2):
+    """
+    Formata um valor em reais no padrão brasileiro (R$ 1.234,56), arredondando
+    com ROUND_HALF_UP. Usado nos templates pelo filtro reais.
+    """
+    if valor is None:
+        return ''
+    quantizado = Decimal(str(valor)).quantize(Decimal(1).scaleb(-casas), rounding=ROUND_HALF_UP)
+    texto = f'{quantizado:,.{casas}f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+    return f'R$ {texto}'
@@ -0,0 +1,91 @@
+"""
+Busca de CNPJs em segundo plano.
+
+O relatório de posições não espera a busca online do CNPJ: as ações sem CNPJ
+são colocadas em uma fila (um pool de threads local ao processo, como nas
+importações) e os CNPJs encontrados são gravados de uma só vez, com um único
+UPDATE, para a próxima geração do relatório. Um código já na fila não é
+enfileirado de novo até a busca terminar.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from src.models import db
+from src.models.all_models import Acao
+
+PADRAO_CNPJ = re.compile(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}')
+
+_executor = None
+_executor_lock = Lock()
+# (user_hash, codigo) com busca em andamento
+_pendentes = set()
+_pendentes_lock = Lock()
+
+
+def enfileirar_cnpjs(app, user_hash, codigos, buscar):
+    """
+    Agenda a busca dos CNPJs dos códigos que ainda não estão na fila.
+
+    Args:
+        buscar: função que recebe a lista de códigos e retorna um dict
+            código -> CNPJ (ou uma mensagem, quando não encontrado), como
+            resolver_cnpjs em src/utils/busca_cnpj.py
+
+    Returns:
+        Future da busca, ou None se todos os códigos já estavam na fila
+    """
+    with _pendentes_lock:
+        novos = sorted({codigo for codigo in codigos if (user_hash, codigo) not in _pendentes})
+        _pendentes.update((user_hash, codigo) for codigo in novos)
+    if not novos:
+        return None
+    return _obter_executor().submit(_executar_no_contexto, app, user_hash, novos, buscar)
+
+
+def enriquecer_cnpjs(user_hash, codigos, buscar):
+    """
+    Busca os CNPJs dos códigos em lote e grava os encontrados em um único
+    UPDATE, apenas nas ações do usuário que continuam sem CNPJ.
+
+    Returns:
+        dict: código -> CNPJ encontrado
+    """
+    encontrados = {
+        codigo: cnpj for codigo, cnpj in buscar(list(codigos)).items()
+        if cnpj and PADRAO_CNPJ.fullmatch(cnpj)
+    }
+
+    if encontrados:
+        db.session.query(Acao).filter(
+            Acao.user_hash == user_hash,
+            Acao.codigo.in_(list(encontrados)),
+            db.or_(Acao.cnpj == None, Acao.cnpj == '')
+        ).update({Acao.cnpj: db.case(encontrados, value=Acao.codigo)}, synchronize_session=False)
+        db.session.commit()
+    return encontrados
+
+
+def _executar_no_contexto(app, user_hash, codigos, buscar):
+    with app.app_context():
+        try:
+            return enriquecer_cnpjs(user_hash, codigos, buscar)
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Erro ao buscar CNPJs de {', '.join(codigos)}: {str(e)}")
+            return {}
+        finally:
+            db.session.remove()
+            with _pendentes_lock:
+                _pendentes.difference_update((user_hash, codigo) for codigo in codigos)
+
+
+def _obter_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('CNPJ_WORKERS', '1')),
+                thread_name_prefix='cnpj'
+            )
+        return _executor
@@ -0,0 +1,66 @@
+"""
+Eventos corporativos: desdobramentos, grupamentos e bonificações.
+
+Um evento altera a quantidade e o preço médio da ação sem negociação: a partir
+da data ex, cada quantidade_antes ações passam a quantidade_depois ações e o
+valor investido não muda, exceto pelas frações de ação que sobram de um
+grupamento ou bonificação (vendidas em leilão pela companhia), que são
+descartadas.
+
+O cálculo de posição (src/utils/posicao.py) busca os eventos do usuário em uma
+única consulta e inclui cada um como uma linha de ajuste com a proporção do
+próprio evento. No kernel de custo médio (src/utils/custo_medio.py), a linha
+multiplica o saldo anterior pela proporção e divide o preço médio por ela, com
+a regra de arredondamento de src/utils/dinheiro.py; as demais linhas continuam
+em ações, sem conversão de unidades.
+
+Não há um fator de ajuste acumulado por ação: como as frações são descartadas
+em cada evento, aplicar o produto das proporções de uma só vez daria outra
+quantidade (5 ações com duas bonificações de 10% continuam 5 ações, enquanto
+5 x 121/100 arredondado para baixo daria 6). Além disso, o produto das
+proporções cresce sem limite e não cabe em uma coluna inteira de 64 bits.
+"""
+import numpy as np
+from src.models import db
+from src.models.all_models import EventoCorporativo
+
+TIPO_DESDOBRAMENTO = 'Desdobramento'
+TIPO_GRUPAMENTO = 'Grupamento'
+TIPO_BONIFICACAO = 'Bonificação'
+TIPOS_EVENTO = (TIPO_DESDOBRAMENTO, TIPO_GRUPAMENTO, TIPO_BONIFICACAO)
+
+
+def carregar_eventos(user_hash, data_base=None, acao_ids=None):
+    """
+    Retorna os eventos das ações do usuário até a data base.
+
+    Returns:
+        list: linhas (acao_id, data_ex, tipo, quantidade_antes, quantidade_depois)
+        ordenadas por ação e data ex
+    """
+    query = db.session.query(
+        EventoCorporativo.acao_id,
+        EventoCorporativo.data_ex,
+        EventoCorporativo.tipo,
+        EventoCorporativo.quantidade_antes,
+        EventoCorporativo.quantidade_depois
+    ).filter(EventoCorporativo.user_hash == user_hash)
+    if data_base is not None:
+        query = query.filter(EventoCorporativo.data_ex <= data_base)
+    if acao_ids is not None:
+        query = query.filter(EventoCorporativo.acao_id.in_(acao_ids))
+    return query.order_by(EventoCorporativo.acao_id, EventoCorporativo.data_ex).all()
+
+
+def proporcoes_dos_eventos(eventos):
+    """
+    Proporção de cada evento como fração irredutível.
+
+    Returns:
+        tupla (numeradores, denominadores) de arrays de inteiros, com
+        quantidade_depois / quantidade_antes de cada evento
+    """
+    antes = np.array([evento.quantidade_antes for evento in eventos], dtype=np.int64)
+    depois = np.array([evento.quantidade_depois for evento in eventos], dtype=np.int64)
+    divisores = np.maximum(np.gcd(antes, depois), 1)
+    return depois // divisores, antes // divisores
@@ -0,0 +1,153 @@
+"""
+Exportação de relatórios em CSV e XLSX.
+
+As linhas são geradas sob demanda e escritas em blocos: o CSV é enviado ao
+navegador à medida que é produzido, e o XLSX é montado com o modo write-only do
+openpyxl, que grava cada linha em um arquivo temporário em vez de manter a
+planilha na memória. Um XLSX é um arquivo zip que só fica completo ao ser
+fechado, então ele começa a ser enviado depois da última linha, também em
+blocos.
+
+A lista de negociações é lida com um cursor no servidor (yield_per), de modo
+que a memória usada não depende do tamanho do histórico.
+"""
+import csv
+import io
+import tempfile
+from flask import Response, stream_with_context
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from src.models import db
+from src.models.all_models import Acao, Negociacao
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Linhas lidas do banco por vez
+LOTE_EXPORTACAO = 1000
+
+# Tamanho aproximado, em bytes, de cada bloco enviado
+TAMANHO_BLOCO = 64 * 1024
+
+# Formatos numéricos das colunas do XLSX
+FORMATO_DATA = 'DD/MM/YYYY'
+FORMATO_REAIS = '#,##0.00'
+FORMATO_PRECO_MEDIO = '#,##0.0000'
+
+COLUNAS_NEGOCIACOES = [
+    ('Data', FORMATO_DATA),
+    ('Código', None),
+    ('Tipo', None),
+    ('Mercado', None),
+    ('Instituição', None),
+    ('Quantidade', None),
+    ('Quantidade Day Trade', None),
+    ('Preço', FORMATO_REAIS),
+    ('Valor', FORMATO_REAIS),
+    ('Corretagem', FORMATO_REAIS),
+]
+
+
+def gerar_csv(colunas, linhas):
+    """
+    Gera o CSV em blocos de texto.
+
+    Args:
+        colunas: lista de (título, formato); o formato é ignorado no CSV
+        linhas: iterável de tuplas com um valor por coluna
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([titulo for titulo, _ in colunas])
+    for linha in linhas:
+        escritor.writerow(linha)
+        if buffer.tell() > TAMANHO_BLOCO:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_xlsx(titulo, colunas, linhas):
+    """
+    Gera o XLSX, com uma planilha, em blocos de bytes.
+
+    Args:
+        titulo: nome da planilha
+        colunas: lista de (título, formato numérico do openpyxl ou None)
+        linhas: iterável de tuplas com um valor por coluna
+    """
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet(titulo)
+    aba.append([titulo_coluna for titulo_coluna, _ in colunas])
+    formatos = [formato for _, formato in colunas]
+    for linha in linhas:
+        aba.append([_celula(aba, valor, formato) for valor, formato in zip(linha, formatos)])
+
+    with tempfile.TemporaryFile() as arquivo:
+        planilha.save(arquivo)
+        arquivo.seek(0)
+        while bloco := arquivo.read(TAMANHO_BLOCO):
+            yield bloco
+
+
+def _celula(aba, valor, formato):
+    if formato is None or valor is None:
+        return valor
+    celula = WriteOnlyCell(aba, value=valor)
+    celula.number_format = formato
+    return celula
+
+
+def exportar(formato, nome_arquivo, titulo, colunas, linhas):
+    """
+    Resposta com o arquivo exportado, enviada em blocos.
+
+    Args:
+        formato: 'csv' ou 'xlsx' (ver FORMATOS_EXPORTACAO)
+        nome_arquivo: nome do arquivo, sem extensão
+        titulo: nome da planilha no XLSX
+        colunas: lista de (título, formato numérico do XLSX ou None)
+        linhas: iterável de tuplas com um valor por coluna, consumido durante o envio
+    """
+    if formato == 'xlsx':
+        gerador = gerar_xlsx(titulo, colunas, linhas)
+    else:
+        gerador = gerar_csv(colunas, linhas)
+    response = Response(stream_with_context(gerador), mimetype=FORMATOS_EXPORTACAO[formato])
+    response.headers['Content-Disposition'] = f'attachment; filename={nome_arquivo}.{formato}'
+    return response
+
+
+def consultar_negociacoes(user_hash, sem_corretagem=False):
+    """
+    Negociações do usuário em ordem cronológica, lidas em lotes de
+    LOTE_EXPORTACAO linhas com um cursor no servidor.
+
+    Returns:
+        gerador de tuplas na ordem de COLUNAS_NEGOCIACOES
+    """
+    query = db.select(
+        Negociacao.data_negocio,
+        Acao.codigo,
+        Negociacao.tipo_movimentacao,
+        Negociacao.mercado,
+        Negociacao.instituicao,
+        Negociacao.quantidade,
+        Negociacao.quantidade_day_trade,
+        Negociacao.preco,
+        Negociacao.valor,
+        Negociacao.corretagem
+    ).join(Acao, Negociacao.acao_id == Acao.id).filter(Negociacao.user_hash == user_hash)
+    if sem_corretagem:
+        query = query.filter(Negociacao.corretagem == None)
+    query = query.order_by(Negociacao.data_negocio, Negociacao.id).execution_options(yield_per=LOTE_EXPORTACAO)
+
+    resultado = db.session.execute(query)
+    try:
+        for lote in resultado.partitions():
+            yield from (tuple(linha) for linha in lote)
+    finally:
+        resultado.close()
@@ -0,0 +1,197 @@
+"""
+Importação em lote de relatórios de negociação da B3.
+
+O relatório inteiro é normalizado com operações vetorizadas do pandas e as
+negociações são gravadas com INSERTs de múltiplas linhas que ignoram
+duplicidades diretamente no banco (ON CONFLICT DO NOTHING / INSERT IGNORE),
+evitando uma ida ao banco por linha.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import pandas as pd
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from src.models import db
+from src.models.all_models import Acao, Negociacao
+from src.utils.chave_natural import gerar_chaves_naturais, CENTAVO
+
+# Mapeamento entre os cabeçalhos do relatório da B3 e as colunas normalizadas
+COLUNAS_B3 = {
+    'Data do Negócio': 'data_negocio',
+    'Código de Negociação': 'codigo',
+    'Tipo de Movimentação': 'tipo_movimentacao',
+    'Mercado': 'mercado',
+    'Prazo/Vencimento': 'prazo_vencimento',
+    'Instituição': 'instituicao',
+    'Quantidade': 'quantidade',
+    'Preço': 'preco',
+    'Valor': 'valor',
+}
+
+COLUNAS_TEXTO = ['tipo_movimentacao', 'mercado', 'prazo_vencimento', 'instituicao']
+
+# Quantidade de linhas por INSERT (mantém o número de parâmetros abaixo do limite do SQLite)
+TAMANHO_LOTE = 500
+
+
+def normalizar_negociacoes(df):
+    """
+    Converte o DataFrame lido do relatório da B3 para o formato usado na importação.
+
+    Linhas completamente vazias são descartadas. Valores que não puderem ser
+    convertidos ficam nulos e podem ser identificados com linhas_invalidas().
+
+    Returns:
+        DataFrame com as colunas de COLUNAS_B3 já renomeadas
+    """
+    faltantes = [coluna for coluna in COLUNAS_B3 if coluna not in df.columns]
+    if faltantes:
+        raise ValueError(f"Colunas ausentes no relatório: {', '.join(faltantes)}")
+
+    df = df[list(COLUNAS_B3)].rename(columns=COLUNAS_B3).dropna(how='all')
+
+    normalizado = pd.DataFrame(index=df.index)
+    normalizado['data_negocio'] = pd.to_datetime(
+        df['data_negocio'], format='%d/%m/%Y', errors='coerce'
+    ).dt.date
+
+    # Remover a letra F do final do código da ação (mercado fracionário)
+    codigo = df['codigo'].astype('string').str.strip()
+    normalizado['codigo'] = codigo.str.replace(r'F$', '', regex=True)
+
+    for coluna in COLUNAS_TEXTO:
+        normalizado[coluna] = df[coluna].astype('string').str.strip()
+
+    normalizado['quantidade'] = _converter_numeros(df['quantidade'], inteiro=True)
+    normalizado['preco'] = _converter_numeros(df['preco'])
+    normalizado['valor'] = _converter_numeros(df['valor'])
+
+    return normalizado
+
+
+def linhas_invalidas(normalizado):
+    """Retorna uma máscara booleana com as linhas que possuem algum campo obrigatório inválido"""
+    return normalizado.isna().any(axis=1) | (normalizado['codigo'] == '')
+
+
+def inserir_negociacoes(normalizado, relatorio, mapa_acoes=None):
+    """
+    Grava as negociações normalizadas na sessão atual, ignorando duplicidades.
+
+    As negociações são associadas ao relatório informado, a não ser que o
+    DataFrame já traga a coluna relatorio_id. Não faz commit: o chamador
+    controla a transação.
+
+    Args:
+        mapa_acoes: mapa código -> Acao.id do usuário (ver carregar_mapa_acoes),
+            reaproveitado entre os lotes de um mesmo arquivo
+
+    Returns:
+        tuple: (negociacoes_processadas, negociacoes_ignoradas)
+    """
+    if normalizado.empty:
+        return 0, 0
+
+    if mapa_acoes is None:
+        mapa_acoes = carregar_mapa_acoes(relatorio.user_hash)
+    criar_acoes_faltantes(mapa_acoes, normalizado['codigo'].unique(), relatorio.user_hash)
+
+    registros = normalizado.drop(columns=['codigo']).assign(
+        quantidade=normalizado['quantidade'].astype('int64'),
+        acao_id=normalizado['codigo'].map(mapa_acoes).astype('int64'),
+        user_hash=relatorio.user_hash,
+    )
+    if 'relatorio_id' not in registros:
+        registros['relatorio_id'] = relatorio.id
+    registros['chave_natural'] = gerar_chaves_naturais(registros)
+    registros = registros.to_dict('records')
+
+    negociacoes_processadas = 0
+    for inicio in range(0, len(registros), TAMANHO_LOTE):
+        lote = registros[inicio:inicio + TAMANHO_LOTE]
+        resultado = db.session.execute(_insert_ignorando_duplicadas(lote))
+        negociacoes_processadas += resultado.rowcount
+
+    return negociacoes_processadas, len(registros) - negociacoes_processadas
+
+
+def _converter_numeros(serie, inteiro=False):
+    """
+    Converte para número valores numéricos ou textos como 'R$ 1.234,56' e '1234.56'.
+
+    Em colunas inteiras (quantidade) o ponto é sempre separador de milhar. As
+    demais colunas são valores monetários e viram Decimal com duas casas
+    (ROUND_HALF_UP), convertidos a partir do texto, sem passar por float.
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        if inteiro:
+            return pd.to_numeric(serie, errors='coerce')
+        # O texto de um float é a sua representação decimal mais curta (0.1 -> '0.1')
+        serie = serie.astype('string')
+
+    texto = serie.astype('string').str.replace('R$', '', regex=False).str.strip()
+    # Formato brasileiro: remover o separador de milhar e trocar a vírgula decimal por ponto
+    brasileiro = texto.str.contains(',', regex=False, na=False) | inteiro
+    texto = texto.where(~brasileiro, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    if inteiro:
+        return pd.to_numeric(texto, errors='coerce')
+    return texto.astype(object).map(_para_decimal)
+
+
+def _para_decimal(texto):
+    """Valor monetário com duas casas, ou None se o texto não for um número"""
+    try:
+        valor = Decimal(texto)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return valor.quantize(CENTAVO, rounding=ROUND_HALF_UP) if valor.is_finite() else None
+
+
+def carregar_mapa_acoes(user_hash):
+    """Retorna o mapa código -> Acao.id de todas as ações do usuário em uma única consulta"""
+    return dict(db.session.query(Acao.codigo, Acao.id).filter(Acao.user_hash == user_hash).all())
+
+
+def criar_acoes_faltantes(mapa_acoes, codigos, user_hash):
+    """
+    Cria em um único INSERT as ações cujos códigos ainda não estão no mapa.
+
+    Importações simultâneas do mesmo usuário podem criar o mesmo código ao
+    mesmo tempo: o INSERT ignora as ações que já existem (restrição
+    uix_acao_usuario_codigo), e os ids são lidos do banco em seguida.
+
+    O mapa é atualizado com os ids das ações criadas e também retornado.
+    """
+    faltantes = sorted(set(codigos) - set(mapa_acoes))
+    if faltantes:
+        db.session.execute(_insert_ignorando_duplicadas(
+            [{'codigo': codigo, 'user_hash': user_hash} for codigo in faltantes], Acao, ['user_hash', 'codigo']
+        ))
+        mapa_acoes.update(
+            db.session.query(Acao.codigo, Acao.id).filter(
+                Acao.user_hash == user_hash,
+                Acao.codigo.in_(faltantes)
+            ).all()
+        )
+    return mapa_acoes
+
+
+def _insert_ignorando_duplicadas(registros, modelo=Negociacao, colunas_unicas=('chave_natural',)):
+    """
+    Monta o INSERT de múltiplas linhas que ignora violações da restrição única
+    sobre colunas_unicas (por padrão, uix_negociacao_chave_natural)
+    """
+    dialeto = db.session.get_bind().dialect.name
+    # Usuários das linhas, para a versão dos dados (ver src/utils/cache_posicoes.py)
+    opcoes = {'user_hashes': sorted({registro['user_hash'] for registro in registros})}
+
+    if dialeto == 'mysql':
+        return mysql.insert(modelo).values(registros).prefix_with('IGNORE').execution_options(**opcoes)
+    if dialeto == 'postgresql':
+        return postgresql.insert(modelo).values(registros).on_conflict_do_nothing(
+            index_elements=list(colunas_unicas)
+        ).execution_options(**opcoes)
+    if dialeto == 'sqlite':
+        return sqlite.insert(modelo).values(registros).on_conflict_do_nothing(
+            index_elements=list(colunas_unicas)
+        ).execution_options(**opcoes)
+
+    raise ValueError(f"Banco de dados não suportado para importação em lote: {dialeto}")
@@ -0,0 +1,168 @@
+"""
+Execução de importações de relatórios em segundo plano.
+
+Os jobs rodam em um pool de threads local ao processo e o progresso é gravado
+na tabela importacao_jobs, de modo que qualquer worker do gunicorn consegue
+consultar a situação da importação sem depender de um broker externo.
+
+A importação é confirmada em uma única transação, junto com a conclusão do job;
+o progresso é gravado em uma conexão separada. Um job que não avança há mais de
+IMPORTACAO_TEMPO_LIMITE minutos (o processo que o executava morreu, por exemplo)
+é marcado como erro por recuperar_jobs_abandonados, liberando o reenvio dos arquivos.
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+from src.models import db
+from src.models.all_models import ImportacaoJob, Negociacao, Relatorio
+from src.utils.apuracao import atualizar_calculos
+from src.utils.posicao import datas_alteradas
+
+_executor = None
+_executor_lock = Lock()
+
+# Jobs enfileirados ou em execução neste processo, que nunca são considerados abandonados
+_jobs_em_andamento = set()
+_jobs_lock = Lock()
+
+
+def criar_job(user_hash):
+    """Cria um job pendente na sessão atual (sem commit)"""
+    job = ImportacaoJob(
+        id=uuid.uuid4().hex,
+        status=ImportacaoJob.STATUS_PENDENTE,
+        user_hash=user_hash
+    )
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+
+def enfileirar_importacao(app, job_id, tarefa, *args):
+    """
+    Agenda a execução da tarefa de importação no pool de threads.
+
+    A tarefa deve aceitar o argumento nomeado progresso e retornar a tupla
+    (negociacoes_processadas, negociacoes_ignoradas).
+    """
+    with _jobs_lock:
+        _jobs_em_andamento.add(job_id)
+    return _obter_executor().submit(_executar_no_contexto, app, job_id, tarefa, *args)
+
+
+def executar_importacao(job_id, tarefa, *args):
+    """
+    Executa a tarefa de importação atualizando o job a cada lote processado.
+
+    A tarefa não confirma a transação: as negociações importadas e a conclusão
+    do job são gravadas em um único commit ao final. O progresso é publicado em
+    uma conexão separada (ver _publicar_progresso). Se a tarefa falhar, os
+    relatórios do job são removidos.
+    """
+    job = db.session.get(ImportacaoJob, job_id)
+    job.status = ImportacaoJob.STATUS_PROCESSANDO
+    db.session.commit()
+
+    contadores = {}
+
+    def progresso(linhas_lidas, negociacoes_processadas, negociacoes_ignoradas):
+        contadores.update(
+            linhas_lidas=linhas_lidas,
+            negociacoes_processadas=negociacoes_processadas,
+            negociacoes_ignoradas=negociacoes_ignoradas
+        )
+        _publicar_progresso(job_id, contadores)
+
+    try:
+        negociacoes_processadas, negociacoes_ignoradas = tarefa(*args, progresso=progresso)
+        job.status = ImportacaoJob.STATUS_CONCLUIDO
+        job.linhas_lidas = contadores.get('linhas_lidas', job.linhas_lidas)
+        job.negociacoes_processadas = negociacoes_processadas
+        job.negociacoes_ignoradas = negociacoes_ignoradas
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        _remover_relatorios(job_id, job.user_hash)
+        job.status = ImportacaoJob.STATUS_ERRO
+        job.mensagem = f'Erro ao processar o relatório: {str(e)}'[:500]
+        db.session.commit()
+
+
+def recuperar_jobs_abandonados(user_hash):
+    """
+    Marca como erro os jobs do usuário parados há mais de IMPORTACAO_TEMPO_LIMITE
+    minutos e remove seus relatórios, para que os arquivos possam ser reenviados.
+
+    Os jobs enfileirados ou em execução neste processo são mantidos. Chamado ao
+    consultar uma importação e antes de receber novos arquivos.
+
+    Returns:
+        list: os jobs marcados como erro
+    """
+    limite = datetime.utcnow() - timedelta(minutes=int(os.environ.get('IMPORTACAO_TEMPO_LIMITE', '60')))
+    with _jobs_lock:
+        em_andamento = set(_jobs_em_andamento)
+    abandonados = [
+        job for job in ImportacaoJob.query.filter(
+            ImportacaoJob.user_hash == user_hash,
+            ImportacaoJob.status.in_([ImportacaoJob.STATUS_PENDENTE, ImportacaoJob.STATUS_PROCESSANDO]),
+            ImportacaoJob.updated_at < limite
+        )
+        if job.id not in em_andamento
+    ]
+    for job in abandonados:
+        _remover_relatorios(job.id, user_hash)
+        job.status = ImportacaoJob.STATUS_ERRO
+        job.mensagem = 'A importação foi interrompida. Envie os arquivos novamente.'
+    if abandonados:
+        db.session.commit()
+    return abandonados
+
+
+def _publicar_progresso(job_id, contadores):
+    """
+    Grava o progresso do job em uma conexão própria, fora da transação da importação.
+
+    No SQLite a transação da importação bloqueia a escrita de outras conexões, então
+    o progresso só aparece ao final (junto com o resultado).
+    """
+    if db.engine.dialect.name == 'sqlite':
+        return
+    with db.engine.begin() as conexao:
+        conexao.execute(
+            db.update(ImportacaoJob).where(ImportacaoJob.id == job_id).values(**contadores)
+        )
+
+
+def _executar_no_contexto(app, job_id, tarefa, *args):
+    with app.app_context():
+        try:
+            executar_importacao(job_id, tarefa, *args)
+        except Exception as e:
+            app.logger.error(f"Erro inesperado no job de importação {job_id}: {str(e)}")
+        finally:
+            db.session.remove()
+            with _jobs_lock:
+                _jobs_em_andamento.discard(job_id)
+
+
+def _remover_relatorios(job_id, user_hash):
+    """Remove os relatórios do job e suas negociações com DELETEs em lote"""
+    relatorio_ids = db.select(Relatorio.id).where(Relatorio.importacao_job_id == job_id)
+    alteracoes = datas_alteradas(user_hash, Negociacao.relatorio_id.in_(relatorio_ids))
+    Negociacao.query.filter(Negociacao.relatorio_id.in_(relatorio_ids)).delete(synchronize_session=False)
+    Relatorio.query.filter(Relatorio.importacao_job_id == job_id).delete(synchronize_session=False)
+    atualizar_calculos(user_hash, alteracoes)
+
+
+def _obter_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('IMPORTACAO_WORKERS', '2')),
+                thread_name_prefix='importacao'
+            )
+        return _executor
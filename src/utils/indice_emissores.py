@@ -0,0 +1,127 @@
+"""
+Índice local de emissores da B3: código de negociação -> nome e CNPJ do emissor.
+
+A lista de emissores é distribuída com a aplicação (src/dados/emissores_b3.csv)
+e convertida em um arquivo SQLite somente leitura, consultado pela chave
+primária, sem acesso à rede. A busca de CNPJs (src/utils/busca_cnpj.py) usa o
+índice primeiro e só vai à internet para os códigos que não estão nele.
+
+O índice é criado na primeira consulta e pode ser reconstruído a partir de
+outra lista (por exemplo, o cadastro de companhias abertas exportado da CVM ou
+da B3) com `flask atualizar-indice-emissores ARQUIVO`. O arquivo novo substitui
+o anterior de uma só vez, e as consultas em andamento passam a usá-lo na
+próxima chamada.
+"""
+import csv
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+from threading import Lock, local
+from src.utils.enriquecimento_cnpj import PADRAO_CNPJ
+
+_RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Lista de emissores distribuída com a aplicação
+ARQUIVO_EMISSORES = os.path.join(_RAIZ_PROJETO, 'src', 'dados', 'emissores_b3.csv')
+
+# Arquivo SQLite do índice
+INDICE_EMISSORES = os.environ.get('INDICE_EMISSORES', os.path.join(_RAIZ_PROJETO, 'instance', 'emissores_b3.sqlite'))
+
+# Tamanho, em bytes, do mapeamento do arquivo na memória
+TAMANHO_MMAP = 16 * 1024 * 1024
+
+_construcao_lock = Lock()
+# Conexões somente leitura de cada thread: caminho -> (versão do arquivo, conexão)
+_conexoes = local()
+
+
+def raiz_do_codigo(codigo):
+    """
+    Os códigos de uma empresa compartilham os quatro primeiros caracteres
+    (PETR3, PETR4, PETR4F); o índice é feito por essa raiz.
+    """
+    return codigo.strip().upper()[:4]
+
+
+def ler_emissores(arquivo):
+    """
+    Lê uma lista de emissores em CSV, separado por ponto e vírgula ou vírgula,
+    com as colunas codigo, emissor e cnpj. Linhas sem CNPJ válido são ignoradas.
+
+    Returns:
+        gerador de tuplas (raiz do código, emissor, cnpj)
+    """
+    with open(arquivo, newline='', encoding='utf-8-sig') as entrada:
+        cabecalho = entrada.readline()
+        entrada.seek(0)
+        leitor = csv.DictReader(entrada, delimiter=';' if ';' in cabecalho else ',')
+        leitor.fieldnames = [coluna.strip().lower() for coluna in leitor.fieldnames]
+        for linha in leitor:
+            codigo, cnpj = (linha.get('codigo') or '').strip(), (linha.get('cnpj') or '').strip()
+            if codigo and PADRAO_CNPJ.fullmatch(cnpj):
+                yield raiz_do_codigo(codigo), (linha.get('emissor') or '').strip(), cnpj
+
+
+def construir_indice(arquivo=None, destino=None):
+    """
+    (Re)constrói o índice a partir da lista de emissores.
+
+    Returns:
+        int: quantidade de emissores no índice
+    """
+    arquivo = arquivo or ARQUIVO_EMISSORES
+    destino = destino or INDICE_EMISSORES
+    diretorio = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(diretorio, exist_ok=True)
+
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    os.close(descritor)
+    try:
+        conexao = sqlite3.connect(temporario)
+        try:
+            with conexao:
+                conexao.execute(
+                    'CREATE TABLE emissores (codigo TEXT PRIMARY KEY, emissor TEXT NOT NULL, cnpj TEXT NOT NULL) WITHOUT ROWID'
+                )
+                conexao.executemany('INSERT OR REPLACE INTO emissores VALUES (?, ?, ?)', ler_emissores(arquivo))
+            total = conexao.execute('SELECT COUNT(*) FROM emissores').fetchone()[0]
+        finally:
+            conexao.close()
+        os.replace(temporario, destino)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    return total
+
+
+def consultar_emissor(codigo, indice=None):
+    """
+    Retorna o emissor do código pelo índice local.
+
+    Returns:
+        tupla (emissor, cnpj), ou None se o código não estiver no índice
+    """
+    linha = _conexao(indice or INDICE_EMISSORES).execute(
+        'SELECT emissor, cnpj FROM emissores WHERE codigo = ?', (raiz_do_codigo(codigo),)
+    ).fetchone()
+    return tuple(linha) if linha else None
+
+
+def _conexao(caminho):
+    with _construcao_lock:
+        if not os.path.exists(caminho):
+            construir_indice(destino=caminho)
+    informacoes = os.stat(caminho)
+    versao = (informacoes.st_ino, informacoes.st_mtime_ns)
+
+    conexoes = _conexoes.__dict__.setdefault('conexoes', {})
+    atual = conexoes.get(caminho)
+    if atual is None or atual[0] != versao:
+        if atual is not None:
+            atual[1].close()
+        conexao = sqlite3.connect(Path(caminho).resolve().as_uri() + '?mode=ro', uri=True)
+        conexao.execute(f'PRAGMA mmap_size = {TAMANHO_MMAP}')
+        conexoes[caminho] = atual = (versao, conexao)
+    return atual[1]
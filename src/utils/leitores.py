@@ -0,0 +1,245 @@
+"""
+Leitores de relatórios de negociação da B3.
+
+Os leitores percorrem o arquivo em modo streaming e entregam lotes de tamanho
+fixo já normalizados, de forma que o consumo de memória não cresce com o
+tamanho do arquivo. São aceitos os formatos XLSX (exportação padrão da B3),
+CSV (exportação da área do investidor) e Parquet (arquivamento interno); o
+formato é identificado pelo conteúdo do arquivo, não pela extensão.
+
+Vários arquivos podem ser lidos ao mesmo tempo, um por processo
+(ler_arquivos_em_paralelo): os lotes voltam ao processo principal por uma
+fila limitada, e a memória continua independente do tamanho dos arquivos.
+"""
+import io
+import multiprocessing
+import os
+import queue
+import pandas as pd
+from openpyxl import load_workbook
+from src.utils.armazenamento import abrir_arquivo
+from src.utils.importacao import COLUNAS_B3, normalizar_negociacoes
+
+# Quantidade de linhas da planilha por lote entregue ao gravador
+TAMANHO_LOTE_LEITURA = 5000
+
+FORMATO_XLSX = 'xlsx'
+FORMATO_CSV = 'csv'
+FORMATO_PARQUET = 'parquet'
+
+# Quantidade de bytes inspecionados para identificar a codificação e o separador do CSV
+TAMANHO_AMOSTRA_CSV = 64 * 1024
+
+# Intervalo, em segundos, entre as verificações de processos de leitura encerrados sem aviso
+INTERVALO_VERIFICACAO_LEITORES = 5
+
+
+def detectar_formato(arquivo):
+    """Identifica o formato do arquivo pelos primeiros bytes, sem alterar a posição de leitura"""
+    posicao = arquivo.tell()
+    assinatura = arquivo.read(4)
+    arquivo.seek(posicao)
+
+    if assinatura == b'PK\x03\x04':
+        return FORMATO_XLSX
+    if assinatura == b'PAR1':
+        return FORMATO_PARQUET
+    return FORMATO_CSV
+
+
+def ler_em_lotes(arquivo, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Lê o arquivo com o leitor adequado ao seu formato.
+
+    Yields:
+        DataFrame normalizado com no máximo tamanho_lote linhas
+    """
+    leitores = {
+        FORMATO_XLSX: ler_xlsx_em_lotes,
+        FORMATO_CSV: ler_csv_em_lotes,
+        FORMATO_PARQUET: ler_parquet_em_lotes,
+    }
+    return leitores[detectar_formato(arquivo)](arquivo, tamanho_lote)
+
+
+def ler_arquivos_em_paralelo(caminhos, processos=None, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Lê vários arquivos de upload ao mesmo tempo, cada um em um processo próprio.
+
+    Cada processo abre o seu arquivo (ver abrir_arquivo) e o percorre com
+    ler_em_lotes. Os lotes voltam ao processo principal por uma fila com no
+    máximo um lote por processo; enquanto o consumidor não retira os lotes, os
+    leitores esperam, de modo que a memória fica limitada a cerca de dois
+    lotes por processo.
+
+    Args:
+        processos: quantidade máxima de processos simultâneos (padrão: a
+            variável IMPORTACAO_PROCESSOS ou o número de CPUs)
+
+    Yields:
+        tuplas (índice do arquivo em caminhos, DataFrame normalizado); os lotes
+        de um arquivo chegam em ordem, intercalados com os dos demais
+
+    Raises:
+        ValueError: com a mensagem do erro de leitura de qualquer arquivo
+    """
+    if processos is None:
+        processos = int(os.environ.get('IMPORTACAO_PROCESSOS', os.cpu_count() or 1))
+    processos = max(1, min(processos, len(caminhos)))
+
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue(maxsize=processos)
+    pendentes = list(enumerate(caminhos))[::-1]
+    ativos = {}
+    try:
+        while pendentes or ativos:
+            while pendentes and len(ativos) < processos:
+                indice, caminho = pendentes.pop()
+                processo = contexto.Process(
+                    target=_ler_no_processo, args=(fila, indice, caminho, tamanho_lote), daemon=True
+                )
+                processo.start()
+                ativos[indice] = processo
+
+            try:
+                indice, lote, erro = fila.get(timeout=INTERVALO_VERIFICACAO_LEITORES)
+            except queue.Empty:
+                # Um processo só termina com sucesso depois de entregar o aviso de fim de arquivo
+                for indice, processo in ativos.items():
+                    if processo.exitcode not in (None, 0):
+                        raise ValueError(f"A leitura do arquivo {os.path.basename(caminhos[indice])} foi interrompida")
+                continue
+
+            if erro is not None:
+                raise ValueError(erro)
+            if lote is None:
+                ativos.pop(indice).join()
+                continue
+            yield indice, lote
+    finally:
+        for processo in ativos.values():
+            processo.terminate()
+        for processo in ativos.values():
+            processo.join()
+        fila.close()
+        fila.cancel_join_thread()
+
+
+def _ler_no_processo(fila, indice, caminho, tamanho_lote):
+    # Executada no processo de leitura: entrega os lotes e, ao final, um lote None
+    try:
+        with abrir_arquivo(caminho) as arquivo:
+            for lote in ler_em_lotes(arquivo, tamanho_lote):
+                fila.put((indice, lote, None))
+    except Exception as e:
+        fila.put((indice, None, str(e)))
+        return
+    fila.put((indice, None, None))
+
+
+def ler_xlsx_em_lotes(filepath, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Lê a primeira planilha do arquivo XLSX em modo somente leitura.
+
+    O índice de cada lote corresponde à posição da linha de dados no arquivo
+    (a primeira linha após o cabeçalho tem índice 0).
+
+    Yields:
+        DataFrame normalizado com no máximo tamanho_lote linhas
+    """
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        linhas = workbook.active.iter_rows(values_only=True)
+
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [str(celula).strip() if celula is not None else '' for celula in cabecalho]
+
+        inicio = 0
+        lote = []
+        for linha in linhas:
+            # Células além do cabeçalho são descartadas; linhas curtas são completadas com nulos
+            lote.append(linha[:len(colunas)])
+            if len(lote) >= tamanho_lote:
+                yield _normalizar_lote(lote, colunas, inicio)
+                inicio += len(lote)
+                lote = []
+
+        if lote:
+            yield _normalizar_lote(lote, colunas, inicio)
+    finally:
+        workbook.close()
+
+
+def ler_csv_em_lotes(arquivo, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Lê um CSV com o motor C do pandas, em lotes e apenas com as colunas usadas.
+
+    Todas as colunas são lidas como texto; a conversão de datas e números
+    (inclusive no formato brasileiro, como "1.234,56") é feita na normalização.
+
+    Yields:
+        DataFrame normalizado com no máximo tamanho_lote linhas
+    """
+    amostra = arquivo.read(TAMANHO_AMOSTRA_CSV)
+    arquivo.seek(0)
+
+    try:
+        amostra.decode('utf-8')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as erro:
+        # A amostra pode ter cortado um caractere multibyte no final
+        encoding = 'utf-8-sig' if erro.start >= len(amostra) - 3 else 'latin-1'
+
+    primeira_linha = amostra.split(b'\n', 1)[0]
+    separador = ';' if primeira_linha.count(b';') > primeira_linha.count(b',') else ','
+
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, newline='')
+    try:
+        leitor = pd.read_csv(
+            texto,
+            sep=separador,
+            engine='c',
+            usecols=lambda coluna: coluna.strip() in COLUNAS_B3,
+            dtype=str,
+            skipinitialspace=True,
+            chunksize=tamanho_lote,
+        )
+        with leitor:
+            for lote in leitor:
+                yield normalizar_negociacoes(lote.rename(columns=str.strip))
+    finally:
+        # Devolver o arquivo binário ao chamador sem fechá-lo
+        texto.detach()
+
+
+def ler_parquet_em_lotes(arquivo, tamanho_lote=TAMANHO_LOTE_LEITURA):
+    """
+    Lê um arquivo Parquet por lotes de registros, apenas com as colunas usadas.
+
+    Yields:
+        DataFrame normalizado com no máximo tamanho_lote linhas
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("A leitura de arquivos Parquet requer o pacote pyarrow")
+
+    parquet = pq.ParquetFile(arquivo)
+    faltantes = [coluna for coluna in COLUNAS_B3 if coluna not in parquet.schema_arrow.names]
+    if faltantes:
+        raise ValueError(f"Colunas ausentes no relatório: {', '.join(faltantes)}")
+
+    inicio = 0
+    for lote in parquet.iter_batches(batch_size=tamanho_lote, columns=list(COLUNAS_B3)):
+        df = lote.to_pandas()
+        df.index = range(inicio, inicio + len(df))
+        inicio += len(df)
+        yield normalizar_negociacoes(df)
+
+
+def _normalizar_lote(lote, colunas, inicio):
+    df = pd.DataFrame(lote, columns=colunas)
+    df.index = range(inicio, inicio + len(df))
+    return normalizar_negociacoes(df)
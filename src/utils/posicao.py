@@ -0,0 +1,515 @@
+"""
+Cálculo da posição (saldo e preço médio) das ações de um usuário em uma data.
+
+Em vez de consultar o banco ação por ação, o motor busca em duas consultas
+ordenadas o ponto de partida de cada ação e as negociações posteriores a ele,
+e calcula a posição de todas as ações de uma só vez com o kernel vetorizado de
+custo médio (src/utils/custo_medio.py). Os valores monetários são mantidos
+em inteiros (centavos e unidades de preço médio, ver src/utils/dinheiro.py),
+de modo que o valor investido é exato e o preço médio segue uma única regra
+de arredondamento.
+
+O ponto de partida de cada ação é o mais recente entre o saldo cadastrado
+(SaldoPrecoMedio) e a posição mensal mantida pelo sistema (PosicaoMensal).
+As posições mensais são atualizadas por atualizar_posicoes_mensais sempre que
+negociações ou saldos são incluídos, alterados ou excluídos, de modo que o
+cálculo em qualquer data percorre no máximo as negociações de um mês.
+
+Desdobramentos, grupamentos e bonificações (src/utils/eventos_corporativos.py)
+são buscados em uma terceira consulta e aplicados na mesma passada: cada evento
+entra como uma linha de ajuste com a sua proporção, para que as posições nas
+datas seguintes já apareçam ajustadas.
+"""
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from src.models import db
+from src.models.all_models import Acao, Negociacao, PosicaoMensal, SaldoPrecoMedio
+from src.utils.custo_medio import calcular_custo_medio, posicoes_finais
+from src.utils.dinheiro import (
+    centavos_para_reais, dividir_arredondando, para_centavos, preco_para_unidades, unidades_para_reais,
+    UNIDADES_POR_CENTAVO
+)
+from src.utils.eventos_corporativos import carregar_eventos, proporcoes_dos_eventos
+
+# Tipos de movimentação usados no histórico para as posições iniciais
+TIPO_SALDO_CADASTRADO = 'Saldo Cadastrado'
+TIPO_POSICAO_MENSAL = 'Posição Mensal'
+
+# Frequências da série de posições
+FREQUENCIA_DIARIA = 'diaria'
+FREQUENCIA_MENSAL = 'mensal'
+FREQUENCIA_NEGOCIACAO = 'negociacao'
+FREQUENCIAS = (FREQUENCIA_DIARIA, FREQUENCIA_MENSAL, FREQUENCIA_NEGOCIACAO)
+
+# Ordem das linhas de uma mesma data: o evento corporativo vale desde a abertura
+# e o saldo cadastrado substitui as negociações do dia
+ORDEM_PARTIDA = 0
+ORDEM_EVENTO = 1
+ORDEM_NEGOCIACAO = 2
+ORDEM_SALDO = 3
+
+
+def carregar_saldos_iniciais(user_hash, data_base, acao_ids=None):
+    """
+    Retorna as ações do usuário com o saldo cadastrado e a posição mensal mais
+    recentes até a data base.
+
+    Returns:
+        list: tuplas (Acao, SaldoPrecoMedio ou None, PosicaoMensal ou None)
+        ordenadas pelo id da ação
+    """
+    ultimo_saldo = _ultimo_saldo(user_hash, data_base)
+    ultima_posicao = _ultima_posicao_mensal(user_hash, data_base)
+
+    query = db.session.query(Acao, SaldoPrecoMedio, PosicaoMensal).outerjoin(
+        ultimo_saldo, ultimo_saldo.c.acao_id == Acao.id
+    ).outerjoin(
+        SaldoPrecoMedio, db.and_(
+            SaldoPrecoMedio.acao_id == ultimo_saldo.c.acao_id,
+            SaldoPrecoMedio.data_base == ultimo_saldo.c.data_base,
+            SaldoPrecoMedio.user_hash == user_hash
+        )
+    ).outerjoin(
+        ultima_posicao, ultima_posicao.c.acao_id == Acao.id
+    ).outerjoin(
+        PosicaoMensal, db.and_(
+            PosicaoMensal.acao_id == ultima_posicao.c.acao_id,
+            PosicaoMensal.mes == ultima_posicao.c.mes,
+            PosicaoMensal.user_hash == user_hash
+        )
+    ).filter(
+        Acao.user_hash == user_hash
+    )
+    if acao_ids is not None:
+        query = query.filter(Acao.id.in_(acao_ids))
+
+    return query.order_by(Acao.id).all()
+
+
+def carregar_negociacoes(user_hash, data_partida, data_base=None, acao_ids=None):
+    """
+    Retorna as negociações do usuário até a data base posteriores ao ponto de
+    partida de cada ação (saldo cadastrado ou posição mensal mais recente até
+    data_partida).
+
+    Apenas as colunas usadas no cálculo são carregadas, sem montar objetos do ORM.
+
+    Returns:
+        list: linhas (id, acao_id, data_negocio, tipo_movimentacao, quantidade,
+        preco, corretagem, quantidade_day_trade) ordenadas por ação, data do negócio e id
+    """
+    ultimo_saldo = _ultimo_saldo(user_hash, data_partida)
+    ultima_posicao = _ultima_posicao_mensal(user_hash, data_partida)
+
+    query = _consulta_negociacoes(user_hash, data_base, acao_ids).outerjoin(
+        ultimo_saldo, ultimo_saldo.c.acao_id == Negociacao.acao_id
+    ).outerjoin(
+        ultima_posicao, ultima_posicao.c.acao_id == Negociacao.acao_id
+    ).filter(
+        db.or_(
+            ultimo_saldo.c.data_base == None,
+            Negociacao.data_negocio > ultimo_saldo.c.data_base
+        ),
+        db.or_(
+            ultima_posicao.c.mes == None,
+            Negociacao.data_negocio > ultima_posicao.c.mes
+        )
+    )
+
+    return query.order_by(Negociacao.acao_id, Negociacao.data_negocio, Negociacao.id).all()
+
+
+def calcular_posicoes(user_hash, data_base):
+    """
+    Calcula o saldo e o preço médio de cada ação do usuário na data base.
+
+    Parte do saldo cadastrado ou da posição mensal mais recente de cada ação e
+    aplica as negociações posteriores. Nas compras o valor investido inclui a
+    corretagem; quando o saldo é zerado por uma venda, o preço médio é reiniciado.
+
+    Returns:
+        list: dicts {'acao', 'quantidade', 'valor_investido', 'preco_medio'}
+        (valores em Decimal) apenas das ações com saldo positivo, ordenados pelo
+        código da ação
+    """
+    acoes, colunas = carregar_colunas(user_hash, data_base, data_base)
+    historico = calcular_colunas(colunas)
+
+    resultado = [
+        {
+            'acao': acoes[acao_id],
+            'quantidade': quantidade,
+            'valor_investido': centavos_para_reais(valor_investido),
+            'preco_medio': unidades_para_reais(preco_medio),
+        }
+        for acao_id, quantidade, valor_investido, preco_medio in zip(*(
+            array.tolist() for array in posicoes_finais(colunas['acao_id'], historico)
+        ))
+        if quantidade > 0
+    ]
+    resultado.sort(key=lambda item: item['acao'].codigo)
+    return resultado
+
+
+def calcular_serie(user_hash, datas):
+    """
+    Calcula a posição de todas as ações em cada uma das datas com uma única
+    passada cronológica pelas negociações.
+
+    Parte da posição de cada ação na véspera da primeira data (posição mensal
+    ou saldo cadastrado mais recente) e percorre as negociações até a última.
+
+    Args:
+        datas: lista ordenada de datas
+
+    Returns:
+        DataFrame com as colunas data, acao_id, codigo, quantidade,
+        valor_investido e preco_medio (Decimal) das ações com saldo positivo
+        em cada data, ordenado por data e código
+    """
+    colunas_serie = ['data', 'acao_id', 'codigo', 'quantidade', 'valor_investido', 'preco_medio']
+    if not datas:
+        return pd.DataFrame(columns=colunas_serie)
+
+    acoes, colunas = carregar_colunas(user_hash, datas[0] - timedelta(days=1), datas[-1])
+    historico = _montar_historico(acoes, colunas, calcular_colunas(colunas))
+    historico['data'] = pd.to_datetime(historico['data'])
+    # Posição ao fim de cada dia, em ordem cronológica
+    historico = historico.drop_duplicates(['acao_id', 'data'], keep='last').sort_values('data', kind='stable')
+
+    grade = pd.MultiIndex.from_product(
+        [pd.to_datetime(list(datas)), historico['acao_id'].unique()], names=['data', 'acao_id']
+    ).to_frame(index=False)
+    serie = pd.merge_asof(
+        grade, historico[['data', 'acao_id', 'codigo', 'saldo', 'centavos', 'unidades_preco']],
+        on='data', by='acao_id'
+    ).rename(columns={'saldo': 'quantidade'})
+
+    # As datas anteriores à primeira negociação de uma ação ficam sem saldo (NaN) e são descartadas
+    serie = serie[serie['quantidade'] > 0].sort_values(['data', 'codigo'])
+    serie['data'] = serie['data'].dt.date
+    serie = serie.astype({'quantidade': 'int64', 'centavos': 'int64', 'unidades_preco': 'int64'})
+    return _valores_em_reais(serie)[colunas_serie].reset_index(drop=True)
+
+
+def datas_da_serie(user_hash, inicio, fim, frequencia, limite=None):
+    """
+    Retorna as datas da série de posições entre inicio e fim (inclusive).
+
+    Args:
+        frequencia: FREQUENCIA_DIARIA (todos os dias), FREQUENCIA_MENSAL (último
+            dia de cada mês) ou FREQUENCIA_NEGOCIACAO (dias com negociação)
+        limite: quantidade máxima de datas retornadas
+    """
+    if frequencia == FREQUENCIA_NEGOCIACAO:
+        query = db.session.query(Negociacao.data_negocio).filter(
+            Negociacao.user_hash == user_hash,
+            Negociacao.data_negocio.between(inicio, fim)
+        ).distinct().order_by(Negociacao.data_negocio)
+        if limite is not None:
+            query = query.limit(limite)
+        return [data for (data,) in query]
+
+    datas = pd.date_range(inicio, fim, freq='D' if frequencia == FREQUENCIA_DIARIA else 'ME')
+    if limite is not None:
+        datas = datas[:limite]
+    return [data.date() for data in datas]
+
+
+def atualizar_posicoes_mensais(user_hash, alteracoes):
+    """
+    Recalcula as posições mensais das ações alteradas.
+
+    As posições a partir do mês da menor data alterada são removidas e
+    recalculadas em uma única passada, partindo da posição mensal anterior, que
+    continua válida. Não faz commit: o chamador controla a transação.
+
+    Args:
+        alteracoes: dict acao_id -> menor data de negociação ou saldo incluído,
+            alterado ou excluído (ver registrar_alteracoes e datas_alteradas)
+    """
+    if not alteracoes:
+        return
+
+    acao_ids = sorted(alteracoes)
+    inicio = min(alteracoes.values()).replace(day=1)
+
+    db.session.query(PosicaoMensal).filter(
+        PosicaoMensal.user_hash == user_hash,
+        PosicaoMensal.acao_id.in_(acao_ids),
+        PosicaoMensal.mes >= inicio
+    ).delete(synchronize_session=False)
+
+    acoes, colunas = carregar_colunas(user_hash, inicio - timedelta(days=1), None, acao_ids)
+    historico = _montar_historico(acoes, colunas, calcular_colunas(colunas))
+
+    # Posição no fim de cada mês: a última linha do mês de cada ação
+    historico['mes'] = (pd.to_datetime(historico['data']) + pd.offsets.MonthEnd(0)).dt.date
+    mensais = historico[historico['mes'] >= inicio].drop_duplicates(['acao_id', 'mes'], keep='last')
+
+    registros = [
+        {
+            'acao_id': acao_id,
+            'mes': mes,
+            'quantidade': saldo,
+            'valor_investido': centavos_para_reais(valor_investido),
+            'preco_medio': unidades_para_reais(preco_medio),
+            'user_hash': user_hash,
+        }
+        for acao_id, mes, saldo, valor_investido, preco_medio in zip(
+            mensais['acao_id'].tolist(), mensais['mes'], mensais['saldo'].tolist(),
+            mensais['centavos'].tolist(), mensais['unidades_preco'].tolist()
+        )
+    ]
+    if registros:
+        db.session.execute(insert(PosicaoMensal), registros)
+
+
+def recalcular_posicoes_mensais(user_hash):
+    """Recalcula todas as posições mensais do usuário desde a primeira negociação ou saldo cadastrado"""
+    inicios = [
+        db.session.query(db.func.min(Negociacao.data_negocio)).filter(Negociacao.user_hash == user_hash).scalar(),
+        db.session.query(db.func.min(SaldoPrecoMedio.data_base)).filter(SaldoPrecoMedio.user_hash == user_hash).scalar(),
+    ]
+    inicios = [data for data in inicios if data is not None]
+    if inicios:
+        acao_ids = [acao_id for (acao_id,) in db.session.query(Acao.id).filter(Acao.user_hash == user_hash)]
+        atualizar_posicoes_mensais(user_hash, dict.fromkeys(acao_ids, min(inicios)))
+
+
+def datas_alteradas(user_hash, *filtros):
+    """
+    Retorna, por ação, a menor data das negociações do usuário que atendem aos filtros.
+
+    Usada antes de excluir negociações, para saber a partir de quando recalcular
+    as posições mensais.
+
+    Returns:
+        dict: acao_id -> menor data_negocio
+    """
+    return dict(
+        db.session.query(Negociacao.acao_id, db.func.min(Negociacao.data_negocio)).filter(
+            Negociacao.user_hash == user_hash, *filtros
+        ).group_by(Negociacao.acao_id).all()
+    )
+
+
+def registrar_alteracoes(alteracoes, datas):
+    """Acumula em alteracoes (acao_id -> data) a menor data alterada de cada ação"""
+    for acao_id, data in datas.items():
+        if acao_id not in alteracoes or data < alteracoes[acao_id]:
+            alteracoes[acao_id] = data
+    return alteracoes
+
+
+def carregar_colunas(user_hash, data_partida, data_base, acao_ids=None):
+    """
+    Carrega as posições iniciais e as negociações como arrays colunares para o
+    kernel de custo médio, agrupados por ação e em ordem cronológica.
+
+    Cada ação parte do saldo cadastrado ou da posição mensal mais recente até
+    data_partida; sem data_partida, o histórico é percorrido desde o início.
+    Saldos cadastrados posteriores ao ponto de partida entram como novas
+    posições iniciais na sua data, e os eventos corporativos posteriores, como
+    linhas de ajuste (coluna 'evento'), com a proporção do evento nas colunas
+    'proporcao_numerador' e 'proporcao_denominador' (ver
+    src/utils/eventos_corporativos.py).
+
+    Returns:
+        tuple: (mapa acao_id -> Acao, dict de arrays)
+    """
+    partidas = []
+    if data_partida is None:
+        query = Acao.query.filter(Acao.user_hash == user_hash)
+        if acao_ids is not None:
+            query = query.filter(Acao.id.in_(acao_ids))
+        acoes = {acao.id: acao for acao in query}
+        negociacoes = _consulta_negociacoes(user_hash, data_base, acao_ids).order_by(
+            Negociacao.acao_id, Negociacao.data_negocio, Negociacao.id
+        ).all()
+    else:
+        acoes = {}
+        for acao, saldo_cadastrado, posicao_mensal in carregar_saldos_iniciais(user_hash, data_partida, acao_ids):
+            acoes[acao.id] = acao
+            if posicao_mensal and (saldo_cadastrado is None or posicao_mensal.mes > saldo_cadastrado.data_base):
+                partidas.append((
+                    acao.id, posicao_mensal.mes, TIPO_POSICAO_MENSAL, posicao_mensal.quantidade,
+                    int(para_centavos([posicao_mensal.valor_investido])[0]),
+                    int(preco_para_unidades([posicao_mensal.preco_medio])[0])
+                ))
+            elif saldo_cadastrado:
+                partidas.append(_partida_saldo(saldo_cadastrado))
+        negociacoes = carregar_negociacoes(user_hash, data_partida, data_base, acao_ids)
+
+    # Saldos cadastrados depois do ponto de partida (apenas ao percorrer um período)
+    saldos = []
+    if data_partida is None or data_base is None or data_partida < data_base:
+        query = SaldoPrecoMedio.query.filter(SaldoPrecoMedio.user_hash == user_hash)
+        if data_partida is not None:
+            query = query.filter(SaldoPrecoMedio.data_base > data_partida)
+        if data_base is not None:
+            query = query.filter(SaldoPrecoMedio.data_base <= data_base)
+        if acao_ids is not None:
+            query = query.filter(SaldoPrecoMedio.acao_id.in_(acao_ids))
+        saldos = [_partida_saldo(saldo) for saldo in query]
+
+    # Negociações e saldos de ações de outro usuário são desconsiderados
+    negociacoes = [negociacao for negociacao in negociacoes if negociacao.acao_id in acoes]
+    saldos = [saldo for saldo in saldos if saldo[0] in acoes]
+
+    # Eventos corporativos posteriores ao ponto de partida de cada ação entram como linhas de ajuste
+    inicio_por_acao = {linha[0]: linha[1] for linha in partidas}
+    eventos = [
+        evento for evento in carregar_eventos(user_hash, data_base, acao_ids)
+        if evento.acao_id in acoes and evento.data_ex > inicio_por_acao.get(evento.acao_id, date.min)
+    ]
+    marcos = [(evento.acao_id, evento.data_ex, evento.tipo, 0, 0, np.nan) for evento in eventos]
+    iniciais = partidas + saldos + marcos
+
+    tipos = np.array([negociacao.tipo_movimentacao for negociacao in negociacoes], dtype=object)
+    quantidades = np.array([negociacao.quantidade for negociacao in negociacoes], dtype=np.int64)
+    day_trades = np.array([negociacao.quantidade_day_trade for negociacao in negociacoes], dtype=np.int64)
+    compras = tipos == 'Compra'
+    vendas = tipos == 'Venda'
+    sinais = np.where(compras, 1, np.where(vendas, -1, 0))
+
+    # A posição e o preço médio consideram apenas a parte em operações comuns (ver
+    # src/utils/day_trade.py); o custo das compras, em centavos, inclui a corretagem
+    # proporcional a essa parte quando positiva
+    swing_trades = quantidades - day_trades
+    precos = para_centavos([negociacao.preco for negociacao in negociacoes])
+    corretagens = np.maximum(para_centavos([negociacao.corretagem for negociacao in negociacoes]), 0)
+    corretagens_swing = dividir_arredondando(corretagens * swing_trades, np.maximum(quantidades, 1))
+    custos = np.where(compras, swing_trades * precos + corretagens_swing, 0)
+
+    colunas = {
+        'negociacao_id': np.array([None] * len(iniciais) + [negociacao.id for negociacao in negociacoes], dtype=object),
+        'acao_id': np.array([linha[0] for linha in iniciais] + [negociacao.acao_id for negociacao in negociacoes], dtype=np.int64),
+        'data': np.array([linha[1] for linha in iniciais] + [negociacao.data_negocio for negociacao in negociacoes], dtype=object),
+        'tipo_movimentacao': np.concatenate([np.array([linha[2] for linha in iniciais], dtype=object), tipos]),
+        'quantidade': np.concatenate([
+            np.array([linha[3] for linha in iniciais], dtype=np.int64),
+            sinais * swing_trades,
+        ]),
+        'custo': np.concatenate([np.array([linha[4] for linha in iniciais], dtype=np.int64), custos]),
+        'preco_inicial': np.concatenate([
+            np.array([linha[5] for linha in iniciais], dtype=np.float64),
+            np.full(len(negociacoes), np.nan),
+        ]),
+        # Quantidade total com sinal, parte em day trade, preço e corretagem em centavos
+        # de cada negociação (usados na apuração)
+        'quantidade_negociada': np.concatenate([np.zeros(len(iniciais), dtype=np.int64), sinais * quantidades]),
+        'day_trade': np.concatenate([np.zeros(len(iniciais), dtype=np.int64), day_trades]),
+        'preco': np.concatenate([np.zeros(len(iniciais), dtype=np.int64), precos]),
+        'corretagem': np.concatenate([np.zeros(len(iniciais), dtype=np.int64), corretagens]),
+    }
+
+    # Por ação e data; na mesma data, o ponto de partida, o evento, as negociações (na ordem da
+    # consulta) e os saldos
+    ordem_tipo = np.concatenate([
+        np.full(len(partidas), ORDEM_PARTIDA),
+        np.full(len(saldos), ORDEM_SALDO),
+        np.full(len(marcos), ORDEM_EVENTO),
+        np.full(len(negociacoes), ORDEM_NEGOCIACAO),
+    ])
+    sequencia = np.concatenate([np.zeros(len(iniciais), dtype=np.int64), np.arange(len(negociacoes))])
+    datas = np.array([data.toordinal() for data in colunas['data']], dtype=np.int64)
+    colunas['evento'] = np.concatenate([np.zeros(len(partidas) + len(saldos), dtype=bool),
+                                        np.ones(len(marcos), dtype=bool), np.zeros(len(negociacoes), dtype=bool)])
+    numeradores, denominadores = proporcoes_dos_eventos(eventos)
+    uns = np.ones(len(partidas) + len(saldos), dtype=np.int64), np.ones(len(negociacoes), dtype=np.int64)
+    colunas['proporcao_numerador'] = np.concatenate([uns[0], numeradores, uns[1]])
+    colunas['proporcao_denominador'] = np.concatenate([uns[0], denominadores, uns[1]])
+    ordem = np.lexsort((sequencia, ordem_tipo, datas, colunas['acao_id']))
+    return acoes, {nome: array[ordem] for nome, array in colunas.items()}
+
+
+def calcular_colunas(colunas):
+    """
+    Aplica o kernel de custo médio às colunas de carregar_colunas.
+
+    Os eventos corporativos entram como linhas de ajuste com a sua proporção.
+
+    Returns:
+        dict: arrays 'quantidade' (ações após cada linha),
+        'valor_investido' (centavos) e 'preco_medio' (unidades inteiras)
+    """
+    return calcular_custo_medio(
+        colunas['acao_id'], colunas['quantidade'], colunas['custo'], colunas['preco_inicial'],
+        escala_preco=UNIDADES_POR_CENTAVO, ajustes=colunas['evento'],
+        proporcoes=(colunas['proporcao_numerador'], colunas['proporcao_denominador'])
+    )
+
+
+def _montar_historico(acoes, colunas, historico):
+    codigos = {acao_id: acao.codigo for acao_id, acao in acoes.items()}
+    return pd.DataFrame({
+        'negociacao_id': colunas['negociacao_id'],
+        'acao_id': colunas['acao_id'],
+        'codigo': [codigos[acao_id] for acao_id in colunas['acao_id'].tolist()],
+        'data': colunas['data'],
+        'tipo_movimentacao': colunas['tipo_movimentacao'],
+        'quantidade': colunas['quantidade'],
+        'saldo': historico['quantidade'],
+        'centavos': historico['valor_investido'],
+        'unidades_preco': historico['preco_medio'],
+    })
+
+
+def _valores_em_reais(historico):
+    """Acrescenta valor_investido e preco_medio em Decimal, a partir dos centavos e das unidades de preço médio"""
+    return historico.assign(
+        valor_investido=[centavos_para_reais(centavos) for centavos in historico['centavos'].tolist()],
+        preco_medio=[unidades_para_reais(unidades) for unidades in historico['unidades_preco'].tolist()],
+    )
+
+
+def _consulta_negociacoes(user_hash, data_base=None, acao_ids=None):
+    """Consulta das colunas usadas no cálculo das negociações do usuário até a data base"""
+    query = db.session.query(
+        Negociacao.id,
+        Negociacao.acao_id,
+        Negociacao.data_negocio,
+        Negociacao.tipo_movimentacao,
+        Negociacao.quantidade,
+        Negociacao.preco,
+        Negociacao.corretagem,
+        Negociacao.quantidade_day_trade
+    ).filter(Negociacao.user_hash == user_hash)
+    if data_base is not None:
+        query = query.filter(Negociacao.data_negocio <= data_base)
+    if acao_ids is not None:
+        query = query.filter(Negociacao.acao_id.in_(acao_ids))
+    return query
+
+
+def _partida_saldo(saldo):
+    """Linha de posição inicial a partir de um saldo cadastrado"""
+    preco_medio = int(para_centavos([saldo.preco_medio])[0])
+    return (saldo.acao_id, saldo.data_base, TIPO_SALDO_CADASTRADO, saldo.quantidade,
+            saldo.quantidade * preco_medio, float(preco_medio * UNIDADES_POR_CENTAVO))
+
+
+def _ultimo_saldo(user_hash, data_base):
+    """Subconsulta com a data do saldo cadastrado mais recente de cada ação até a data base"""
+    return db.session.query(
+        SaldoPrecoMedio.acao_id,
+        db.func.max(SaldoPrecoMedio.data_base).label('data_base')
+    ).filter(
+        SaldoPrecoMedio.user_hash == user_hash,
+        SaldoPrecoMedio.data_base <= data_base
+    ).group_by(SaldoPrecoMedio.acao_id).subquery()
+
+
+def _ultima_posicao_mensal(user_hash, data_base):
+    """Subconsulta com o mês da posição mensal mais recente de cada ação até a data base"""
+    return db.session.query(
+        PosicaoMensal.acao_id,
+        db.func.max(PosicaoMensal.mes).label('mes')
+    ).filter(
+        PosicaoMensal.user_hash == user_hash,
+        PosicaoMensal.mes <= data_base
+    ).group_by(PosicaoMensal.acao_id).subquery()
+
@@ -0,0 +1,188 @@
+"""
+Busca de CNPJs na internet, em lote.
+
+As requisições usam uma única requests.Session, com um pool de conexões do
+tamanho do número de buscas simultâneas, e timeouts de conexão e de leitura.
+Todas as buscas do processo passam por:
+
+- um limitador de taxa global (LimitadorTaxa), que espaça as requisições para
+  não exceder o número de requisições por segundo;
+- um disjuntor (Disjuntor), que após FALHAS_PARA_ABRIR falhas seguidas deixa de
+  chamar o serviço por ESPERA_CIRCUITO segundos e depois libera uma única
+  requisição de teste antes de voltar ao normal.
+
+O endereço da busca é configurável, o que permite testar o resolvedor contra
+um servidor HTTP local.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import quote_plus
+import requests
+import urllib3
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from src.utils.enriquecimento_cnpj import PADRAO_CNPJ
+
+URL_BUSCA_CNPJ = 'https://www.google.com/search?q=cnpj+{codigo}+b3+bovespa'
+
+# Buscas simultâneas e requisições por segundo de todo o processo
+BUSCAS_SIMULTANEAS = int(os.environ.get('CNPJ_BUSCAS_SIMULTANEAS', '4'))
+REQUISICOES_POR_SEGUNDO = float(os.environ.get('CNPJ_REQUISICOES_POR_SEGUNDO', '2'))
+
+# Tempo máximo, em segundos, para conectar e para receber a resposta
+TIMEOUT_CONEXAO = 3
+TIMEOUT_BUSCA_CNPJ = 10
+
+# Falhas seguidas que abrem o disjuntor e segundos até a requisição de teste
+FALHAS_PARA_ABRIR = 5
+ESPERA_CIRCUITO = 60
+
+_CABECALHOS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+class CircuitoAberto(Exception):
+    """O serviço de busca falhou seguidamente e não está sendo chamado"""
+
+
+class LimitadorTaxa:
+    """Espaça as chamadas de aguardar() de todas as threads em 1/por_segundo segundos"""
+
+    def __init__(self, por_segundo, relogio=time.monotonic, dormir=time.sleep):
+        self.intervalo = 1 / por_segundo
+        self._relogio = relogio
+        self._dormir = dormir
+        self._proxima = 0.0
+        self._lock = Lock()
+
+    def aguardar(self):
+        with self._lock:
+            agora = self._relogio()
+            inicio = max(agora, self._proxima)
+            self._proxima = inicio + self.intervalo
+        if inicio > agora:
+            self._dormir(inicio - agora)
+
+
+class Disjuntor:
+    """Interrompe as chamadas a um serviço que falha seguidamente"""
+
+    def __init__(self, falhas_para_abrir=FALHAS_PARA_ABRIR, espera=ESPERA_CIRCUITO, relogio=time.monotonic):
+        self.falhas_para_abrir = falhas_para_abrir
+        self.espera = espera
+        self._relogio = relogio
+        self._falhas = 0
+        self._aberto_ate = None
+        self._testando = False
+        self._lock = Lock()
+
+    @property
+    def aberto(self):
+        with self._lock:
+            return self._aberto_ate is not None
+
+    def permitir(self):
+        """Indica se a chamada pode ser feita; com o disjuntor aberto, libera uma chamada de teste após a espera"""
+        with self._lock:
+            if self._aberto_ate is None:
+                return True
+            if self._testando or self._relogio() < self._aberto_ate:
+                return False
+            self._testando = True
+            return True
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self._falhas, self._aberto_ate, self._testando = 0, None, False
+
+    def registrar_falha(self):
+        with self._lock:
+            self._falhas += 1
+            if self._testando or self._falhas >= self.falhas_para_abrir:
+                self._aberto_ate = self._relogio() + self.espera
+                self._testando = False
+
+
+class ResolvedorCnpj:
+    """
+    Busca CNPJs na internet com buscas simultâneas limitadas.
+
+    Args:
+        url: endereço da busca, com {codigo} no lugar do código da ação
+        buscas_simultaneas: threads (e conexões do pool) por lote
+        timeout: (conexão, leitura), em segundos
+        limitador, disjuntor: compartilhados por todas as buscas do resolvedor
+    """
+
+    def __init__(self, url=URL_BUSCA_CNPJ, buscas_simultaneas=BUSCAS_SIMULTANEAS, timeout=None,
+                 limitador=None, disjuntor=None, verificar_ssl=False):
+        self.url = url
+        self.buscas_simultaneas = buscas_simultaneas
+        self.timeout = timeout or (TIMEOUT_CONEXAO, TIMEOUT_BUSCA_CNPJ)
+        self.limitador = limitador or LimitadorTaxa(REQUISICOES_POR_SEGUNDO)
+        self.disjuntor = disjuntor or Disjuntor()
+        self.verificar_ssl = verificar_ssl
+        if not verificar_ssl:
+            # Desabilitar o aviso da verificação de SSL, desligada para evitar erros de certificado
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+        self.sessao = requests.Session()
+        self.sessao.headers.update(_CABECALHOS)
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=buscas_simultaneas)
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+
+    def buscar(self, codigo):
+        """
+        Procura o primeiro CNPJ (XX.XXX.XXX/XXXX-XX) no resultado da busca.
+
+        Returns:
+            str ou None: o CNPJ, ou None se a página não tiver nenhum
+
+        Raises:
+            CircuitoAberto: se o disjuntor estiver aberto
+            requests.RequestException: em erros de rede ou respostas de erro
+        """
+        if not self.disjuntor.permitir():
+            raise CircuitoAberto(f'Busca de CNPJ suspensa após {self.disjuntor.falhas_para_abrir} falhas seguidas')
+        try:
+            self.limitador.aguardar()
+            response = self.sessao.get(self.url.format(codigo=quote_plus(codigo)), timeout=self.timeout,
+                                       verify=self.verificar_ssl)
+            response.raise_for_status()
+        except Exception:
+            # Qualquer erro conta como falha, inclusive o da requisição de teste, que assim é liberada
+            self.disjuntor.registrar_falha()
+            raise
+        self.disjuntor.registrar_sucesso()
+
+        encontrado = PADRAO_CNPJ.search(BeautifulSoup(response.text, 'html.parser').get_text())
+        return encontrado.group() if encontrado else None
+
+    def buscar_em_lote(self, codigos):
+        """
+        Busca os códigos simultaneamente, em até buscas_simultaneas threads.
+
+        Returns:
+            tupla (resultados, erros): dict código -> CNPJ ou None, e dict
+            código -> exceção dos códigos que não puderam ser buscados
+        """
+        codigos = list(dict.fromkeys(codigos))
+        resultados, erros = {}, {}
+        if not codigos:
+            return resultados, erros
+        with ThreadPoolExecutor(max_workers=min(len(codigos), self.buscas_simultaneas),
+                                thread_name_prefix='cnpj-busca') as executor:
+            futuros = {codigo: executor.submit(self.buscar, codigo) for codigo in codigos}
+            for codigo, futuro in futuros.items():
+                try:
+                    resultados[codigo] = futuro.result()
+                except (requests.RequestException, CircuitoAberto) as e:
+                    erros[codigo] = e
+        return resultados, erros
+
+    def fechar(self):
+        self.sessao.close()
@@ -0,0 +1,106 @@
+"""
+Base comum dos testes que usam o banco de dados.
+
+Cada teste roda em uma aplicação Flask própria, com as tabelas criadas em um
+SQLite em memória e removidas ao final.
+"""
+import os
+import sys
+import unittest
+from decimal import Decimal
+
+from flask import Flask
+from flask_login import LoginManager
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Negociacao, Relatorio, User
+from src.routes.acoes import acoes_bp
+from src.routes.auth import auth_bp
+from src.routes.eventos import eventos_bp
+from src.routes.main import main_bp
+from src.routes.negociacoes import negociacoes_bp
+from src.routes.relatorios import relatorios_bp
+from src.routes.saldos import saldos_bp
+from src.utils.posicao import calcular_colunas, carregar_colunas, _montar_historico, _valores_em_reais
+
+USUARIO = dict(email='user1@example.com', name='Usuário 1', google_id='123456789')
+OUTRO_USUARIO = dict(email='user2@example.com', name='Usuário 2', google_id='987654321')
+
+
+class TesteComBanco(unittest.TestCase):
+    """Aplicação Flask com as tabelas criadas em um SQLite em memória"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        db.init_app(self.app)
+
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+
+class TesteComRotas(TesteComBanco):
+    """Além do banco, as rotas da aplicação e um cliente autenticado como USUARIO"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.app.template_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'templates')
+        self.app.config['SECRET_KEY'] = 'teste'
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        for blueprint in (auth_bp, main_bp, acoes_bp, negociacoes_bp, relatorios_bp, saldos_bp, eventos_bp):
+            self.app.register_blueprint(blueprint)
+        login_manager = LoginManager(self.app)
+        login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+
+        self.user = User(**USUARIO)
+        db.session.add(self.user)
+        db.session.commit()
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sessao:
+            sessao['_user_id'] = str(self.user.id)
+            sessao['_fresh'] = True
+
+
+class TesteComNegociacoes(TesteComBanco):
+    """Além do banco, um usuário e o relatório ao qual as negociações dos testes pertencem"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.user = User(**USUARIO)
+        db.session.add(self.user)
+        db.session.commit()
+        self.user_hash = self.user.hash_id
+
+        self.relatorio = Relatorio(nome_arquivo='negociacao.xlsx', user_hash=self.user_hash)
+        db.session.add(self.relatorio)
+        db.session.commit()
+
+    def negociar(self, acao, data, tipo, quantidade, preco, corretagem=None, instituicao='CORRETORA XYZ'):
+        """Inclui uma negociação da ação no mercado à vista, sem commit"""
+        preco = Decimal(str(preco))
+        db.session.add(Negociacao(
+            data_negocio=data, tipo_movimentacao=tipo, mercado='Mercado à Vista',
+            prazo_vencimento='-', instituicao=instituicao, quantidade=quantidade,
+            preco=preco, valor=quantidade * preco, corretagem=corretagem,
+            acao_id=acao.id, relatorio_id=self.relatorio.id, user_hash=acao.user_hash
+        ))
+
+
+def historico_completo(user_hash, data_base):
+    """Posição da ação após cada negociação, percorrendo todo o histórico sem partir das posições mensais"""
+    acoes, colunas = carregar_colunas(user_hash, None, data_base)
+    return _valores_em_reais(_montar_historico(acoes, colunas, calcular_colunas(colunas)))
@@ -0,0 +1,140 @@
+import os
+import random
+import sys
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, ApuracaoMensal, Negociacao, SaldoPrecoMedio
+from src.utils.apuracao import atualizar_calculos, recalcular_apuracoes
+from src.utils.day_trade import classificar_day_trades
+from src.utils.posicao import recalcular_posicoes_mensais
+from base import TesteComNegociacoes
+
+
+class TestApuracao(TesteComNegociacoes):
+    """Testes para a apuração mensal do imposto de renda"""
+
+    def criar_acoes(self, *codigos):
+        acoes = [Acao(codigo=codigo, user_hash=self.user_hash) for codigo in codigos]
+        db.session.add_all(acoes)
+        db.session.flush()
+        return acoes
+
+    def apuracoes(self):
+        return {
+            apuracao.mes: apuracao
+            for apuracao in ApuracaoMensal.query.filter_by(user_hash=self.user_hash).order_by(ApuracaoMensal.mes)
+        }
+
+    def quantidades_day_trade(self):
+        return [negociacao.quantidade_day_trade for negociacao in Negociacao.query.order_by(Negociacao.id)]
+
+    def recalcular(self):
+        classificar_day_trades(self.user_hash)
+        recalcular_posicoes_mensais(self.user_hash)
+        recalcular_apuracoes(self.user_hash)
+        db.session.commit()
+
+    def test_isencao_compensacao_e_day_trade(self):
+        """Aplica a isenção, compensa prejuízos e separa o day trade"""
+        petr, vale, itsa = self.criar_acoes('PETR4', 'VALE3', 'ITSA4')
+        self.negociar(petr, date(2024, 1, 10), 'Compra', 1000, 10)
+        # Vendas de R$ 6.000,00: lucro de R$ 1.000,00 isento
+        self.negociar(petr, date(2024, 2, 10), 'Venda', 500, 12)
+        # Prejuízo de R$ 1.000,00, acumulado mesmo com vendas abaixo do limite
+        self.negociar(petr, date(2024, 3, 10), 'Venda', 500, 8)
+        self.negociar(vale, date(2024, 4, 10), 'Compra', 2000, 20)
+        # Vendas de R$ 44.000,00: lucro de R$ 4.000,00, compensado o prejuízo
+        self.negociar(vale, date(2024, 5, 10), 'Venda', 2000, 22)
+        # Day trade com corretagem; compra e venda no mesmo dia em instituições diferentes são operações comuns
+        self.negociar(itsa, date(2024, 6, 10), 'Compra', 100, 10, corretagem=Decimal('1.00'))
+        self.negociar(itsa, date(2024, 6, 10), 'Venda', 100, 11, corretagem=Decimal('1.00'))
+        self.negociar(itsa, date(2024, 7, 10), 'Compra', 100, 10)
+        self.negociar(itsa, date(2024, 7, 10), 'Venda', 100, 9, instituicao='OUTRA CORRETORA')
+        db.session.commit()
+
+        self.recalcular()
+        apuracoes = self.apuracoes()
+
+        self.assertEqual(list(apuracoes), [date(2024, 2, 29), date(2024, 3, 31), date(2024, 5, 31),
+                                           date(2024, 6, 30), date(2024, 7, 31)])
+        fevereiro = apuracoes[date(2024, 2, 29)]
+        self.assertTrue(fevereiro.isento_swing_trade)
+        self.assertEqual((fevereiro.resultado_swing_trade, fevereiro.imposto), (Decimal('1000.00'), Decimal('0.00')))
+        marco = apuracoes[date(2024, 3, 31)]
+        self.assertFalse(marco.isento_swing_trade)
+        self.assertEqual(marco.prejuizo_swing_trade, Decimal('1000.00'))
+        maio = apuracoes[date(2024, 5, 31)]
+        self.assertEqual((maio.vendas_swing_trade, maio.resultado_swing_trade, maio.base_swing_trade),
+                         (Decimal('44000.00'), Decimal('4000.00'), Decimal('3000.00')))
+        self.assertEqual((maio.imposto_swing_trade, maio.prejuizo_swing_trade), (Decimal('450.00'), Decimal('0.00')))
+        junho = apuracoes[date(2024, 6, 30)]
+        self.assertEqual((junho.vendas_swing_trade, junho.vendas_day_trade), (Decimal('0.00'), Decimal('1100.00')))
+        self.assertEqual((junho.resultado_day_trade, junho.imposto_day_trade), (Decimal('98.00'), Decimal('19.60')))
+        julho = apuracoes[date(2024, 7, 31)]
+        self.assertEqual((julho.vendas_day_trade, julho.vendas_swing_trade), (Decimal('0.00'), Decimal('900.00')))
+        self.assertEqual(julho.resultado_swing_trade, Decimal('-100.00'))
+
+    def test_quantidade_em_day_trade(self):
+        """Atribui o day trade às compras e vendas na ordem das negociações, por instituição"""
+        petr, = self.criar_acoes('PETR4')
+        self.negociar(petr, date(2024, 1, 10), 'Compra', 300, 10)
+        self.negociar(petr, date(2024, 1, 10), 'Compra', 100, 10)
+        self.negociar(petr, date(2024, 1, 10), 'Venda', 100, 11)
+        self.negociar(petr, date(2024, 1, 10), 'Venda', 150, 11)
+        self.negociar(petr, date(2024, 1, 10), 'Venda', 50, 11, instituicao='OUTRA CORRETORA')
+        self.negociar(petr, date(2024, 1, 11), 'Venda', 100, 11)
+        db.session.commit()
+
+        self.assertEqual(classificar_day_trades(self.user_hash), 3)
+        db.session.commit()
+        self.assertEqual(self.quantidades_day_trade(), [250, 0, 100, 150, 0, 0])
+
+        # Uma venda excluída reclassifica apenas o necessário, sem reler as demais ações e datas
+        Negociacao.query.filter_by(quantidade=150).delete()
+        self.assertEqual(classificar_day_trades(self.user_hash, {petr.id: date(2024, 1, 10)}), 1)
+        db.session.commit()
+        self.assertEqual(self.quantidades_day_trade(), [100, 0, 100, 0, 0])
+
+    def test_atualizacao_incremental_igual_ao_recalculo(self):
+        """Recalcular a partir do mês alterado produz o mesmo resultado que recalcular tudo"""
+        aleatorio = random.Random(3)
+        acoes = self.criar_acoes(*[f'ACAO{indice:02d}' for indice in range(8)])
+        inicio = date(2023, 1, 2)
+        for acao in acoes:
+            for _ in range(40):
+                self.negociar(
+                    acao, inicio + timedelta(days=aleatorio.randint(0, 365)),
+                    aleatorio.choice(['Compra', 'Compra', 'Venda']), aleatorio.randint(1, 500),
+                    round(aleatorio.uniform(5, 80), 2), corretagem=aleatorio.choice([None, Decimal('4.90')]),
+                    instituicao=aleatorio.choice(['CORRETORA XYZ', 'OUTRA CORRETORA'])
+                )
+        db.session.add(SaldoPrecoMedio(data_base=date(2023, 3, 15), quantidade=300, preco_medio=Decimal('20.00'),
+                                       acao_id=acoes[0].id, user_hash=self.user_hash))
+        db.session.commit()
+        self.recalcular()
+        self.assertTrue(len(self.apuracoes()) > 6)
+
+        self.negociar(acoes[1], date(2023, 7, 5), 'Venda', 200, 99.99)
+        self.negociar(acoes[1], date(2023, 7, 5), 'Compra', 50, 90)
+        db.session.flush()
+        atualizar_calculos(self.user_hash, {acoes[1].id: date(2023, 7, 5)})
+        db.session.commit()
+        incrementais = {mes: apuracao.__dict__.copy() for mes, apuracao in self.apuracoes().items()}
+
+        self.recalcular()
+        db.session.expire_all()
+        campos = [coluna.name for coluna in ApuracaoMensal.__table__.columns if coluna.name not in ('id', 'created_at')]
+        self.assertEqual(
+            {mes: [valores[campo] for campo in campos] for mes, valores in incrementais.items()},
+            {mes: [getattr(apuracao, campo) for campo in campos] for mes, apuracao in self.apuracoes().items()}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
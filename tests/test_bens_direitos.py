@@ -0,0 +1,88 @@
+import os
+import sys
+import unittest
+from datetime import date
+from decimal import Decimal
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao
+from src.utils.bens_direitos import calcular_bens_e_direitos, interpretar_anos, LIMITE_ANOS
+from src.utils.posicao import calcular_posicoes
+from base import TesteComNegociacoes
+
+
+class TestBensDireitos(TesteComNegociacoes):
+    """Testes para o relatório anual de Bens e Direitos"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.petr = Acao(codigo='PETR4', cnpj='33.000.167/0001-01', user_hash=self.user_hash)
+        self.vale = Acao(codigo='VALE3', user_hash=self.user_hash)
+        self.itub = Acao(codigo='ITUB4', user_hash=self.user_hash)
+        db.session.add_all([self.petr, self.vale, self.itub])
+        db.session.commit()
+
+    def test_situacoes_iguais_ao_relatorio_de_posicao(self):
+        """Cada fim de ano coincide com o relatório de posição em 31/12 e os anos sem saldo ficam zerados"""
+        self.negociar(self.petr, date(2021, 3, 10), 'Compra', 100, 25.5)
+        self.negociar(self.petr, date(2022, 6, 1), 'Compra', 50, 31.17)
+        self.negociar(self.petr, date(2023, 8, 15), 'Venda', 30, 35)
+        self.negociar(self.vale, date(2022, 2, 1), 'Compra', 10, 80)
+        self.negociar(self.vale, date(2023, 5, 2), 'Venda', 10, 70)
+        self.negociar(self.itub, date(2024, 1, 5), 'Compra', 7, 33.33)
+        db.session.commit()
+
+        anos = [2021, 2022, 2023]
+        bens = calcular_bens_e_direitos(self.user_hash, anos)
+        self.assertEqual([bem['codigo'] for bem in bens], ['PETR4', 'VALE3'])
+
+        for ano in anos:
+            esperado = {
+                posicao['acao'].codigo: (posicao['quantidade'], posicao['preco_medio'], posicao['valor_investido'])
+                for posicao in calcular_posicoes(self.user_hash, date(ano, 12, 31))
+            }
+            obtido = {
+                bem['codigo']: (situacao['quantidade'], situacao['preco_medio'], situacao['valor'])
+                for bem in bens
+                for situacao in [bem['situacoes'][ano]]
+                if situacao['quantidade']
+            }
+            self.assertEqual(obtido, esperado, f'Situação diferente em 31/12/{ano}')
+
+        vale = bens[1]
+        self.assertEqual(vale['situacoes'][2021], {'quantidade': 0, 'preco_medio': Decimal('0'), 'valor': Decimal('0.00')})
+        self.assertEqual(vale['situacoes'][2023]['valor'], Decimal('0.00'))
+        self.assertEqual((vale['cnpj'], vale['cnpj_pendente']), ('CNPJ não cadastrado', True))
+        self.assertEqual((bens[0]['cnpj'], bens[0]['cnpj_pendente']), ('33.000.167/0001-01', False))
+
+    def test_venda_parcial_no_ano(self):
+        """A venda parcial durante o ano reduz o valor declarado ao custo das ações restantes"""
+        self.negociar(self.petr, date(2023, 2, 1), 'Compra', 100, 10)
+        self.negociar(self.petr, date(2023, 9, 1), 'Venda', 50, 14)
+        db.session.commit()
+
+        petr, = calcular_bens_e_direitos(self.user_hash, [2023])
+        self.assertEqual(petr['situacoes'][2023],
+                         {'quantidade': 50, 'preco_medio': Decimal('10.0000'), 'valor': Decimal('500.00')})
+
+    def test_sem_posicoes(self):
+        """Sem saldo em nenhum dos anos, o relatório fica vazio"""
+        self.negociar(self.petr, date(2024, 3, 10), 'Compra', 100, 25.5)
+        db.session.commit()
+        self.assertEqual(calcular_bens_e_direitos(self.user_hash, [2022, 2023]), [])
+
+    def test_interpretar_anos(self):
+        """Aceita listas e intervalos e rejeita entradas inválidas"""
+        self.assertEqual(interpretar_anos('2024, 2023;2023'), [2023, 2024])
+        self.assertEqual(interpretar_anos('2024-2022 2019'), [2019, 2022, 2023, 2024])
+        for texto in ('', '23', '2023, abc', f'2000-{2000 + LIMITE_ANOS}'):
+            with self.assertRaises(ValueError):
+                interpretar_anos(texto)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models.all_models import CnpjCache
+from src.utils.cache_cnpj import (
+    buscar_com_cache, consultar_cache, gravar_cache, TTL_ENCONTRADO, TTL_NAO_ENCONTRADO
+)
+from base import TesteComBanco
+
+CNPJS = {'PETR4': '33.000.167/0001-01', 'VALE3': '33.592.510/0001-54'}
+
+
+class TestCacheCnpj(TesteComBanco):
+    """Testes para o cache de CNPJs compartilhado entre os usuários"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.buscas = []
+
+    def buscar_falso(self, codigo):
+        self.buscas.append(codigo)
+        return CNPJS.get(codigo)
+
+    def test_busca_cada_codigo_uma_vez(self):
+        """Encontrados e não encontrados ficam no cache e não são buscados de novo"""
+        for _ in range(3):
+            self.assertEqual(buscar_com_cache('petr4', self.buscar_falso), CNPJS['PETR4'])
+            self.assertIsNone(buscar_com_cache('XPTO3', self.buscar_falso))
+        self.assertEqual(self.buscas, ['PETR4', 'XPTO3'])
+
+        entradas = {entrada.codigo: entrada for entrada in CnpjCache.query}
+        self.assertEqual(entradas['PETR4'].cnpj, CNPJS['PETR4'])
+        self.assertIsNone(entradas['XPTO3'].cnpj)
+        validade = lambda codigo: entradas[codigo].expira_em - entradas[codigo].atualizado_em
+        self.assertAlmostEqual(validade('PETR4').total_seconds(), TTL_ENCONTRADO.total_seconds(), delta=5)
+        self.assertAlmostEqual(validade('XPTO3').total_seconds(), TTL_NAO_ENCONTRADO.total_seconds(), delta=5)
+
+    def test_entradas_vencidas_sao_buscadas_de_novo(self):
+        """Após a validade, o código volta a ser buscado e a entrada é atualizada"""
+        passado = datetime.utcnow() - TTL_ENCONTRADO - timedelta(days=1)
+        gravar_cache({'PETR4': '00.000.000/0000-00', 'VALE3': None}, agora=passado)
+        self.assertEqual(consultar_cache(['PETR4', 'VALE3']), {})
+
+        self.assertEqual(buscar_com_cache('PETR4', self.buscar_falso), CNPJS['PETR4'])
+        self.assertEqual(buscar_com_cache('VALE3', self.buscar_falso), CNPJS['VALE3'])
+        self.assertEqual(self.buscas, ['PETR4', 'VALE3'])
+        self.assertEqual(consultar_cache(['PETR4', 'VALE3']), CNPJS)
+        self.assertEqual(CnpjCache.query.count(), 2)
+
+    def test_erros_nao_ficam_no_cache(self):
+        """Um erro na busca é propagado e o código é buscado na próxima vez"""
+        def falhar(codigo):
+            raise ConnectionError('sem rede')
+        with self.assertRaises(ConnectionError):
+            buscar_com_cache('PETR4', falhar)
+        self.assertEqual(CnpjCache.query.count(), 0)
+        self.assertEqual(buscar_com_cache('PETR4', self.buscar_falso), CNPJS['PETR4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, Negociacao, SaldoPrecoMedio, User
+from src.routes.relatorios import processar_relatorio
+from src.utils.cache_posicoes import CachePosicoes, cache_posicoes, obter_versao_dados, posicoes_em_cache
+from base import TesteComNegociacoes, OUTRO_USUARIO
+
+
+class TestCachePosicoes(TesteComNegociacoes):
+    """Testes para o cache do relatório de posições e a versão dos dados"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.outro = User(**OUTRO_USUARIO)
+        db.session.add(self.outro)
+        db.session.commit()
+        self.outro_hash = self.outro.hash_id
+
+        self.acao = Acao(codigo='PETR4', user_hash=self.user_hash)
+        db.session.add(self.acao)
+        db.session.commit()
+        cache_posicoes.limpar()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        cache_posicoes.limpar()
+        super().tearDown()
+
+    def versoes(self):
+        return obter_versao_dados(self.user_hash), obter_versao_dados(self.outro_hash)
+
+    def nova_negociacao(self, data=date(2024, 1, 2), quantidade=100):
+        return Negociacao(
+            data_negocio=data, tipo_movimentacao='Compra', mercado='Mercado à Vista',
+            prazo_vencimento='-', instituicao='CORRETORA XYZ', quantidade=quantidade,
+            preco=Decimal('10.00'), valor=Decimal(quantidade * 10),
+            acao_id=self.acao.id, relatorio_id=self.relatorio.id, user_hash=self.user_hash
+        )
+
+    def test_versao_incrementada_nas_alteracoes_do_usuario(self):
+        """Incluir, alterar e excluir negociações, saldos e ações incrementa só a versão do dono"""
+        versao, versao_outro = self.versoes()
+
+        negociacao = self.nova_negociacao()
+        db.session.add(negociacao)
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 1, versao_outro))
+
+        negociacao.corretagem = Decimal('4.90')
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 2, versao_outro))
+
+        saldo = SaldoPrecoMedio(data_base=date(2024, 1, 1), quantidade=10, preco_medio=Decimal('9.00'),
+                                acao_id=self.acao.id, user_hash=self.user_hash)
+        db.session.add(saldo)
+        db.session.commit()
+        db.session.delete(saldo)
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 4, versao_outro))
+
+        self.acao.cnpj = '33.000.167/0001-01'
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 5, versao_outro))
+
+        # Alteração de outro modelo não muda a versão
+        self.relatorio.nome_arquivo = 'outro.xlsx'
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 5, versao_outro))
+
+        # Alteração desfeita não muda a versão
+        db.session.add(self.nova_negociacao(quantidade=5))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.versoes(), (versao + 5, versao_outro))
+
+        # Exclusão em lote
+        Negociacao.query.filter(Negociacao.relatorio_id == self.relatorio.id).delete(synchronize_session=False)
+        db.session.commit()
+        self.assertEqual(self.versoes(), (versao + 6, versao_outro))
+
+    def test_versao_incrementada_na_importacao_em_lote(self):
+        """Os INSERTs em lote da importação também incrementam a versão"""
+        versao, versao_outro = self.versoes()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            caminho = os.path.join(tmpdir, 'negociacao.xlsx')
+            pd.DataFrame([{
+                'Data do Negócio': '02/01/2024', 'Tipo de Movimentação': 'Compra', 'Mercado': 'Mercado à Vista',
+                'Prazo/Vencimento': '-', 'Instituição': 'CORRETORA XYZ', 'Código de Negociação': codigo,
+                'Quantidade': 100, 'Preço': 10.0, 'Valor': 1000.0,
+            } for codigo in ('VALE3', 'ITSA4')]).to_excel(caminho, index=False)
+            processar_relatorio(caminho, self.relatorio.id)
+
+        versao_nova, versao_outro_nova = self.versoes()
+        self.assertGreater(versao_nova, versao)
+        self.assertEqual(versao_outro_nova, versao_outro)
+
+    def test_cache_reaproveitado_ate_alteracao(self):
+        """O relatório é recalculado apenas quando a versão dos dados muda"""
+        chamadas = []
+        def calcular():
+            chamadas.append(1)
+            return [{'codigo': 'PETR4', 'quantidade': len(chamadas)}]
+
+        primeiro = posicoes_em_cache(self.user_hash, date(2024, 12, 31), calcular)
+        self.assertIs(posicoes_em_cache(self.user_hash, date(2024, 12, 31), calcular), primeiro)
+        posicoes_em_cache(self.user_hash, date(2024, 6, 30), calcular)
+        self.assertEqual(len(chamadas), 2)
+
+        db.session.add(self.nova_negociacao())
+        db.session.commit()
+        self.assertEqual(posicoes_em_cache(self.user_hash, date(2024, 12, 31), calcular)[0]['quantidade'], 3)
+        # As entradas da versão anterior foram descartadas
+        self.assertEqual(len(cache_posicoes), 1)
+
+    def test_descarta_entradas_menos_usadas(self):
+        """Ao atingir o tamanho máximo, descarta a entrada usada há mais tempo"""
+        cache = CachePosicoes(tamanho_maximo=2)
+        cache.guardar('a', date(2024, 12, 31), 0, ['a'])
+        cache.guardar('b', date(2024, 12, 31), 0, ['b'])
+        cache.obter('a', date(2024, 12, 31), 0)
+        cache.guardar('c', date(2024, 12, 31), 0, ['c'])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.obter('a', date(2024, 12, 31), 0), ['a'])
+        self.assertIsNone(cache.obter('b', date(2024, 12, 31), 0))
+        self.assertIsNone(cache.obter('a', date(2024, 12, 31), 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
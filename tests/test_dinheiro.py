@@ -0,0 +1,85 @@
+import os
+import random
+import sys
+import unittest
+from decimal import Decimal, ROUND_HALF_UP
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.custo_medio import calcular_custo_medio
+from src.utils.dinheiro import (
+    dividir_arredondando, formatar_reais, para_centavos, preco_para_unidades, unidades_para_reais,
+    UNIDADES_POR_CENTAVO
+)
+
+
+class TestDinheiro(unittest.TestCase):
+    """Testes para a aritmética monetária em ponto fixo"""
+
+    def test_conversao_para_centavos(self):
+        """Converte Decimal, float e None para centavos inteiros"""
+        self.assertEqual(para_centavos([Decimal('10.25'), 0.1 + 0.2, None, 1234567.89]).tolist(),
+                         [1025, 30, 0, 123456789])
+
+    def test_conversao_exata_de_decimal_e_texto(self):
+        """Decimal e texto são convertidos sem passar por float"""
+        self.assertEqual(para_centavos(['1.005', Decimal('2.675'), '-0.005', 3]).tolist(), [101, 268, -1, 300])
+        self.assertEqual(para_centavos([Decimal('92233720368547.75')]).tolist(), [9223372036854775])
+        self.assertEqual(preco_para_unidades([Decimal('0.00125'), '15.02505', 1.00005]).tolist(),
+                         [13, 150251, 10001])
+
+    def test_regra_de_arredondamento_do_preco_medio(self):
+        """Arredonda para a quarta casa, com empate para cima"""
+        # 10,00 / 3 = 3,33333...
+        self.assertEqual(unidades_para_reais(self.preco_medio(1000, 3)), Decimal('3.3333'))
+        # 20,00 / 3 = 6,66666...
+        self.assertEqual(unidades_para_reais(self.preco_medio(2000, 3)), Decimal('6.6667'))
+        # 0,01 / 8 = 0,00125: empate na quarta casa
+        self.assertEqual(unidades_para_reais(self.preco_medio(1, 8)), Decimal('0.0013'))
+        self.assertEqual(unidades_para_reais(self.preco_medio(1, 16)), Decimal('0.0006'))
+        self.assertEqual(dividir_arredondando([1000 * UNIDADES_POR_CENTAVO, -1 * UNIDADES_POR_CENTAVO], 3).tolist(),
+                         [33333, -33])
+
+    def preco_medio(self, valor_investido, quantidade):
+        return dividir_arredondando(valor_investido * UNIDADES_POR_CENTAVO, quantidade)
+
+    def test_formatacao_em_reais(self):
+        """Formata no padrão brasileiro com arredondamento ROUND_HALF_UP"""
+        self.assertEqual(formatar_reais(Decimal('1234567.895')), 'R$ 1.234.567,90')
+        self.assertEqual(formatar_reais(0.125), 'R$ 0,13')
+        self.assertEqual(formatar_reais(Decimal('15.025'), 4), 'R$ 15,0250')
+        self.assertEqual(formatar_reais(None), '')
+
+    def test_kernel_com_preco_medio_inteiro(self):
+        """Com escala_preco, o kernel aplica a regra de arredondamento a cada compra e venda"""
+        aleatorio = random.Random(11)
+        for _ in range(100):
+            grupos = sorted(aleatorio.randint(0, 3) for _ in range(aleatorio.randint(1, 40)))
+            quantidades = [aleatorio.choice([1, 1, -1]) * aleatorio.randint(1, 300) for _ in grupos]
+            custos = [quantidade * aleatorio.randint(100, 5000) + aleatorio.choice([0, 490]) if quantidade > 0 else 0
+                      for quantidade in quantidades]
+
+            esperado = []
+            anterior = None
+            for grupo, quantidade, custo in zip(grupos, quantidades, custos):
+                if grupo != anterior:
+                    saldo, valor_investido, preco_medio, anterior = 0, 0, Decimal(0), grupo
+                saldo += quantidade
+                if quantidade > 0:
+                    valor_investido += custo
+                    preco_medio = (Decimal(valor_investido) / 100 / saldo).quantize(
+                        Decimal('0.0001'), rounding=ROUND_HALF_UP)
+                elif saldo <= 0:
+                    saldo, valor_investido, preco_medio = 0, 0, Decimal(0)
+                else:
+                    # A venda baixa a quantidade vendida ao preço médio, em centavos
+                    valor_investido -= int((-quantidade * preco_medio * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+                esperado.append(preco_medio)
+
+            historico = calcular_custo_medio(grupos, quantidades, custos, escala_preco=UNIDADES_POR_CENTAVO)
+            self.assertEqual([unidades_para_reais(preco) for preco in historico['preco_medio'].tolist()], esperado)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+import unittest
+
+from sqlalchemy import event
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, User
+from src.utils.enriquecimento_cnpj import enfileirar_cnpjs, enriquecer_cnpjs
+from base import TesteComBanco, OUTRO_USUARIO, USUARIO
+
+CNPJS = {'PETR4': '33.000.167/0001-01', 'VALE3': '33.592.510/0001-54'}
+
+
+def buscar_falso(codigos):
+    return {codigo: CNPJS.get(codigo, 'CNPJ não encontrado') for codigo in codigos}
+
+
+class TestEnriquecimentoCnpj(TesteComBanco):
+    """Testes para a busca de CNPJs em segundo plano"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.user = User(**USUARIO)
+        self.outro = User(**OUTRO_USUARIO)
+        db.session.add_all([self.user, self.outro])
+        db.session.commit()
+        self.user_hash = self.user.hash_id
+
+        db.session.add_all([
+            Acao(codigo='PETR4', user_hash=self.user_hash),
+            Acao(codigo='VALE3', cnpj='00.000.000/0000-00', user_hash=self.user_hash),
+            Acao(codigo='ITSA4', user_hash=self.user_hash),
+            Acao(codigo='PETR4', user_hash=self.outro.hash_id),
+        ])
+        db.session.commit()
+
+    def cnpjs(self, user_hash):
+        return dict(db.session.query(Acao.codigo, Acao.cnpj).filter(Acao.user_hash == user_hash).all())
+
+    def test_grava_encontrados_em_um_unico_update(self):
+        """Grava apenas CNPJs válidos, nas ações do usuário ainda sem CNPJ, com um UPDATE"""
+        comandos = []
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            comandos.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            encontrados = enriquecer_cnpjs(self.user_hash, ['PETR4', 'VALE3', 'ITSA4'], buscar_falso)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+
+        self.assertEqual(encontrados, CNPJS)
+        self.assertEqual(len([c for c in comandos if c.startswith('UPDATE acoes')]), 1)
+        self.assertEqual(self.cnpjs(self.user_hash), {
+            'PETR4': '33.000.167/0001-01', 'VALE3': '00.000.000/0000-00', 'ITSA4': None
+        })
+        self.assertEqual(self.cnpjs(self.outro.hash_id), {'PETR4': None})
+
+    def test_busca_em_segundo_plano_sem_repetir_codigos_na_fila(self):
+        """Enfileira a busca, ignora códigos já na fila e grava o resultado"""
+        liberar = threading.Event()
+        buscados = []
+        def buscar_lento(codigos):
+            liberar.wait(timeout=10)
+            buscados.extend(codigos)
+            return buscar_falso(codigos)
+
+        futuro = enfileirar_cnpjs(self.app, self.user_hash, ['PETR4', 'ITSA4'], buscar_lento)
+        self.assertIsNone(enfileirar_cnpjs(self.app, self.user_hash, ['PETR4'], buscar_lento))
+        liberar.set()
+
+        self.assertEqual(futuro.result(timeout=30), {'PETR4': '33.000.167/0001-01'})
+        self.assertEqual(sorted(buscados), ['ITSA4', 'PETR4'])
+        db.session.expire_all()
+        self.assertEqual(self.cnpjs(self.user_hash)['PETR4'], '33.000.167/0001-01')
+
+        # Terminada a busca, os códigos saem da fila e podem ser enfileirados de novo
+        futuro = enfileirar_cnpjs(self.app, self.user_hash, ['ITSA4'], buscar_falso)
+        self.assertIsNotNone(futuro)
+        self.assertEqual(futuro.result(timeout=30), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
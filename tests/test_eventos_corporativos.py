@@ -0,0 +1,200 @@
+import os
+import random
+import sys
+import unittest
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, ApuracaoMensal, EventoCorporativo, PosicaoMensal
+from src.utils.apuracao import atualizar_calculos, recalcular_apuracoes
+from src.utils.day_trade import classificar_day_trades
+from src.utils.eventos_corporativos import (
+    proporcoes_dos_eventos, TIPO_BONIFICACAO, TIPO_DESDOBRAMENTO, TIPO_GRUPAMENTO
+)
+from src.utils.posicao import (
+    calcular_posicoes, calcular_serie, datas_da_serie, recalcular_posicoes_mensais, FREQUENCIA_DIARIA
+)
+from base import historico_completo, TesteComNegociacoes
+
+
+class TestEventosCorporativos(TesteComNegociacoes):
+    """Testes para o ajuste de posições por desdobramentos, grupamentos e bonificações"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.petr = Acao(codigo='PETR4', user_hash=self.user_hash)
+        self.vale = Acao(codigo='VALE3', user_hash=self.user_hash)
+        db.session.add_all([self.petr, self.vale])
+        db.session.commit()
+
+    def cadastrar_evento(self, acao, data_ex, tipo, antes, depois):
+        db.session.add(EventoCorporativo(acao_id=acao.id, data_ex=data_ex, tipo=tipo, quantidade_antes=antes,
+                                         quantidade_depois=depois, user_hash=self.user_hash))
+        db.session.flush()
+
+    def posicoes(self, data_base):
+        return {
+            item['acao'].codigo: (item['quantidade'], item['valor_investido'], item['preco_medio'])
+            for item in calcular_posicoes(self.user_hash, data_base)
+        }
+
+    def recalcular(self):
+        classificar_day_trades(self.user_hash)
+        recalcular_posicoes_mensais(self.user_hash)
+        recalcular_apuracoes(self.user_hash)
+        db.session.commit()
+
+    def test_desdobramento_ajusta_posicao_e_resultado(self):
+        """A posição muda na data ex, as datas anteriores não, e a venda usa o preço médio ajustado"""
+        self.negociar(self.petr, date(2024, 1, 10), 'Compra', 100, 30)
+        self.cadastrar_evento(self.petr, date(2024, 2, 15), TIPO_DESDOBRAMENTO, 1, 2)
+        self.negociar(self.petr, date(2024, 3, 5), 'Compra', 100, 16)
+        self.negociar(self.petr, date(2024, 4, 10), 'Venda', 250, 20)
+        db.session.commit()
+
+        for partindo_das_posicoes_mensais in (False, True):
+            if partindo_das_posicoes_mensais:
+                self.recalcular()
+            self.assertEqual(self.posicoes(date(2024, 2, 14)), {'PETR4': (100, Decimal('3000.00'), Decimal('30.0000'))})
+            self.assertEqual(self.posicoes(date(2024, 2, 15)), {'PETR4': (200, Decimal('3000.00'), Decimal('15.0000'))})
+            self.assertEqual(self.posicoes(date(2024, 3, 31)), {'PETR4': (300, Decimal('4600.00'), Decimal('15.3333'))})
+            self.assertEqual(self.posicoes(date(2024, 4, 30)), {'PETR4': (50, Decimal('766.67'), Decimal('15.3333'))})
+
+        mensais = PosicaoMensal.query.filter_by(acao_id=self.petr.id).order_by(PosicaoMensal.mes).all()
+        self.assertEqual([(posicao.mes, posicao.quantidade) for posicao in mensais],
+                         [(date(2024, 1, 31), 100), (date(2024, 2, 29), 200), (date(2024, 3, 31), 300),
+                          (date(2024, 4, 30), 50)])
+        abril = ApuracaoMensal.query.filter_by(user_hash=self.user_hash).one()
+        self.assertEqual((abril.vendas_swing_trade, abril.resultado_swing_trade),
+                         (Decimal('5000.00'), Decimal('1166.67')))
+
+        historico = historico_completo(self.user_hash, date(2024, 4, 30))
+        self.assertEqual(historico['tipo_movimentacao'].tolist(), ['Compra', TIPO_DESDOBRAMENTO, 'Compra', 'Venda'])
+        self.assertEqual(historico['saldo'].tolist(), [100, 200, 300, 50])
+
+    def test_grupamento_e_bonificacao_com_fracoes(self):
+        """Os eventos se aplicam em sequência e as frações de ação não aparecem na quantidade"""
+        self.negociar(self.vale, date(2024, 1, 5), 'Compra', 105, 2)
+        self.cadastrar_evento(self.vale, date(2024, 3, 1), TIPO_BONIFICACAO, 10, 11)
+        self.cadastrar_evento(self.vale, date(2024, 2, 1), TIPO_GRUPAMENTO, 10, 1)
+        db.session.commit()
+
+        self.assertEqual(self.posicoes(date(2024, 1, 31)), {'VALE3': (105, Decimal('210.00'), Decimal('2.0000'))})
+        # A meia ação descartada no grupamento sai do valor investido pelo preço médio
+        self.assertEqual(self.posicoes(date(2024, 2, 1)), {'VALE3': (10, Decimal('200.00'), Decimal('20.0000'))})
+        self.assertEqual(self.posicoes(date(2024, 3, 1)), {'VALE3': (11, Decimal('200.00'), Decimal('18.1818'))})
+
+        # A série, numa única passada, coincide com o cálculo em cada data
+        datas = datas_da_serie(self.user_hash, date(2024, 1, 30), date(2024, 3, 2), FREQUENCIA_DIARIA)
+        serie = calcular_serie(self.user_hash, datas)
+        for data_base in datas:
+            do_dia = serie[serie['data'] == data_base]
+            quantidade, _, preco_medio = self.posicoes(data_base)['VALE3']
+            self.assertEqual(do_dia['quantidade'].tolist(), [quantidade])
+            self.assertEqual(do_dia['preco_medio'].tolist(), [preco_medio])
+
+    def test_inclusao_de_evento_atualiza_calculos(self):
+        """Incluir um evento recalcula posições mensais e apurações como o recálculo completo"""
+        self.negociar(self.petr, date(2024, 1, 10), 'Compra', 100, 30)
+        self.negociar(self.petr, date(2024, 5, 10), 'Venda', 150, 18)
+        self.negociar(self.vale, date(2024, 1, 10), 'Compra', 100, 60)
+        db.session.commit()
+        self.recalcular()
+
+        self.cadastrar_evento(self.petr, date(2024, 3, 4), TIPO_DESDOBRAMENTO, 1, 2)
+        atualizar_calculos(self.user_hash, {self.petr.id: date(2024, 3, 4)})
+        db.session.commit()
+        incrementais = sorted((posicao.acao_id, posicao.mes, posicao.quantidade, posicao.preco_medio)
+                              for posicao in PosicaoMensal.query)
+        maio = ApuracaoMensal.query.filter_by(user_hash=self.user_hash).one()
+        self.assertEqual(maio.resultado_swing_trade, Decimal('450.00'))
+
+        self.recalcular()
+        self.assertEqual(incrementais, sorted((posicao.acao_id, posicao.mes, posicao.quantidade, posicao.preco_medio)
+                                              for posicao in PosicaoMensal.query))
+        self.assertEqual(self.posicoes(date(2024, 5, 31)), {
+            'PETR4': (50, Decimal('750.00'), Decimal('15.0000')),
+            'VALE3': (100, Decimal('6000.00'), Decimal('60.0000')),
+        })
+
+    def test_posicoes_mensais_iguais_ao_historico_completo(self):
+        """Partindo das posições mensais, o resultado é idêntico ao de percorrer todo o histórico"""
+        aleatorio = random.Random(11)
+        acoes = [Acao(codigo=f'ACAO{indice:02d}', user_hash=self.user_hash) for indice in range(6)]
+        db.session.add_all(acoes)
+        db.session.flush()
+        inicio = date(2023, 1, 2)
+        for acao in acoes:
+            for _ in range(40):
+                self.negociar(acao, inicio + timedelta(days=aleatorio.randint(0, 365)),
+                              aleatorio.choice(['Compra', 'Compra', 'Venda']), aleatorio.randint(1, 300),
+                              round(aleatorio.uniform(1, 100), 2))
+            datas_ex = sorted({inicio + timedelta(days=aleatorio.randint(0, 365)) for _ in range(3)})
+            for data_ex in datas_ex:
+                tipo, antes, depois = aleatorio.choice([(TIPO_DESDOBRAMENTO, 1, 3), (TIPO_GRUPAMENTO, 4, 1),
+                                                        (TIPO_BONIFICACAO, 10, 11)])
+                self.cadastrar_evento(acao, data_ex, tipo, antes, depois)
+        db.session.commit()
+        self.recalcular()
+
+        historico = historico_completo(self.user_hash, date(2024, 1, 31))
+        historico['data'] = historico['data'].astype('datetime64[ns]')
+        for data_base in [date(2023, mes, dia) for mes in range(1, 13) for dia in (1, 15, 28)]:
+            ate_a_data = historico[historico['data'] <= str(data_base)].drop_duplicates('codigo', keep='last')
+            esperado = {
+                codigo: (saldo, preco_medio)
+                for codigo, saldo, preco_medio in zip(ate_a_data['codigo'], ate_a_data['saldo'], ate_a_data['preco_medio'])
+                if saldo > 0
+            }
+            self.assertEqual({codigo: (quantidade, preco_medio)
+                              for codigo, (quantidade, _, preco_medio) in self.posicoes(data_base).items()},
+                             esperado, f'Posições diferentes em {data_base}')
+
+    def test_muitos_eventos_na_mesma_acao(self):
+        """Cada evento ajusta apenas o saldo da sua data, sem limite de eventos por ação"""
+        self.negociar(self.petr, date(2021, 12, 1), 'Compra', 1000, 10)
+        for indice in range(30):
+            self.cadastrar_evento(self.petr, date(2022 + indice // 12, indice % 12 + 1, 1), TIPO_BONIFICACAO, 10, 11)
+        db.session.commit()
+
+        saldo = 1000
+        for indice in range(30):
+            saldo = saldo * 11 // 10
+        esperado = {'PETR4': (saldo, Decimal('9976.85'), Decimal('0.5732'))}
+        self.assertEqual(saldo, 17409)
+        self.assertEqual(self.posicoes(date(2024, 12, 31)), esperado)
+        self.recalcular()
+        self.assertEqual(self.posicoes(date(2024, 12, 31)), esperado)
+
+    def test_fracoes_descartadas_a_cada_evento(self):
+        """As frações são descartadas evento a evento, e não uma vez pelo fator acumulado"""
+        self.negociar(self.petr, date(2024, 1, 5), 'Compra', 5, 10)
+        self.cadastrar_evento(self.petr, date(2024, 2, 1), TIPO_BONIFICACAO, 10, 11)
+        self.cadastrar_evento(self.petr, date(2024, 3, 1), TIPO_BONIFICACAO, 10, 11)
+        db.session.commit()
+
+        # Com o fator acumulado (121/100), seriam 6 ações; a meia ação descartada em cada
+        # evento sai do valor investido pelo preço médio
+        self.assertEqual(5 * 121 // 100, 6)
+        self.assertEqual(self.posicoes(date(2024, 3, 31)), {'PETR4': (5, Decimal('41.32'), Decimal('8.2645'))})
+
+    def test_proporcoes_dos_eventos(self):
+        """A proporção de cada evento é a fração irredutível quantidade_depois / quantidade_antes"""
+        eventos = [
+            (1, date(2024, 2, 1), TIPO_GRUPAMENTO, 10, 1),
+            (1, date(2024, 3, 1), TIPO_BONIFICACAO, 100, 110),
+            (3, date(2024, 2, 1), TIPO_DESDOBRAMENTO, 2, 4),
+        ]
+        Evento = namedtuple('Evento', 'acao_id data_ex tipo quantidade_antes quantidade_depois')
+        numeradores, denominadores = proporcoes_dos_eventos([Evento(*evento) for evento in eventos])
+        self.assertEqual(numeradores.tolist(), [1, 11, 2])
+        self.assertEqual(denominadores.tolist(), [10, 10, 1])
+
+if __name__ == '__main__':
+    unittest.main()
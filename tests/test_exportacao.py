@@ -0,0 +1,93 @@
+import csv
+import io
+import os
+import sys
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from openpyxl import load_workbook
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, User
+from src.utils import exportacao
+from src.utils.exportacao import (
+    consultar_negociacoes, exportar, gerar_csv, gerar_xlsx, COLUNAS_NEGOCIACOES, FORMATO_REAIS
+)
+from base import TesteComNegociacoes, OUTRO_USUARIO
+
+
+class TestExportacao(TesteComNegociacoes):
+    """Testes para a exportação de relatórios em CSV e XLSX"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        outro = User(**OUTRO_USUARIO)
+        db.session.add(outro)
+        db.session.commit()
+
+        self.petr = Acao(codigo='PETR4', user_hash=self.user_hash)
+        self.outra = Acao(codigo='VALE3', user_hash=outro.hash_id)
+        db.session.add_all([self.petr, self.outra])
+        db.session.commit()
+
+    def test_negociacoes_em_lotes(self):
+        """A consulta percorre todos os lotes, em ordem cronológica, apenas com as negociações do usuário"""
+        inicio = date(2024, 1, 1)
+        for indice in range(25):
+            self.negociar(self.petr, inicio + timedelta(days=24 - indice), 'Compra', indice + 1, 10,
+                          corretagem=Decimal('4.90') if indice % 2 else None)
+        self.negociar(self.outra, inicio, 'Compra', 5, 50)
+        db.session.commit()
+
+        with patch.object(exportacao, 'LOTE_EXPORTACAO', 4):
+            linhas = list(consultar_negociacoes(self.user_hash))
+        self.assertEqual(len(linhas), 25)
+        self.assertTrue(all(len(linha) == len(COLUNAS_NEGOCIACOES) for linha in linhas))
+        self.assertEqual([linha[0] for linha in linhas], [inicio + timedelta(days=dia) for dia in range(25)])
+        self.assertEqual(set(linha[1] for linha in linhas), {'PETR4'})
+        self.assertEqual(len(list(consultar_negociacoes(self.user_hash, sem_corretagem=True))), 13)
+
+    def test_csv_em_blocos(self):
+        """O CSV é enviado em vários blocos que, juntos, formam o arquivo completo"""
+        colunas = [('Data', None), ('Valor', FORMATO_REAIS)]
+        linhas = [(date(2024, 1, 1) + timedelta(days=dia), Decimal(dia) / 100) for dia in range(500)]
+        with patch.object(exportacao, 'TAMANHO_BLOCO', 1024):
+            blocos = list(gerar_csv(colunas, iter(linhas)))
+        self.assertGreater(len(blocos), 1)
+        lido = list(csv.reader(io.StringIO(''.join(blocos))))
+        self.assertEqual(lido[0], ['Data', 'Valor'])
+        self.assertEqual(lido[1:], [[data.isoformat(), str(valor)] for data, valor in linhas])
+
+    def test_xlsx(self):
+        """O XLSX tem o cabeçalho, os valores e os formatos numéricos das colunas"""
+        colunas = [('Código', None), ('Quantidade', None), ('Valor', FORMATO_REAIS)]
+        linhas = [('PETR4', 100, Decimal('3000.50')), ('VALE3', 7, None)]
+        arquivo = io.BytesIO(b''.join(gerar_xlsx('Posição', colunas, iter(linhas))))
+
+        aba = load_workbook(arquivo)['Posição']
+        self.assertEqual([list(linha) for linha in aba.iter_rows(values_only=True)],
+                         [['Código', 'Quantidade', 'Valor'], ['PETR4', 100, 3000.5], ['VALE3', 7, None]])
+        self.assertEqual(aba['C2'].number_format, FORMATO_REAIS)
+
+    def test_resposta(self):
+        """A resposta é enviada em streaming como anexo, com o tipo do formato"""
+        self.negociar(self.petr, date(2024, 1, 2), 'Compra', 10, 20)
+        db.session.commit()
+        with self.app.test_request_context():
+            response = exportar('csv', 'negociacoes', 'Negociações', COLUNAS_NEGOCIACOES,
+                                consultar_negociacoes(self.user_hash))
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, 'text/csv')
+            self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=negociacoes.csv')
+            conteudo = response.get_data(as_text=True)
+        self.assertEqual(conteudo.splitlines()[1], '2024-01-02,PETR4,Compra,Mercado à Vista,CORRETORA XYZ,10,0,20.00,200.00,')
+
+
+if __name__ == '__main__':
+    unittest.main()
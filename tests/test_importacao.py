@@ -0,0 +1,518 @@
+import importlib.util
+import io
+import os
+import re
+import sys
+import tempfile
+import unittest
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy import event
+from werkzeug.datastructures import FileStorage
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, ImportacaoJob, Negociacao, PosicaoMensal, Relatorio, User
+from src.routes import relatorios
+from src.routes.relatorios import processar_relatorio, processar_lote, simular_relatorio, _extrair_arquivos
+from src.utils.chave_natural import CAMPOS_CHAVE_NATURAL, gerar_chave_natural
+from src.utils.importacao import carregar_mapa_acoes, criar_acoes_faltantes, linhas_invalidas, normalizar_negociacoes
+from src.utils.leitores import ler_xlsx_em_lotes
+from src.utils.importacao_jobs import criar_job, enfileirar_importacao, executar_importacao, recuperar_jobs_abandonados
+from src.utils.armazenamento import salvar_upload, abrir_arquivo, copiar_para_temporario
+from src.utils.posicao import calcular_posicoes
+from benchmarks.gerador import gerar_negociacoes, gerar_relatorio
+from base import TesteComBanco, TesteComRotas, USUARIO
+
+
+def linha_b3(data, codigo, tipo='Compra', quantidade=100, preco=10.0, instituicao='CORRETORA XYZ'):
+    return {
+        'Data do Negócio': data,
+        'Tipo de Movimentação': tipo,
+        'Mercado': 'Mercado à Vista',
+        'Prazo/Vencimento': '-',
+        'Instituição': instituicao,
+        'Código de Negociação': codigo,
+        'Quantidade': quantidade,
+        'Preço': preco,
+        'Valor': quantidade * preco,
+    }
+
+
+class TestImportacao(TesteComBanco):
+    """Testes para a importação em lote de relatórios da B3"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.user = User(**USUARIO)
+        db.session.add(self.user)
+        db.session.commit()
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def criar_relatorio(self, linhas, nome='negociacao.xlsx', job=None):
+        caminho = os.path.join(self.tmpdir.name, nome)
+        pd.DataFrame(linhas).to_excel(caminho, index=False)
+
+        relatorio = Relatorio(nome_arquivo=nome, user_hash=self.user.hash_id,
+                              importacao_job_id=job.id if job else None)
+        db.session.add(relatorio)
+        db.session.commit()
+        return caminho, relatorio
+
+    def test_importa_negociacoes_e_cria_acoes(self):
+        """Importa as linhas, cria as ações e remove o sufixo F do fracionário"""
+        caminho, relatorio = self.criar_relatorio([
+            linha_b3('02/01/2024', 'PETR4'),
+            linha_b3('03/01/2024', 'PETR4F', quantidade=7),
+            linha_b3('04/01/2024', 'VALE3', tipo='Venda', preco=60.5),
+        ])
+
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (3, 0))
+
+        codigos = sorted(a.codigo for a in Acao.query.filter_by(user_hash=self.user.hash_id))
+        self.assertEqual(codigos, ['PETR4', 'VALE3'])
+
+        negociacao = Negociacao.query.filter_by(quantidade=7).one()
+        self.assertEqual(negociacao.data_negocio, date(2024, 1, 3))
+        self.assertEqual(negociacao.acao.codigo, 'PETR4')
+        self.assertEqual(negociacao.relatorio_id, relatorio.id)
+
+    def test_ignora_duplicadas_no_arquivo_e_no_banco(self):
+        """Linhas repetidas no arquivo ou já importadas são contadas como ignoradas"""
+        linhas = [linha_b3('02/01/2024', 'PETR4'), linha_b3('02/01/2024', 'PETR4')]
+        caminho, relatorio = self.criar_relatorio(linhas)
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (1, 1))
+
+        caminho, relatorio = self.criar_relatorio(linhas + [linha_b3('05/01/2024', 'ITSA4')], 'outro.xlsx')
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (1, 2))
+        self.assertEqual(Negociacao.query.count(), 2)
+
+    def test_importacao_atualiza_posicoes_mensais(self):
+        """Cada importação recalcula as posições mensais a partir da menor data importada"""
+        caminho, relatorio = self.criar_relatorio([
+            linha_b3('10/03/2024', 'PETR4', quantidade=100, preco=30.0),
+            linha_b3('15/04/2024', 'PETR4', tipo='Venda', quantidade=40, preco=35.0),
+        ])
+        processar_relatorio(caminho, relatorio.id)
+        meses = [(p.mes, p.quantidade) for p in PosicaoMensal.query.order_by(PosicaoMensal.mes)]
+        self.assertEqual(meses, [(date(2024, 3, 31), 100), (date(2024, 4, 30), 60)])
+
+        # Negociação anterior importada depois altera as posições seguintes
+        caminho, relatorio = self.criar_relatorio([
+            linha_b3('05/02/2024', 'PETR4', quantidade=100, preco=10.0),
+        ], 'anterior.xlsx')
+        processar_relatorio(caminho, relatorio.id)
+        posicoes = PosicaoMensal.query.order_by(PosicaoMensal.mes).all()
+        self.assertEqual([(p.mes, p.quantidade) for p in posicoes],
+                         [(date(2024, 2, 29), 100), (date(2024, 3, 31), 200), (date(2024, 4, 30), 160)])
+        self.assertEqual(posicoes[-1].preco_medio, Decimal('20.0000'))
+
+        posicao, = calcular_posicoes(self.user.hash_id, date(2024, 5, 2))
+        self.assertEqual((posicao['quantidade'], round(posicao['preco_medio'], 2)), (160, 20.0))
+
+    def test_linha_invalida_nao_grava_nada(self):
+        """Uma linha inválida aborta a importação sem gravar negociações"""
+        caminho, relatorio = self.criar_relatorio([
+            linha_b3('02/01/2024', 'PETR4'),
+            linha_b3('data inválida', 'VALE3'),
+        ])
+
+        with self.assertRaises(ValueError):
+            processar_relatorio(caminho, relatorio.id)
+        self.assertEqual(Negociacao.query.count(), 0)
+
+    def test_leitura_em_lotes(self):
+        """O leitor entrega lotes de tamanho fixo preservando a posição das linhas"""
+        linhas = [linha_b3(f'0{dia}/01/2024', 'PETR4') for dia in range(1, 6)]
+        caminho, _ = self.criar_relatorio(linhas)
+
+        lotes = list(ler_xlsx_em_lotes(caminho, tamanho_lote=2))
+
+        self.assertEqual([len(lote) for lote in lotes], [2, 2, 1])
+        self.assertEqual(list(lotes[-1].index), [4])
+        self.assertEqual(lotes[-1]['data_negocio'].iloc[0], date(2024, 1, 5))
+
+    def test_job_de_importacao_registra_progresso(self):
+        """O job executado em segundo plano grava o progresso e o resultado"""
+        job = criar_job(self.user.hash_id)
+        caminho, relatorio = self.criar_relatorio(
+            [linha_b3('02/01/2024', 'PETR4'), linha_b3('02/01/2024', 'PETR4')], job=job
+        )
+
+        futuro = enfileirar_importacao(self.app, job.id, processar_relatorio, caminho, relatorio.id)
+        futuro.result(timeout=30)
+
+        job = db.session.get(ImportacaoJob, job.id)
+        db.session.refresh(job)
+        self.assertEqual(job.status, ImportacaoJob.STATUS_CONCLUIDO)
+        self.assertEqual(job.linhas_lidas, 2)
+        self.assertEqual((job.negociacoes_processadas, job.negociacoes_ignoradas), (1, 1))
+
+    def test_job_com_erro_remove_relatorio(self):
+        """Se a importação falhar, o relatório do job e suas negociações são removidos"""
+        job = criar_job(self.user.hash_id)
+        caminho, relatorio = self.criar_relatorio(
+            [linha_b3('02/01/2024', 'PETR4'), linha_b3('data inválida', 'VALE3')], job=job
+        )
+
+        executar_importacao(job.id, processar_relatorio, caminho, relatorio.id)
+
+        job = db.session.get(ImportacaoJob, job.id)
+        self.assertEqual(job.status, ImportacaoJob.STATUS_ERRO)
+        self.assertIn('inválidos', job.mensagem)
+        self.assertEqual(Relatorio.query.count(), 0)
+        self.assertEqual(Negociacao.query.count(), 0)
+
+    def test_progresso_nao_confirma_a_importacao(self):
+        """O progresso não confirma os lotes já gravados: uma falha posterior desfaz toda a importação"""
+        job = criar_job(self.user.hash_id)
+        db.session.commit()
+
+        def tarefa(progresso):
+            db.session.add(Acao(codigo='PETR4', user_hash=self.user.hash_id))
+            db.session.flush()
+            progresso(1, 1, 0)
+            raise ValueError('falha no segundo lote')
+
+        executar_importacao(job.id, tarefa)
+
+        self.assertEqual(db.session.get(ImportacaoJob, job.id).status, ImportacaoJob.STATUS_ERRO)
+        self.assertEqual(Acao.query.count(), 0)
+
+    def test_recupera_jobs_abandonados(self):
+        """Jobs parados há mais que o limite viram erro e seus relatórios são removidos"""
+        antigo = criar_job(self.user.hash_id)
+        antigo.status = ImportacaoJob.STATUS_PROCESSANDO
+        recente = criar_job(self.user.hash_id)
+        db.session.commit()
+        _, relatorio = self.criar_relatorio([linha_b3('02/01/2024', 'PETR4')], job=antigo)
+        relatorio.sha256 = 'a' * 64
+        db.session.execute(db.update(ImportacaoJob).where(ImportacaoJob.id == antigo.id).values(
+            updated_at=datetime.utcnow() - timedelta(hours=2)
+        ))
+        db.session.commit()
+
+        self.assertEqual([job.id for job in recuperar_jobs_abandonados(self.user.hash_id)], [antigo.id])
+
+        self.assertEqual(db.session.get(ImportacaoJob, antigo.id).status, ImportacaoJob.STATUS_ERRO)
+        self.assertEqual(db.session.get(ImportacaoJob, recente.id).status, ImportacaoJob.STATUS_PENDENTE)
+        self.assertIsNone(Relatorio.query.filter_by(sha256='a' * 64).first())
+        self.assertEqual(recuperar_jobs_abandonados(self.user.hash_id), [])
+
+    def test_upload_armazenado_por_conteudo(self):
+        """Envios idênticos geram o mesmo arquivo comprimido e podem ser processados"""
+        caminho, relatorio = self.criar_relatorio([linha_b3('02/01/2024', 'PETR4')])
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+
+        pasta = os.path.join(self.tmpdir.name, 'uploads')
+        digest, armazenado = salvar_upload(io.BytesIO(conteudo), pasta)
+        self.assertEqual(salvar_upload(io.BytesIO(conteudo), pasta), (digest, armazenado))
+        self.assertTrue(armazenado.endswith(f'{digest}.gz'))
+        self.assertEqual(len(os.listdir(os.path.dirname(armazenado))), 1)
+
+        with abrir_arquivo(armazenado) as arquivo:
+            self.assertEqual(arquivo.read(), conteudo)
+
+        self.assertEqual(processar_relatorio(armazenado, relatorio.id), (1, 0))
+
+    def test_chave_natural_igual_para_orm_e_importacao(self):
+        """Negociações gravadas pelo ORM recebem a mesma chave natural calculada na importação"""
+        caminho, relatorio = self.criar_relatorio([linha_b3('02/01/2024', 'PETR4', preco=10.5)])
+        acao = Acao(codigo='PETR4', user_hash=self.user.hash_id)
+        db.session.add(acao)
+        db.session.flush()
+        db.session.add(Negociacao(
+            data_negocio=date(2024, 1, 2), tipo_movimentacao='Compra', mercado='Mercado à Vista',
+            prazo_vencimento='-', instituicao='CORRETORA XYZ', quantidade=100, preco=10.5,
+            valor=1050, acao_id=acao.id, relatorio_id=relatorio.id, user_hash=self.user.hash_id
+        ))
+        db.session.commit()
+
+        self.assertEqual(len(Negociacao.query.one().chave_natural), 32)
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (0, 1))
+
+    def test_chave_natural_congelada_nas_migracoes(self):
+        """As cópias da chave natural nas migrações coincidem com a da aplicação"""
+        campos = dict(user_hash='a' * 64, data_negocio=date(2024, 1, 2), tipo_movimentacao='Compra',
+                      mercado='Mercado à Vista', instituicao='CORRETORA XYZ', acao_id=7, quantidade=100,
+                      preco=Decimal('10.50'), valor=1050.0)
+        pasta = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '_migrations', 'versions')
+        for nome in ('e27d5a9c4f18_adicionar_chave_natural_em_negociacoes.py',
+                     'b7e3c5a91d04_adicionar_restricao_unica_em_acoes.py'):
+            especificacao = importlib.util.spec_from_file_location(nome[:-3], os.path.join(pasta, nome))
+            migracao = importlib.util.module_from_spec(especificacao)
+            especificacao.loader.exec_module(migracao)
+            self.assertEqual(migracao.CAMPOS_CHAVE_NATURAL, CAMPOS_CHAVE_NATURAL)
+            self.assertEqual(migracao.gerar_chave_natural(**campos), gerar_chave_natural(**campos))
+
+    def test_lote_deduplica_entre_arquivos(self):
+        """Vários arquivos são lidos em paralelo e as repetições entre eles ficam no primeiro arquivo"""
+        caminho1, relatorio1 = self.criar_relatorio(
+            [linha_b3('02/01/2023', 'PETR4'), linha_b3('03/01/2023', 'VALE3')], '2023.xlsx'
+        )
+        caminho2, relatorio2 = self.criar_relatorio(
+            [linha_b3('03/01/2023', 'VALE3'), linha_b3('02/01/2024', 'ITSA4')], '2024.xlsx'
+        )
+        caminho3, relatorio3 = self.criar_relatorio(
+            [linha_b3('02/01/2024', 'ITSA4'), linha_b3('02/01/2025', 'BBAS3')], '2025.xlsx'
+        )
+
+        with patch.dict(os.environ, {'IMPORTACAO_PROCESSOS': '2'}):
+            resultado = processar_lote([
+                (caminho1, relatorio1.id), (caminho2, relatorio2.id), (caminho3, relatorio3.id)
+            ])
+
+        self.assertEqual(resultado, (4, 2))
+        self.assertEqual(Negociacao.query.filter_by(relatorio_id=relatorio1.id).count(), 2)
+        self.assertEqual(Negociacao.query.filter_by(relatorio_id=relatorio2.id).count(), 1)
+        self.assertEqual(Negociacao.query.filter_by(relatorio_id=relatorio3.id).count(), 1)
+
+    def test_lote_de_arquivo_posterior_gravado_antes(self):
+        """Se o lote de um arquivo posterior chega antes, a negociação repetida passa para o primeiro arquivo"""
+        caminho1, relatorio1 = self.criar_relatorio([linha_b3('02/01/2023', 'PETR4')], '2023.xlsx')
+        caminho2, relatorio2 = self.criar_relatorio(
+            [linha_b3('02/01/2023', 'PETR4'), linha_b3('02/01/2024', 'PETR4')], '2024.xlsx'
+        )
+
+        def ler_ao_contrario(caminhos):
+            for indice in reversed(range(len(caminhos))):
+                yield indice, next(ler_xlsx_em_lotes(caminhos[indice]))
+
+        with patch.object(relatorios, 'ler_arquivos_em_paralelo', ler_ao_contrario):
+            self.assertEqual(processar_lote([(caminho1, relatorio1.id), (caminho2, relatorio2.id)]), (2, 1))
+
+        self.assertEqual(
+            sorted((n.relatorio_id, n.data_negocio) for n in Negociacao.query),
+            [(relatorio1.id, date(2023, 1, 2)), (relatorio2.id, date(2024, 1, 2))]
+        )
+
+    def test_erro_de_leitura_em_paralelo(self):
+        """O erro de leitura de um dos arquivos interrompe o lote sem gravar nada"""
+        caminho1, relatorio1 = self.criar_relatorio([linha_b3('02/01/2023', 'PETR4')], '2023.xlsx')
+        caminho2 = os.path.join(self.tmpdir.name, 'incompleto.csv')
+        with open(caminho2, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('Data do Negócio;Quantidade\n02/01/2024;100\n')
+        relatorio2 = Relatorio(nome_arquivo='incompleto.csv', user_hash=self.user.hash_id)
+        db.session.add(relatorio2)
+        db.session.commit()
+
+        with self.assertRaisesRegex(ValueError, 'Colunas ausentes'):
+            processar_lote([(caminho1, relatorio1.id), (caminho2, relatorio2.id)])
+        self.assertEqual(Negociacao.query.count(), 0)
+
+    def test_extrai_arquivos_do_zip(self):
+        """Arquivos ZIP são expandidos em um arquivo por relatório"""
+        pacote = io.BytesIO()
+        with zipfile.ZipFile(pacote, 'w') as zip_:
+            zip_.writestr('relatorios/2023.xlsx', b'a')
+            zip_.writestr('__MACOSX/relatorios/._2023.xlsx', b'x')
+            zip_.writestr('2024.xlsx', b'b')
+        pacote.seek(0)
+
+        recebidos = [
+            FileStorage(stream=pacote, filename='relatorios.zip'),
+            FileStorage(stream=io.BytesIO(b'c'), filename='2025.xlsx'),
+        ]
+        arquivos = [(nome, stream.read()) for nome, stream in _extrair_arquivos(recebidos)]
+
+        self.assertEqual(arquivos, [('2023.xlsx', b'a'), ('2024.xlsx', b'b'), ('2025.xlsx', b'c')])
+
+    def test_limites_do_zip(self):
+        """ZIPs com arquivos demais ou grandes demais são recusados antes da extração"""
+        def zip_com(arquivos):
+            pacote = io.BytesIO()
+            with zipfile.ZipFile(pacote, 'w', compression=zipfile.ZIP_DEFLATED) as zip_:
+                for nome, conteudo in arquivos:
+                    zip_.writestr(nome, conteudo)
+            pacote.seek(0)
+            return [FileStorage(stream=pacote, filename='relatorios.zip')]
+
+        muitos = zip_com([(f'{indice}.xlsx', b'a') for indice in range(relatorios.MAXIMO_ARQUIVOS_ZIP + 1)])
+        with self.assertRaisesRegex(ValueError, 'arquivos'):
+            next(_extrair_arquivos(muitos))
+
+        grande = zip_com([('pequeno.xlsx', b'a'), ('grande.xlsx', b'0' * (relatorios.TAMANHO_MAXIMO_ARQUIVO_ZIP + 1))])
+        with self.assertRaisesRegex(ValueError, 'grande.xlsx'):
+            next(_extrair_arquivos(grande))
+
+    def test_importa_csv_no_formato_brasileiro(self):
+        """CSV com separador ';', números no formato brasileiro e codificação latin-1"""
+        caminho = os.path.join(self.tmpdir.name, 'negociacao.csv')
+        with open(caminho, 'w', encoding='latin-1') as arquivo:
+            arquivo.write('Data do Negócio;Tipo de Movimentação;Mercado;Prazo/Vencimento;Instituição;'
+                          'Código de Negociação;Quantidade;Preço;Valor\n')
+            arquivo.write('02/01/2024;Compra;Mercado à Vista;-;CORRETORA XYZ;PETR4;1.000;R$ 10,50;R$ 10.500,00\n')
+            arquivo.write('03/01/2024;Venda;Mercado à Vista;-;CORRETORA XYZ;PETR4F;5;11,00;55,00\n')
+        relatorio = Relatorio(nome_arquivo='negociacao.csv', user_hash=self.user.hash_id)
+        db.session.add(relatorio)
+        db.session.commit()
+
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (2, 0))
+        compra = Negociacao.query.filter_by(tipo_movimentacao='Compra').one()
+        self.assertEqual((compra.quantidade, compra.preco, compra.valor), (1000, Decimal('10.50'), Decimal('10500.00')))
+
+    def test_valores_monetarios_sem_float(self):
+        """Preço e valor viram Decimal de duas casas, de texto ou de número, sem erro binário"""
+        normalizado = normalizar_negociacoes(pd.DataFrame([
+            linha_b3('02/01/2024', 'PETR4', quantidade=3, preco=0.1 + 0.2),
+            {**linha_b3('02/01/2024', 'VALE3'), 'Preço': 'R$ 1.234,565', 'Valor': 'sem valor'},
+        ]))
+
+        self.assertEqual(normalizado['preco'].tolist(), [Decimal('0.30'), Decimal('1234.57')])
+        self.assertEqual(normalizado['valor'].tolist()[0], Decimal('0.90'))
+        self.assertEqual(linhas_invalidas(normalizado).tolist(), [False, True])
+
+    def test_importa_parquet(self):
+        """Parquet com as colunas do relatório da B3 segue o mesmo fluxo de importação"""
+        linhas = [linha_b3('02/01/2024', 'PETR4'), linha_b3('03/01/2024', 'VALE3', tipo='Venda')]
+        caminho = os.path.join(self.tmpdir.name, 'negociacao.parquet')
+        df = pd.DataFrame(linhas).assign(Observacao='coluna ignorada')
+        df['Data do Negócio'] = pd.to_datetime(df['Data do Negócio'], format='%d/%m/%Y')
+        df.to_parquet(caminho, index=False)
+        relatorio = Relatorio(nome_arquivo='negociacao.parquet', user_hash=self.user.hash_id)
+        db.session.add(relatorio)
+        db.session.commit()
+
+        self.assertEqual(processar_relatorio(caminho, relatorio.id), (2, 0))
+
+    def test_acoes_resolvidas_em_lote(self):
+        """O mapa de ações é carregado uma vez e as ações novas são criadas em um único INSERT"""
+        db.session.add(Acao(codigo='PETR4', user_hash=self.user.hash_id))
+        db.session.commit()
+        linhas = [linha_b3(f'{dia:02d}/01/2024', codigo) for dia in range(1, 21) for codigo in ('PETR4', 'VALE3', 'ITSA4')]
+        caminho, relatorio = self.criar_relatorio(linhas)
+
+        comandos = []
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            # Apenas os comandos da resolução de códigos (a atualização das posições mensais também lê acoes)
+            if re.search(r'\bacoes\b', statement) and 'posicoes_mensais' not in statement:
+                comandos.append(statement.split()[0])
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            self.assertEqual(processar_relatorio(caminho, relatorio.id), (60, 0))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+
+        self.assertEqual(comandos.count('INSERT'), 1)
+        self.assertEqual(comandos.count('SELECT'), 2)
+        self.assertEqual(Acao.query.count(), 3)
+
+    def test_acao_criada_por_outra_importacao(self):
+        """Um código criado por uma importação simultânea, ausente do mapa, não é duplicado"""
+        mapa_acoes = carregar_mapa_acoes(self.user.hash_id)
+        db.session.add(Acao(codigo='PETR4', user_hash=self.user.hash_id))
+        db.session.commit()
+
+        criar_acoes_faltantes(mapa_acoes, ['PETR4', 'VALE3'], self.user.hash_id)
+        db.session.commit()
+        self.assertEqual(Acao.query.filter_by(codigo='PETR4').count(), 1)
+        self.assertEqual(mapa_acoes, dict(db.session.query(Acao.codigo, Acao.id)))
+
+    def test_relatorio_sintetico_do_benchmark(self):
+        """Relatórios do gerador do benchmark são importados e as duplicadas ignoradas"""
+        for nome in ('sintetico.xlsx', 'sintetico.csv'):
+            with self.subTest(nome=nome):
+                caminho = gerar_relatorio(os.path.join(self.tmpdir.name, nome), 400, proporcao_duplicadas=0.25)
+                relatorio = Relatorio(nome_arquivo=nome, user_hash=self.user.hash_id)
+                db.session.add(relatorio)
+                db.session.commit()
+
+                unicas = len(gerar_negociacoes(400, proporcao_duplicadas=0.25).drop_duplicates())
+                processadas, ignoradas = processar_relatorio(caminho, relatorio.id)
+                self.assertEqual(processadas + ignoradas, 400)
+                self.assertEqual(Negociacao.query.count(), unicas)
+
+    def test_simulacao_nao_grava_e_conta_por_acao(self):
+        """A simulação classifica as linhas em novas, duplicadas e inválidas sem gravar nada"""
+        caminho, relatorio = self.criar_relatorio([
+            linha_b3('02/01/2024', 'PETR4'),
+            linha_b3('03/01/2024', 'PETR4', tipo='Venda', quantidade=50),
+        ], nome='anterior.xlsx')
+        processar_relatorio(caminho, relatorio.id)
+
+        caminho = os.path.join(self.tmpdir.name, 'simulado.xlsx')
+        pd.DataFrame([
+            linha_b3('02/01/2024', 'PETR4'),
+            linha_b3('03/01/2024', 'PETR4', tipo='Venda', quantidade=50),
+            linha_b3('04/01/2024', 'PETR4', quantidade=10),
+            linha_b3('04/01/2024', 'VALE3F', quantidade=5),
+            linha_b3('04/01/2024', 'VALE3F', quantidade=5),
+            linha_b3('data inválida', 'ITSA4'),
+        ]).to_excel(caminho, index=False)
+
+        user_hash = self.user.hash_id
+        comandos = []
+        def registrar(conn, cursor, statement, parameters, context, executemany):
+            comandos.append(statement.split()[0])
+        event.listen(db.engine, 'before_cursor_execute', registrar)
+        try:
+            with open(caminho, 'rb') as enviado, copiar_para_temporario(enviado) as (_, arquivo):
+                resultado = simular_relatorio(arquivo, user_hash)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', registrar)
+
+        self.assertEqual(comandos, ['SELECT', 'SELECT'])
+        self.assertEqual(Negociacao.query.count(), 2)
+        self.assertEqual(Acao.query.count(), 1)
+
+        self.assertEqual(resultado['linhas_lidas'], 6)
+        self.assertEqual((resultado['novas'], resultado['duplicadas'], resultado['invalidas']), (2, 3, 1))
+        self.assertEqual(resultado['acoes_novas'], ['VALE3'])
+        self.assertEqual(resultado['linhas_invalidas'], [7])
+        por_acao = {(item['codigo'], item['tipo_movimentacao']): item for item in resultado['por_acao']}
+        self.assertEqual(por_acao[('PETR4', 'Compra')]['novas'], 1)
+        self.assertEqual(por_acao[('PETR4', 'Compra')]['duplicadas'], 1)
+        self.assertEqual(por_acao[('PETR4', 'Venda')]['duplicadas'], 1)
+        self.assertEqual(por_acao[('VALE3', 'Compra')]['novas'], 1)
+        self.assertEqual(por_acao[('VALE3', 'Compra')]['duplicadas'], 1)
+        self.assertEqual(por_acao[('ITSA4', 'Compra')]['invalidas'], 1)
+
+
+
+class TestRotasDeUpload(TesteComRotas):
+    """Testes das rotas de envio de relatórios"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.app.config['UPLOAD_FOLDER'] = os.path.join(self.tmpdir.name, 'uploads')
+        os.makedirs(self.app.config['UPLOAD_FOLDER'])
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        super().tearDown()
+        self.tmpdir.cleanup()
+
+    def test_simulacao_nao_grava_o_arquivo(self):
+        """A simulação lê o envio de um arquivo temporário, sem gravá-lo na pasta de uploads"""
+        conteudo = io.BytesIO()
+        pd.DataFrame([linha_b3('02/01/2024', 'PETR4'), linha_b3('03/01/2024', 'VALE3')]).to_excel(conteudo, index=False)
+
+        resposta = self.client.post('/relatorios/upload', data={
+            'arquivos': (io.BytesIO(conteudo.getvalue()), 'negociacao.xlsx'),
+            'simular': 'Simular Importação',
+        }, content_type='multipart/form-data')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn('VALE3', resposta.get_data(as_text=True))
+        self.assertEqual(os.listdir(self.app.config['UPLOAD_FOLDER']), [])
+        self.assertEqual((Relatorio.query.count(), Negociacao.query.count()), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
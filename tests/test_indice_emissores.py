@@ -0,0 +1,121 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, CnpjCache
+from src.utils import busca_cnpj, indice_emissores
+from src.utils.indice_emissores import consultar_emissor, construir_indice, ler_emissores, ARQUIVO_EMISSORES
+from base import TesteComRotas
+
+
+class TestIndiceEmissores(unittest.TestCase):
+    """Testes para o índice local de emissores"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        self.diretorio = tempfile.mkdtemp()
+        self.indice = os.path.join(self.diretorio, 'emissores.sqlite')
+        self.patcher = patch.object(indice_emissores, 'INDICE_EMISSORES', self.indice)
+        self.patcher.start()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.patcher.stop()
+        shutil.rmtree(self.diretorio)
+
+    def escrever_lista(self, conteudo):
+        arquivo = os.path.join(self.diretorio, 'lista.csv')
+        with open(arquivo, 'w', encoding='utf-8') as saida:
+            saida.write(conteudo)
+        return arquivo
+
+    def test_indice_distribuido_criado_na_primeira_consulta(self):
+        """Sem o arquivo do índice, a primeira consulta o cria a partir da lista distribuída"""
+        self.assertFalse(os.path.exists(self.indice))
+        self.assertEqual(consultar_emissor('petr4'), ('PETRÓLEO BRASILEIRO S.A. - PETROBRAS', '33.000.167/0001-01'))
+        self.assertEqual(consultar_emissor('PETR3F'), consultar_emissor('PETR4'))
+        self.assertIsNone(consultar_emissor('XPTO3'))
+        self.assertTrue(os.path.exists(self.indice))
+        self.assertEqual(len(list(ler_emissores(ARQUIVO_EMISSORES))), construir_indice())
+
+    def test_atualizacao_substitui_o_indice(self):
+        """A atualização aceita CSV com vírgula, ignora CNPJs inválidos e vale para as consultas seguintes"""
+        self.assertIsNotNone(consultar_emissor('PETR4'))
+        arquivo = self.escrever_lista(
+            'Codigo,Emissor,CNPJ\n'
+            'XPTO3,XPTO S.A.,11.222.333/0001-81\n'
+            'ABCD4,ABCD S.A.,sem cnpj\n'
+        )
+        self.assertEqual(construir_indice(arquivo), 1)
+        self.assertEqual(consultar_emissor('XPTO11'), ('XPTO S.A.', '11.222.333/0001-81'))
+        self.assertIsNone(consultar_emissor('PETR4'))
+        self.assertIsNone(consultar_emissor('ABCD4'))
+        self.assertEqual([nome for nome in os.listdir(self.diretorio) if nome.endswith('.tmp')], [])
+
+    def test_busca_usa_o_indice_antes_da_rede(self):
+        """Códigos do índice não vão ao cache nem à internet; os demais seguem a busca online"""
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            with patch.object(busca_cnpj, 'buscar_cnpj_no_google', return_value=None) as buscar_online:
+                self.assertEqual(busca_cnpj.buscar_cnpj('VALE3'), '33.592.510/0001-54')
+                buscar_online.assert_not_called()
+                self.assertEqual(busca_cnpj.buscar_cnpj('XPTO3'), busca_cnpj.MENSAGEM_NAO_ENCONTRADO)
+                buscar_online.assert_called_once_with('XPTO3')
+            self.assertEqual([entrada.codigo for entrada in CnpjCache.query], ['XPTO3'])
+            db.session.remove()
+            db.drop_all()
+
+
+
+class TestCadastroDeAcoes(TesteComRotas):
+    """Testes das rotas de cadastro de ações completadas pelo índice de emissores"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.diretorio = tempfile.mkdtemp()
+        self.patcher = patch.object(indice_emissores, 'INDICE_EMISSORES', os.path.join(self.diretorio, 'emissores.sqlite'))
+        self.patcher.start()
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        self.patcher.stop()
+        shutil.rmtree(self.diretorio)
+        super().tearDown()
+
+    def test_cadastro_com_cnpj_em_branco_usa_o_indice(self):
+        """O CNPJ e o nome deixados em branco vêm do índice e são gravados e exibidos"""
+        resposta = self.client.post('/acoes/cadastrar', data={'codigo': 'petr4', 'cnpj': '', 'nome_empresa': ''},
+                                    follow_redirects=True)
+
+        self.assertEqual(resposta.status_code, 200)
+        acao = Acao.query.filter_by(user_hash=self.user.hash_id).one()
+        self.assertEqual((acao.codigo, acao.cnpj, acao.nome_empresa),
+                         ('PETR4', '33.000.167/0001-01', 'PETRÓLEO BRASILEIRO S.A. - PETROBRAS'))
+        self.assertIn('PETRÓLEO BRASILEIRO S.A. - PETROBRAS', resposta.get_data(as_text=True))
+
+    def test_edicao_grava_o_nome_da_empresa(self):
+        """O nome informado na edição é gravado"""
+        acao = Acao(codigo='XPTO3', user_hash=self.user.hash_id)
+        db.session.add(acao)
+        db.session.commit()
+
+        self.client.post(f'/acoes/editar/{acao.id}', data={'codigo': 'XPTO3', 'cnpj': '', 'nome_empresa': 'XPTO S.A.'})
+
+        self.assertEqual(db.session.query(Acao.nome_empresa).filter(Acao.id == acao.id).scalar(), 'XPTO S.A.')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,385 @@
+import os
+import random
+import sys
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import event
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import Acao, ApuracaoMensal, Negociacao, PosicaoMensal, SaldoPrecoMedio, User
+from src.utils.apuracao import recalcular_apuracoes
+from src.utils.custo_medio import calcular_custo_medio
+from src.utils.day_trade import classificar_day_trades
+from src.utils.posicao import (
+    atualizar_posicoes_mensais, calcular_posicoes, calcular_serie, datas_alteradas, datas_da_serie,
+    recalcular_posicoes_mensais, registrar_alteracoes, FREQUENCIA_DIARIA, FREQUENCIA_MENSAL,
+    FREQUENCIA_NEGOCIACAO, TIPO_SALDO_CADASTRADO
+)
+from base import historico_completo, TesteComNegociacoes, OUTRO_USUARIO
+
+
+def posicao_por_acao(acao, data_base, user_hash):
+    """Cálculo de referência, ação por ação, como era feito em calcular_posicao_na_data"""
+    saldo_cadastrado = SaldoPrecoMedio.query.filter(
+        SaldoPrecoMedio.acao_id == acao.id,
+        SaldoPrecoMedio.data_base <= data_base,
+        SaldoPrecoMedio.user_hash == user_hash
+    ).order_by(SaldoPrecoMedio.data_base.desc()).first()
+
+    data_inicial = None
+    saldo = 0
+    preco_medio = 0
+    if saldo_cadastrado:
+        data_inicial = saldo_cadastrado.data_base
+        saldo = saldo_cadastrado.quantidade
+        preco_medio = saldo_cadastrado.preco_medio
+
+    negociacoes = Negociacao.query.filter(
+        Negociacao.acao_id == acao.id,
+        Negociacao.data_negocio <= data_base,
+        Negociacao.user_hash == user_hash
+    )
+    if data_inicial:
+        negociacoes = negociacoes.filter(Negociacao.data_negocio > data_inicial)
+
+    valor_investido = saldo * preco_medio
+    for neg in negociacoes.order_by(Negociacao.data_negocio, Negociacao.id).all():
+        # A parte em day trade não altera a posição nem o preço médio
+        quantidade = neg.quantidade - neg.quantidade_day_trade
+        if quantidade <= 0:
+            continue
+        if neg.tipo_movimentacao == 'Compra':
+            valor_compra = quantidade * neg.preco
+            if neg.corretagem is not None and neg.corretagem > 0:
+                valor_compra += (neg.corretagem * quantidade / neg.quantidade).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            valor_investido += valor_compra
+            saldo += quantidade
+            if saldo > 0:
+                preco_medio = valor_investido / saldo
+        elif neg.tipo_movimentacao == 'Venda':
+            saldo -= quantidade
+            if saldo <= 0:
+                valor_investido = 0
+                preco_medio = 0
+                if saldo < 0:
+                    saldo = 0
+            else:
+                # A venda baixa do valor investido a quantidade vendida ao preço médio
+                valor_investido -= (quantidade * arredondar_preco(preco_medio)).quantize(
+                    Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    return saldo, preco_medio
+
+
+def arredondar_preco(preco_medio):
+    """Regra de arredondamento do preço médio (src/utils/dinheiro.py)"""
+    return Decimal(preco_medio).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+
+class TestPosicao(TesteComNegociacoes):
+    """Testes para o motor de cálculo de posições"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        super().setUp()
+        self.outro = User(**OUTRO_USUARIO)
+        db.session.add(self.outro)
+        db.session.commit()
+
+    def test_compras_vendas_corretagem_e_saldo_cadastrado(self):
+        """Aplica as negociações a partir do saldo cadastrado mais recente"""
+        petr = Acao(codigo='PETR4', user_hash=self.user_hash)
+        vale = Acao(codigo='VALE3', user_hash=self.user_hash)
+        itsa = Acao(codigo='ITSA4', user_hash=self.user_hash)
+        db.session.add_all([petr, vale, itsa])
+        db.session.flush()
+
+        self.negociar(petr, date(2024, 1, 2), 'Compra', 100, 10, corretagem=Decimal('5.00'))
+        self.negociar(petr, date(2024, 1, 3), 'Compra', 100, 20)
+        self.negociar(petr, date(2024, 1, 4), 'Venda', 50, 25)
+        # Saldo cadastrado substitui as negociações anteriores da VALE3
+        self.negociar(vale, date(2024, 1, 2), 'Compra', 999, 1)
+        db.session.add(SaldoPrecoMedio(data_base=date(2024, 1, 3), quantidade=10, preco_medio=Decimal('50.00'),
+                                       acao_id=vale.id, user_hash=self.user_hash))
+        self.negociar(vale, date(2024, 1, 5), 'Compra', 10, 70)
+        # Posição zerada não aparece no resultado
+        self.negociar(itsa, date(2024, 1, 2), 'Compra', 100, 9)
+        self.negociar(itsa, date(2024, 1, 3), 'Venda', 100, 10)
+        db.session.commit()
+
+        posicoes = {item['acao'].codigo: item for item in calcular_posicoes(self.user_hash, date(2024, 1, 31))}
+
+        self.assertEqual(list(posicoes), ['PETR4', 'VALE3'])
+        self.assertEqual(posicoes['PETR4']['quantidade'], 150)
+        self.assertEqual(posicoes['PETR4']['preco_medio'], Decimal('15.0250'))
+        self.assertEqual(posicoes['PETR4']['valor_investido'], Decimal('2253.75'))
+        self.assertEqual(posicoes['VALE3']['quantidade'], 20)
+        self.assertEqual(posicoes['VALE3']['preco_medio'], Decimal('60.0000'))
+
+        historico = historico_completo(self.user_hash, date(2024, 1, 31))
+        petr = historico[historico['codigo'] == 'PETR4']
+        self.assertEqual(petr['saldo'].tolist(), [100, 200, 150])
+        self.assertEqual(petr['valor_investido'].tolist(), [Decimal('1005.00'), Decimal('3005.00'), Decimal('2253.75')])
+        vale = historico[historico['codigo'] == 'VALE3']
+        self.assertEqual(vale['tipo_movimentacao'].tolist(), ['Compra', TIPO_SALDO_CADASTRADO, 'Compra'])
+        self.assertEqual(vale['saldo'].tolist(), [999, 10, 20])
+        itsa = historico[historico['codigo'] == 'ITSA4']
+        self.assertEqual(itsa['preco_medio'].tolist(), [Decimal('9.0000'), Decimal('0.0000')])
+
+    def test_day_trade_nao_altera_preco_medio(self):
+        """Apenas a parte em operações comuns entra na posição, com a corretagem proporcional"""
+        petr = Acao(codigo='PETR4', user_hash=self.user_hash)
+        db.session.add(petr)
+        db.session.flush()
+        self.negociar(petr, date(2024, 1, 2), 'Compra', 100, 10)
+        # 60 em day trade; a compra de 40 restante custa R$ 800,00 mais R$ 4,00 de corretagem
+        self.negociar(petr, date(2024, 1, 3), 'Compra', 100, 20, corretagem=Decimal('10.00'))
+        self.negociar(petr, date(2024, 1, 3), 'Venda', 60, 21)
+        db.session.flush()
+        classificar_day_trades(self.user_hash)
+        db.session.commit()
+
+        posicao, = calcular_posicoes(self.user_hash, date(2024, 1, 31))
+        self.assertEqual((posicao['quantidade'], posicao['valor_investido']), (140, Decimal('1804.00')))
+        self.assertEqual(posicao['preco_medio'], Decimal('12.8857'))
+
+    def gerar_dados_aleatorios(self, semente=42):
+        """Cria 20 ações com negociações e saldos aleatórios ao longo de 2023"""
+        aleatorio = random.Random(semente)
+        acoes = [Acao(codigo=f'ACAO{indice:02d}', user_hash=self.user_hash) for indice in range(20)]
+        acao_outro = Acao(codigo='ACAO00', user_hash=self.outro.hash_id)
+        db.session.add_all(acoes + [acao_outro])
+        db.session.flush()
+
+        inicio = date(2023, 1, 2)
+        for acao in acoes + [acao_outro]:
+            for _ in range(aleatorio.randint(0, 30)):
+                self.negociar(
+                    acao, inicio + timedelta(days=aleatorio.randint(0, 365)),
+                    aleatorio.choice(['Compra', 'Compra', 'Venda']),
+                    aleatorio.randint(1, 300), round(aleatorio.uniform(1, 100), 2),
+                    corretagem=aleatorio.choice([None, Decimal('0'), Decimal('4.90')])
+                )
+            for _ in range(aleatorio.randint(0, 2)):
+                data_saldo = inicio + timedelta(days=aleatorio.randint(0, 365))
+                if not SaldoPrecoMedio.query.filter_by(acao_id=acao.id, data_base=data_saldo).first():
+                    db.session.add(SaldoPrecoMedio(
+                        data_base=data_saldo, quantidade=aleatorio.randint(0, 500),
+                        preco_medio=Decimal(str(round(aleatorio.uniform(1, 100), 2))),
+                        acao_id=acao.id, user_hash=acao.user_hash
+                    ))
+                    db.session.flush()
+        classificar_day_trades(self.user_hash)
+        classificar_day_trades(self.outro.hash_id)
+        db.session.commit()
+        return acoes
+
+    def verificar_posicoes(self, acoes, datas):
+        """Compara calcular_posicoes com o cálculo de referência e conta as consultas"""
+        for data_base in datas:
+            esperado = {}
+            for acao in acoes:
+                saldo, preco_medio = posicao_por_acao(acao, data_base, self.user_hash)
+                if saldo > 0:
+                    esperado[acao.codigo] = (saldo, arredondar_preco(preco_medio))
+
+            comandos = []
+            def registrar(conn, cursor, statement, parameters, context, executemany):
+                comandos.append(statement)
+            event.listen(db.engine, 'before_cursor_execute', registrar)
+            try:
+                posicoes = calcular_posicoes(self.user_hash, data_base)
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', registrar)
+
+            # Ações com o ponto de partida, negociações e eventos corporativos
+            self.assertEqual(len(comandos), 3)
+            self.assertEqual(
+                {item['acao'].codigo: (item['quantidade'], item['preco_medio']) for item in posicoes},
+                esperado, f'Posições diferentes em {data_base}'
+            )
+            self.assertEqual([item['acao'].codigo for item in posicoes], sorted(esperado))
+
+    def posicoes_mensais(self):
+        return sorted(
+            (posicao.acao_id, posicao.mes, posicao.quantidade, posicao.valor_investido, posicao.preco_medio)
+            for posicao in PosicaoMensal.query.filter_by(user_hash=self.user_hash)
+        )
+
+    def test_resultado_igual_ao_calculo_por_acao_com_tres_consultas(self):
+        """Com dados aleatórios, o resultado é idêntico ao cálculo ação por ação"""
+        acoes = self.gerar_dados_aleatorios()
+        self.verificar_posicoes(acoes, [date(2022, 12, 31), date(2023, 3, 31), date(2023, 8, 15), date(2024, 1, 31)])
+
+    def test_posicoes_mensais_como_ponto_de_partida(self):
+        """Partindo das posições mensais, o resultado continua idêntico em qualquer data"""
+        acoes = self.gerar_dados_aleatorios()
+        recalcular_posicoes_mensais(self.user_hash)
+        db.session.commit()
+
+        self.assertTrue(PosicaoMensal.query.count() > 0)
+        self.assertEqual(PosicaoMensal.query.filter(PosicaoMensal.user_hash != self.user_hash).count(), 0)
+        datas = [date(2022, 12, 31)] + [date(2023, mes, dia) for mes in range(1, 13) for dia in (1, 15, 28)] + [date(2024, 1, 31)]
+        self.verificar_posicoes(acoes, datas)
+
+    def test_atualizacao_incremental_das_posicoes_mensais(self):
+        """Incluir, alterar e excluir negociações e saldos mantém as posições mensais corretas"""
+        acoes = self.gerar_dados_aleatorios()
+        recalcular_posicoes_mensais(self.user_hash)
+        db.session.commit()
+
+        # Nova negociação no meio do ano, corretagem alterada e negociações excluídas
+        self.negociar(acoes[0], date(2023, 6, 10), 'Compra', 1000, 12.34)
+        negociacao = Negociacao.query.filter_by(acao_id=acoes[1].id, tipo_movimentacao='Compra').first()
+        negociacao.corretagem = Decimal('123.45')
+        alteracoes = {acoes[0].id: date(2023, 6, 10), negociacao.acao_id: negociacao.data_negocio}
+        excluidas = Negociacao.query.filter(Negociacao.acao_id == acoes[2].id, Negociacao.data_negocio >= date(2023, 9, 1))
+        registrar_alteracoes(alteracoes, datas_alteradas(self.user_hash, Negociacao.acao_id == acoes[2].id,
+                                                         Negociacao.data_negocio >= date(2023, 9, 1)))
+        excluidas.delete(synchronize_session=False)
+        # Novo saldo cadastrado
+        db.session.add(SaldoPrecoMedio(data_base=date(2023, 4, 20), quantidade=77, preco_medio=Decimal('10.00'),
+                                       acao_id=acoes[3].id, user_hash=self.user_hash))
+        registrar_alteracoes(alteracoes, {acoes[3].id: date(2023, 4, 20)})
+        db.session.flush()
+        atualizar_posicoes_mensais(self.user_hash, alteracoes)
+        db.session.commit()
+        incrementais = self.posicoes_mensais()
+
+        recalcular_posicoes_mensais(self.user_hash)
+        db.session.commit()
+        self.assertEqual(incrementais, self.posicoes_mensais())
+        self.verificar_posicoes(acoes, [date(2023, 4, 20), date(2023, 6, 30), date(2023, 9, 15), date(2024, 1, 31)])
+
+    def test_serie_igual_as_posicoes_de_cada_data(self):
+        """A série calculada numa única passada coincide com calcular_posicoes em cada data"""
+        self.gerar_dados_aleatorios()
+        recalcular_posicoes_mensais(self.user_hash)
+        db.session.commit()
+
+        for frequencia in (FREQUENCIA_MENSAL, FREQUENCIA_NEGOCIACAO):
+            datas = datas_da_serie(self.user_hash, date(2023, 2, 10), date(2024, 1, 31), frequencia)
+            serie = calcular_serie(self.user_hash, datas)
+            for data_base in datas:
+                esperado = [
+                    (item['acao'].codigo, item['quantidade'], item['preco_medio'])
+                    for item in calcular_posicoes(self.user_hash, data_base)
+                ]
+                do_dia = serie[serie['data'] == data_base]
+                self.assertEqual(
+                    list(zip(do_dia['codigo'], do_dia['quantidade'], do_dia['preco_medio'])),
+                    esperado, f'Série diferente em {data_base} ({frequencia})'
+                )
+
+    def test_datas_da_serie(self):
+        """Gera as datas de cada frequência respeitando o limite"""
+        acao = Acao(codigo='PETR4', user_hash=self.user_hash)
+        db.session.add(acao)
+        db.session.flush()
+        self.negociar(acao, date(2024, 1, 3), 'Compra', 10, 10)
+        self.negociar(acao, date(2024, 1, 3), 'Compra', 10, 11)
+        self.negociar(acao, date(2024, 2, 7), 'Venda', 5, 12)
+        db.session.commit()
+
+        self.assertEqual(datas_da_serie(self.user_hash, date(2024, 1, 30), date(2024, 2, 2), FREQUENCIA_DIARIA),
+                         [date(2024, 1, 30), date(2024, 1, 31), date(2024, 2, 1), date(2024, 2, 2)])
+        self.assertEqual(datas_da_serie(self.user_hash, date(2024, 1, 1), date(2024, 3, 31), FREQUENCIA_MENSAL, 2),
+                         [date(2024, 1, 31), date(2024, 2, 29)])
+        self.assertEqual(datas_da_serie(self.user_hash, date(2024, 1, 1), date(2024, 12, 31), FREQUENCIA_NEGOCIACAO),
+                         [date(2024, 1, 3), date(2024, 2, 7)])
+        self.assertEqual(datas_da_serie(self.outro.hash_id, date(2024, 1, 1), date(2024, 12, 31), FREQUENCIA_NEGOCIACAO), [])
+        self.assertTrue(calcular_serie(self.outro.hash_id, [date(2024, 1, 31)]).empty)
+
+    def test_kernel_igual_ao_laco_por_negociacao(self):
+        """O kernel vetorizado reproduz o laço negociação a negociação, inclusive os reinícios e ajustes"""
+        aleatorio = random.Random(7)
+        proporcoes = [(2, 1), (1, 10), (11, 10), (1, 3)]
+        for _ in range(300):
+            grupos = sorted(aleatorio.randint(0, 5) for _ in range(aleatorio.randint(0, 60)))
+            ajustes = [aleatorio.random() < 0.1 for _ in grupos]
+            quantidades = [0 if ajuste else aleatorio.choice([1, 1, -1, 0]) * aleatorio.randint(0, 50)
+                           for ajuste in ajustes]
+            custos = [quantidade * aleatorio.randint(100, 5000) + aleatorio.choice([0, 490]) if quantidade > 0 else 0
+                      for quantidade in quantidades]
+            numeradores, denominadores = zip(*(aleatorio.choice(proporcoes) for _ in grupos)) if grupos else ((), ())
+
+            esperado = []
+            anterior = None
+            for grupo, quantidade, custo, ajuste, numerador, denominador in zip(
+                    grupos, quantidades, custos, ajustes, numeradores, denominadores):
+                if grupo != anterior:
+                    saldo, valor_investido, preco_medio, anterior = 0, 0, 0, grupo
+                if ajuste:
+                    if saldo > 0:
+                        novo_saldo = saldo * numerador // denominador
+                        if novo_saldo == 0:
+                            valor_investido, preco_medio = 0, 0
+                        else:
+                            fracao = saldo * numerador - novo_saldo * denominador
+                            valor_investido -= dividir(fracao * preco_medio, numerador * 100)
+                            preco_medio = dividir(preco_medio * denominador, numerador)
+                        saldo = novo_saldo
+                elif quantidade > 0 or custo > 0:
+                    valor_investido += custo
+                    saldo += quantidade
+                    if saldo > 0:
+                        preco_medio = dividir(valor_investido * 100, saldo)
+                elif quantidade < 0:
+                    saldo += quantidade
+                    if saldo <= 0:
+                        saldo, valor_investido, preco_medio = 0, 0, 0
+                    else:
+                        valor_investido -= dividir(-quantidade * preco_medio, 100)
+                esperado.append((saldo, valor_investido, preco_medio))
+
+            historico = calcular_custo_medio(grupos, quantidades, custos, escala_preco=100, ajustes=ajustes,
+                                             proporcoes=(numeradores, denominadores))
+            self.assertEqual(list(zip(
+                historico['quantidade'].tolist(),
+                historico['valor_investido'].tolist(),
+                historico['preco_medio'].tolist()
+            )), esperado)
+
+    def test_venda_parcial_baixa_o_valor_investido(self):
+        """
+        A venda parcial baixa o valor investido ao preço médio, que não muda.
+
+        Regressão da regra anterior, em que a venda reduzia apenas o saldo: depois
+        da recompra, o valor investido era R$ 1.500,00 e o preço médio R$ 15,0000,
+        e o resultado da venda de abril era R$ 1.500,00 em vez de R$ 2.000,00.
+        """
+        petr = Acao(codigo='PETR4', user_hash=self.user_hash)
+        db.session.add(petr)
+        db.session.flush()
+        self.negociar(petr, date(2024, 1, 10), 'Compra', 100, 10)
+        self.negociar(petr, date(2024, 2, 10), 'Venda', 50, 12)
+        self.negociar(petr, date(2024, 3, 10), 'Compra', 50, 10)
+        db.session.commit()
+
+        posicao, = calcular_posicoes(self.user_hash, date(2024, 3, 31))
+        self.assertEqual((posicao['quantidade'], posicao['valor_investido'], posicao['preco_medio']),
+                         (100, Decimal('1000.00'), Decimal('10.0000')))
+        self.assertNotEqual(posicao['valor_investido'], Decimal('1500.00'))
+
+        self.negociar(petr, date(2024, 4, 10), 'Venda', 100, 30)
+        db.session.commit()
+        classificar_day_trades(self.user_hash)
+        recalcular_posicoes_mensais(self.user_hash)
+        recalcular_apuracoes(self.user_hash)
+        db.session.commit()
+        abril = ApuracaoMensal.query.filter_by(user_hash=self.user_hash, mes=date(2024, 4, 30)).one()
+        # R$ 3.000,00 de vendas menos 100 ações a R$ 10,00 (e não a R$ 15,00)
+        self.assertEqual(abril.resultado_swing_trade, Decimal('2000.00'))
+
+
+def dividir(numerador, divisor):
+    """Divisão inteira com arredondamento ROUND_HALF_UP, como em src/utils/dinheiro.py"""
+    return (2 * numerador + divisor) // (2 * divisor)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from flask import Flask
+
+# Adicionar o diretório raiz ao path para importar os módulos corretamente
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.models import db
+from src.models.all_models import CnpjCache
+from src.utils import indice_emissores
+from src.utils.busca_cnpj import resolver_cnpjs, MENSAGEM_NAO_ENCONTRADO
+from src.utils.cache_cnpj import consultar_cache, gravar_cache
+from src.utils.resolvedor_cnpj import CircuitoAberto, Disjuntor, LimitadorTaxa, ResolvedorCnpj
+
+CNPJS = {'XPTO3': '11.222.333/0001-81', 'ABCD4': '44.555.666/0001-77', 'EFGH3': '12.345.678/0001-95'}
+
+
+class ServidorFalso:
+    """Servidor HTTP local que responde como a página de busca"""
+
+    def __init__(self, atraso=0.0, status=200):
+        self.atraso, self.status = atraso, status
+        self.requisicoes, self.conexoes = [], set()
+        self.simultaneas = self.maximo_simultaneas = 0
+        self.lock = threading.Lock()
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                codigo = parse_qs(urlparse(self.path).query)['codigo'][0]
+                with servidor.lock:
+                    servidor.requisicoes.append(codigo)
+                    servidor.conexoes.add(self.client_address)
+                    servidor.simultaneas += 1
+                    servidor.maximo_simultaneas = max(servidor.maximo_simultaneas, servidor.simultaneas)
+                time.sleep(servidor.atraso)
+                with servidor.lock:
+                    servidor.simultaneas -= 1
+                corpo = f'<html><body>{codigo}: CNPJ {CNPJS.get(codigo, "-")}</body></html>'.encode()
+                self.send_response(servidor.status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/busca?codigo={{codigo}}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def fechar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestResolvedorCnpj(unittest.TestCase):
+    """Testes para a busca de CNPJs em lote, contra um servidor HTTP local"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        self.servidores, self.resolvedores = [], []
+
+    def tearDown(self):
+        """Limpeza após cada teste"""
+        for resolvedor in self.resolvedores:
+            resolvedor.fechar()
+        for servidor in self.servidores:
+            servidor.fechar()
+
+    def criar(self, atraso=0.0, status=200, **opcoes):
+        servidor = ServidorFalso(atraso, status)
+        opcoes.setdefault('limitador', LimitadorTaxa(1000))
+        resolvedor = ResolvedorCnpj(url=servidor.url, timeout=(1, 2), **opcoes)
+        self.servidores.append(servidor)
+        self.resolvedores.append(resolvedor)
+        return servidor, resolvedor
+
+    def test_lote_simultaneo_com_conexoes_reutilizadas(self):
+        """O lote é buscado em paralelo, limitado às buscas simultâneas, reutilizando as conexões"""
+        servidor, resolvedor = self.criar(atraso=0.1, buscas_simultaneas=3)
+        codigos = ['XPTO3', 'ABCD4', 'EFGH3', 'NADA3'] * 3 + [f'SEM{indice}3' for indice in range(8)]
+        resultados, erros = resolvedor.buscar_em_lote(codigos)
+
+        self.assertEqual(erros, {})
+        self.assertEqual(len(servidor.requisicoes), 12)
+        self.assertEqual({codigo: resultados[codigo] for codigo in CNPJS}, CNPJS)
+        self.assertIsNone(resultados['NADA3'])
+        self.assertGreater(servidor.maximo_simultaneas, 1)
+        self.assertLessEqual(servidor.maximo_simultaneas, 3)
+        self.assertLessEqual(len(servidor.conexoes), 3)
+
+    def test_disjuntor_interrompe_servico_com_falhas(self):
+        """Após as falhas seguidas, o serviço deixa de ser chamado até a requisição de teste"""
+        agora = [0.0]
+        disjuntor = Disjuntor(falhas_para_abrir=3, espera=60, relogio=lambda: agora[0])
+        servidor, resolvedor = self.criar(status=503, buscas_simultaneas=1, disjuntor=disjuntor)
+
+        resultados, erros = resolvedor.buscar_em_lote([f'COD{indice}3' for indice in range(10)])
+        self.assertEqual(resultados, {})
+        self.assertEqual(len(erros), 10)
+        self.assertEqual(len(servidor.requisicoes), 3)
+        self.assertEqual(sum(isinstance(erro, CircuitoAberto) for erro in erros.values()), 7)
+        self.assertTrue(disjuntor.aberto)
+
+        # Após a espera, uma única requisição de teste; com sucesso, o disjuntor fecha
+        agora[0] = 61
+        servidor.status = 200
+        self.assertTrue(disjuntor.permitir())
+        self.assertFalse(disjuntor.permitir())
+        disjuntor.registrar_sucesso()
+        self.assertEqual(resolvedor.buscar('XPTO3'), CNPJS['XPTO3'])
+        self.assertFalse(disjuntor.aberto)
+
+    def test_erro_inesperado_libera_a_requisicao_de_teste(self):
+        """Um erro que não é de rede na requisição de teste conta como falha e não trava o disjuntor"""
+        agora = [0.0]
+        disjuntor = Disjuntor(falhas_para_abrir=1, espera=60, relogio=lambda: agora[0])
+        _, resolvedor = self.criar(buscas_simultaneas=1, disjuntor=disjuntor)
+        disjuntor.registrar_falha()
+
+        agora[0] = 61
+        with patch.object(resolvedor.sessao, 'get', side_effect=ValueError('resposta inesperada')):
+            with self.assertRaises(ValueError):
+                resolvedor.buscar('XPTO3')
+        self.assertTrue(disjuntor.aberto)
+
+        # Após uma nova espera, outra requisição de teste é liberada
+        agora[0] = 122
+        self.assertEqual(resolvedor.buscar('XPTO3'), CNPJS['XPTO3'])
+        self.assertFalse(disjuntor.aberto)
+
+    def test_timeout(self):
+        """Uma resposta mais lenta que o timeout é um erro, sem travar o lote"""
+        _, resolvedor = self.criar(atraso=1.0, buscas_simultaneas=2)
+        resolvedor.timeout = (1, 0.2)
+        resultados, erros = resolvedor.buscar_em_lote(['XPTO3'])
+        self.assertEqual(resultados, {})
+        self.assertEqual(list(erros), ['XPTO3'])
+
+    def test_limitador_espaca_as_requisicoes(self):
+        """Requisições de várias threads ficam espaçadas pelo intervalo do limitador"""
+        agora, esperas = [10.0], []
+        limitador = LimitadorTaxa(4, relogio=lambda: agora[0], dormir=esperas.append)
+        for _ in range(4):
+            limitador.aguardar()
+        self.assertEqual(esperas, [0.25, 0.5, 0.75])
+        agora[0] = 20.0
+        limitador.aguardar()
+        self.assertEqual(esperas, [0.25, 0.5, 0.75])
+
+    def test_lote_usa_indice_e_cache_e_grava_resultados(self):
+        """Só os códigos fora do índice e do cache vão à internet; os resultados vão para o cache, os erros não"""
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(app)
+        with app.app_context(), patch.object(indice_emissores, 'INDICE_EMISSORES',
+                                             os.path.join(diretorio, 'emissores.sqlite')):
+            db.create_all()
+            gravar_cache({'ABCD4': CNPJS['ABCD4']})
+            servidor, resolvedor = self.criar(buscas_simultaneas=2)
+
+            resultados = resolver_cnpjs(['petr4', 'ABCD4', 'XPTO3', 'NADA3'], resolvedor)
+            self.assertEqual(resultados, {
+                'PETR4': '33.000.167/0001-01', 'ABCD4': CNPJS['ABCD4'], 'XPTO3': CNPJS['XPTO3'],
+                'NADA3': MENSAGEM_NAO_ENCONTRADO,
+            })
+            self.assertEqual(sorted(servidor.requisicoes), ['NADA3', 'XPTO3'])
+            self.assertEqual(consultar_cache(['XPTO3', 'NADA3']), {'XPTO3': CNPJS['XPTO3'], 'NADA3': None})
+
+            servidor.status = 500
+            self.assertEqual(resolver_cnpjs(['EFGH3', 'XPTO3'], resolvedor), {'XPTO3': CNPJS['XPTO3']})
+            self.assertIsNone(db.session.get(CnpjCache, 'EFGH3'))
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    unittest.main()